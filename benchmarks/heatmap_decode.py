@@ -0,0 +1,107 @@
+"""Micro-benchmark of the result view's heatmap path
+
+Old path, run on every rerun: base64 decode, PIL decode, float64 array,
+then st.image re-encodes the array to PNG.
+New path: the overlay is base64-decoded once when the response is parsed,
+utils.heatmap.prepare_overlay runs on first render, and every rerun hands
+the stored encoded bytes to st.image.
+
+The memory columns are the tracemalloc peak of one call: the numpy arrays
+and bytes objects a path allocates. Pillow's decoded pixel buffers are
+allocated outside Python's allocator, so they are not part of it.
+
+Usage: python -m benchmarks.heatmap_decode [--size 227x277] [--repeat 50]
+"""
+import argparse
+import base64
+import time
+import tracemalloc
+from io import BytesIO
+import numpy as np
+from PIL import Image
+from utils.heatmap import prepare_overlay, get_overlay_display
+from utils.session_store import BlobStore
+
+def make_overlay(width, height):
+    """Synthetic Grad-CAM style RGB overlay, base64 encoded PNG"""
+    y, x = np.mgrid[0:height, 0:width]
+    heat = np.exp(-(((x - width / 2) ** 2) + ((y - height / 2) ** 2)) / (0.1 * width * height))
+    rgb = np.stack([heat * 255, heat * 180, (1 - heat) * 120], axis=-1).astype(np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(rgb, mode='RGB').save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+def old_path(overlay_base64):
+    """Decode to a float64 array, then re-encode it like st.image does"""
+    heatmap_bytes = base64.b64decode(overlay_base64)
+    heatmap_img = Image.open(BytesIO(heatmap_bytes)).convert("RGB")
+    heatmap_np = np.array(heatmap_img) / 255.0
+
+    buffer = BytesIO()
+    Image.fromarray((heatmap_np * 255).astype(np.uint8)).save(buffer, format='PNG')
+    return heatmap_np.nbytes
+
+def new_first_render(overlay_base64):
+    """Decode once and keep the browser-ready bytes"""
+    data, _ = prepare_overlay(base64.b64decode(overlay_base64))
+    return len(data)
+
+def new_rerun(stored):
+    """Every later rerun only looks up the stored bytes"""
+    result, store = stored
+    data, _ = get_overlay_display(result, store)
+    return len(data)
+
+def time_call(fn, arg, repeat):
+    """Median wall time of fn(arg) in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        fn(arg)
+        samples.append((time.perf_counter() - started_at) * 1000)
+    return float(np.median(samples))
+
+def peak_bytes(fn, arg):
+    """Peak memory traced while fn(arg) runs, after a warm-up call"""
+    fn(arg)
+    tracemalloc.start()
+    try:
+        fn(arg)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run(size, repeat):
+    """Time both paths for one overlay size"""
+    width, height = size
+    overlay = make_overlay(width, height)
+    store = BlobStore()
+    result = {'overlay_ref': store.put(base64.b64decode(overlay))}
+    get_overlay_display(result, store)
+
+    return {
+        'size': f"{width}x{height}",
+        'old_ms': time_call(old_path, overlay, repeat),
+        'new_first_ms': time_call(new_first_render, overlay, repeat),
+        'new_rerun_ms': time_call(new_rerun, (result, store), repeat),
+        'old_peak_bytes': peak_bytes(old_path, overlay),
+        'new_peak_bytes': peak_bytes(new_first_render, overlay)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', action='append', help="overlay size WxH, can be repeated")
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    sizes = [tuple(int(v) for v in s.split('x')) for s in (args.size or ['227x277', '1024x1024'])]
+    print(f"{'size':>10} {'old/rerun':>12} {'new/first':>12} {'new/rerun':>12} {'old peak':>12} {'new peak':>12}")
+    for size in sizes:
+        row = run(size, args.repeat)
+        print(
+            f"{row['size']:>10} {row['old_ms']:>10.2f}ms {row['new_first_ms']:>10.2f}ms "
+            f"{row['new_rerun_ms']:>10.4f}ms {row['old_peak_bytes']:>12,} {row['new_peak_bytes']:>12,}"
+        )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""Concurrent-session load test of the classify page
+
+Drives N simulated sessions through the real classify page flow (upload,
+Classify, poll until the result shows, Classify Another) with Streamlit's
+AppTest, all in this process so they share the app's cached resources like
+sessions of one frontend container do. The backend is the local mock from
+benchmarks.mock_backend unless --backend-url is given. Classifications are
+recorded in a temporary history, removed after the run, never in .history.
+
+AppTest swaps process globals while a script runs, so script runs are
+serialized here; background jobs, admission and backend calls still overlap
+as they do in the server. Script-thread occupancy (script run time over
+wall time) is therefore at most 1; close to 1 means the page's script runs,
+not the backend, limit throughput.
+
+Reports throughput, p50/p95/p99 end-to-end latency, script-thread occupancy
+and memory growth per session, and writes them as JSON for comparing runs
+across commits.
+
+Usage: python -m benchmarks.load_test [--sessions 8] [--iterations 5]
+           [--latency lognormal:0.3,0.4] [--output load_test.json]
+"""
+import argparse
+import gc
+import json
+import subprocess
+import tempfile
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+import numpy as np
+from PIL import Image
+import streamlit as st
+from streamlit.runtime.secrets import Secrets
+from streamlit.testing.v1 import AppTest
+from benchmarks.mock_backend import MockBackend, start_in_thread
+from utils.ingest import current_rss
+
+PAGE = str(Path(__file__).resolve().parent.parent / 'pages' / 'classify.py')
+
+# AppTest is not safe to run from several threads at once
+SCRIPT_LOCK = threading.Lock()
+
+def make_chip(seed, size):
+    """Distinct grayscale PNG per seed, so each upload misses the result cache"""
+    rng = np.random.default_rng(seed)
+    pixels = (rng.random((size[1], size[0])) * 255).astype(np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels, mode='L').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def git_commit():
+    """Commit of the tree under test, or None outside a git checkout"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class SimulatedSession:
+    """One analyst classifying images one after another"""
+
+    def __init__(self, index, config):
+        self.index = index
+        self.config = config
+        self.app = AppTest.from_file(PAGE, default_timeout=config['script_timeout'])
+        self.latencies = []
+        self.errors = []
+        self.script_time = 0.0
+        self.script_wait = 0.0
+        self.script_runs = 0
+
+    def run_script(self, element=None):
+        """One script run, timed as script-thread occupancy"""
+        waited_at = time.perf_counter()
+        with SCRIPT_LOCK:
+            started_at = time.perf_counter()
+            (element or self.app).run()
+            finished_at = time.perf_counter()
+        self.script_runs += 1
+        self.script_wait += started_at - waited_at
+        self.script_time += finished_at - started_at
+
+    def classify(self, data):
+        """Upload, classify and wait for the result; returns the latency in seconds or raises"""
+        app = self.app
+        app.file_uploader[0].upload(f"chip_{self.index}.png", data, "image/png")
+        self.run_script()
+
+        started_at = time.perf_counter()
+        app.button(key="classify_button").click()
+        self.run_script()
+        deadline = started_at + self.config['request_timeout']
+        while app.session_state['classification_result'] is None:
+            if app.session_state['classify_error']:
+                raise RuntimeError(app.session_state['classify_error']['message'])
+            if time.perf_counter() > deadline:
+                raise TimeoutError("no result within the request timeout")
+            time.sleep(self.config['poll_interval'])
+            self.run_script()
+        return time.perf_counter() - started_at
+
+    def reset(self):
+        """Click Classify Another"""
+        labels = [button.label for button in self.app.button]
+        self.run_script(self.app.button[labels.index("🔄 Classify Another Image")].click())
+
+    def run(self):
+        self.run_script()
+        for iteration in range(self.config['iterations']):
+            seed = self.index * 1000 + iteration
+            if self.config['repeat_images']:
+                seed = iteration
+            try:
+                self.latencies.append(self.classify(make_chip(seed, self.config['image_size'])))
+                self.reset()
+            except Exception as e:
+                self.errors.append(f"{type(e).__name__}: {e}")
+                self.app = AppTest.from_file(PAGE, default_timeout=self.config['script_timeout'])
+                self.run_script()
+
+def run_load_test(config):
+    """Run every session concurrently and collect the metrics"""
+    server = None
+    backend_url = config['backend_url']
+    if backend_url is None:
+        backend = MockBackend(
+            latency=config['latency'],
+            error_rate=config['error_rate'],
+            reset_rate=config['reset_rate'],
+            seed=0
+        )
+        server, backend_url = start_in_thread(backend)
+
+    # Global secrets, so concurrent AppTest runs don't swap them under each other. The run's
+    # classifications go to a throwaway history and are not persisted to a result cache directory
+    history_dir = tempfile.TemporaryDirectory(prefix='load_test_history_', ignore_cleanup_errors=True)
+    secrets = Secrets()
+    secrets._secrets = {'BACKEND_URL': backend_url, 'HISTORY_DIR': history_dir.name, 'RESULT_CACHE_DIR': ''}
+    st.secrets = secrets
+
+    gc.collect()
+    rss_before = current_rss()
+    sessions = [SimulatedSession(index, config) for index in range(config['sessions'])]
+    threads = [threading.Thread(target=session.run, daemon=True) for session in sessions]
+
+    started_at = time.perf_counter()
+    for thread in threads:
+        thread.start()
+        time.sleep(config['ramp_up'] / max(len(threads), 1))
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - started_at
+
+    gc.collect()
+    rss_after = current_rss()
+    backend_stats = backend.stats() if server else None
+    if server:
+        server.shutdown()
+    history_dir.cleanup()
+
+    latencies = np.array([latency for session in sessions for latency in session.latencies])
+    completed = len(latencies)
+    errors = [error for session in sessions for error in session.errors]
+    script_time = sum(session.script_time for session in sessions)
+    script_wait = sum(session.script_wait for session in sessions)
+
+    def percentile(q):
+        return float(np.percentile(latencies, q)) if completed else None
+
+    rss_growth = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+    return {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'config': {**config, 'backend_url': backend_url, 'image_size': list(config['image_size'])},
+        'completed': completed,
+        'errors': len(errors),
+        'error_samples': errors[:10],
+        'wall_time_s': wall_time,
+        'throughput_per_s': completed / wall_time if wall_time else 0.0,
+        'latency_s': {
+            'mean': float(latencies.mean()) if completed else None,
+            'p50': percentile(50),
+            'p95': percentile(95),
+            'p99': percentile(99),
+            'max': float(latencies.max()) if completed else None
+        },
+        'script_thread_occupancy': script_time / wall_time if wall_time else 0.0,
+        'script_wait_per_run_s': script_wait / max(sum(session.script_runs for session in sessions), 1),
+        'rss_growth_bytes': rss_growth,
+        'rss_growth_per_session_bytes': rss_growth / len(sessions) if rss_growth is not None else None,
+        'backend': backend_stats
+    }
+
+def parse_size(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=8, help="concurrent simulated sessions")
+    parser.add_argument('--iterations', type=int, default=5, help="classifications per session")
+    parser.add_argument('--ramp-up', type=float, default=1.0, help="seconds over which sessions start")
+    parser.add_argument('--image-size', type=parse_size, default=(640, 480))
+    parser.add_argument('--repeat-images', action='store_true',
+                        help="every session uploads the same images, exercising the result cache")
+    parser.add_argument('--poll-interval', type=float, default=0.2, help="seconds between polling reruns")
+    parser.add_argument('--request-timeout', type=float, default=120.0)
+    parser.add_argument('--script-timeout', type=float, default=30.0)
+    parser.add_argument('--backend-url', default=None, help="real backend instead of the local mock")
+    parser.add_argument('--latency', default='lognormal:0.3,0.4', help="mock backend latency distribution")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="mock backend error rate")
+    parser.add_argument('--reset-rate', type=float, default=0.0, help="mock backend connection reset rate")
+    parser.add_argument('--output', default='load_test.json', help="JSON results file")
+    args = parser.parse_args()
+
+    config = {key: value for key, value in vars(args).items() if key != 'output'}
+    results = run_load_test(config)
+    Path(args.output).write_text(json.dumps(results, indent=2))
+
+    latency = results['latency_s']
+    print(f"sessions {args.sessions} · completed {results['completed']} · errors {results['errors']}")
+    print(f"throughput {results['throughput_per_s']:.2f}/s · wall {results['wall_time_s']:.1f} s")
+    if results['completed']:
+        print(f"latency p50 {latency['p50']:.3f} s · p95 {latency['p95']:.3f} s · p99 {latency['p99']:.3f} s")
+    print(
+        f"script-thread occupancy {results['script_thread_occupancy']:.2f} · "
+        f"wait per script run {results['script_wait_per_run_s'] * 1000:.0f} ms"
+    )
+    if results['rss_growth_per_session_bytes'] is not None:
+        print(f"memory growth {results['rss_growth_per_session_bytes'] / 1024 / 1024:.1f} MB per session")
+    print(f"results written to {args.output}")
+
+if __name__ == '__main__':
+    main()
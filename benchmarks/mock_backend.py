@@ -0,0 +1,349 @@
+"""Local stand-in for the prediction backend, with latency and fault injection
+
+Serves POST /predict with the backend's response contract (class_index,
+confidence, heatmap_image, overlay_image, message), so the frontend can be
+load tested, benchmarked and resilience tested offline. The class and
+confidence are derived from the uploaded file's bytes, not the multipart
+body around them, so the same image always gets the same answer.
+
+Clients that accept the compact format (utils.compact) get a binary body
+with a low-resolution Grad-CAM array instead of the base64 images, unless
+--no-compact is given. Responses list the accepted upload formats in
+Accept-Post and are gzip-compressed for clients that accept it, unless
+--no-gzip is given.
+
+GET /health answers {"status": "ok"}; GET /stats returns request counters.
+Responses echo the X-Request-ID header and report the injected latency as
+Server-Timing, like an instrumented backend would.
+
+Latency distributions (--latency):
+    fixed:SECONDS  uniform:LOW,HIGH  normal:MEAN,STD
+    lognormal:MEDIAN,SIGMA  exponential:MEAN
+
+Usage: python -m benchmarks.mock_backend [--port 8000] [--latency lognormal:0.3,0.5]
+           [--image-size 227x277] [--error-rate 0.05] [--reset-rate 0.01]
+           [--slow-body-rate 0.1] [--heatmap-downscale 4] [--heatmap-dtype uint8]
+           [--no-compact] [--upload-formats image/png,image/webp] [--no-gzip]
+
+Point the app at it with BACKEND_URL = "http://127.0.0.1:8000" in
+.streamlit/secrets.toml.
+"""
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import random
+import socket
+import struct
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from io import BytesIO
+import numpy as np
+from PIL import Image
+from utils.compact import COMPACT_MEDIA_TYPE, encode_compact
+
+# Upload MIME types advertised in Accept-Post by default
+UPLOAD_FORMATS = ('image/png', 'image/webp', 'application/x-npy')
+# Bodies smaller than this are sent uncompressed
+GZIP_MIN_BYTES = 1024
+
+MESSAGES = {
+    0: "Fresh crater detected",
+    1: "Old crater detected",
+    2: "No crater detected"
+}
+
+def parse_latency(spec):
+    """Sampler of response delays in seconds for a ``name:params`` spec"""
+    name, _, params = spec.partition(':')
+    values = [float(value) for value in params.split(',')] if params else []
+    samplers = {
+        'fixed': lambda rng: values[0],
+        'uniform': lambda rng: rng.uniform(values[0], values[1]),
+        'normal': lambda rng: rng.gauss(values[0], values[1]),
+        'lognormal': lambda rng: values[0] * rng.lognormvariate(0, values[1]),
+        'exponential': lambda rng: rng.expovariate(1 / values[0])
+    }
+    if name not in samplers:
+        raise ValueError(f"Unknown latency distribution: {name}")
+    sampler = samplers[name]
+    return lambda rng: max(sampler(rng), 0.0)
+
+def make_heat(size, noise, rng):
+    """Grad-CAM style activation map in 0-1 of ``size``"""
+    width, height = size
+    y, x = np.mgrid[0:height, 0:width]
+    heat = np.exp(-(((x - width / 2) ** 2) + ((y - height / 2) ** 2)) / (0.1 * width * height))
+    return np.clip(heat + noise * rng.random((height, width)), 0, 1)
+
+def make_heatmap_array(size, noise, downscale=4, dtype='uint8', seed=0):
+    """Low-resolution heatmap array of a compact response, quantized to ``dtype``"""
+    if size is None:
+        return None
+    width, height = size
+    heat = make_heat((max(width // downscale, 1), max(height // downscale, 1)), noise, np.random.default_rng(seed))
+    if dtype == 'uint8':
+        return np.round(heat * 255).astype(np.uint8)
+    return heat.astype(np.float16)
+
+def make_images(size, noise, seed=0):
+    """Base64 PNG heatmap and overlay of ``size``; ``noise`` (0-1) makes them less compressible"""
+    if size is None:
+        return None, None
+
+    width, height = size
+    rng = np.random.default_rng(seed)
+    heat = make_heat(size, noise, rng)
+
+    heatmap = np.stack([heat * 255, heat * 180, (1 - heat) * 120], axis=-1)
+    surface = 110 + 40 * rng.random((height, width, 1))
+    overlay = 0.6 * surface + 0.4 * heatmap
+
+    encoded = []
+    for pixels in (heatmap, overlay):
+        buffer = BytesIO()
+        Image.fromarray(pixels.astype(np.uint8), mode='RGB').save(buffer, format='PNG')
+        encoded.append(base64.b64encode(buffer.getvalue()).decode('ascii'))
+    return tuple(encoded)
+
+def upload_bytes(body, content_type):
+    """Bytes of the file part of a multipart/form-data body, or the body itself
+
+    The multipart boundary is random per request, so only the file part
+    identifies the image.
+    """
+    if 'boundary=' not in content_type:
+        return body
+    boundary = content_type.split('boundary=', 1)[1].split(';')[0].strip().strip('"').encode()
+    for part in body.split(b'--' + boundary):
+        headers, separator, content = part.partition(b'\r\n\r\n')
+        if separator and b'filename=' in headers:
+            return content[:-2] if content.endswith(b'\r\n') else content
+    return body
+
+class MockBackend:
+    """Response generation and fault injection, shared by the server's handler threads"""
+
+    def __init__(self, latency='fixed:0', image_size=(227, 277), image_noise=0.0,
+                 error_rate=0.0, error_status=500, reset_rate=0.0,
+                 slow_body_rate=0.0, slow_body_chunk=4096, slow_body_delay=0.05, seed=None,
+                 compact=True, heatmap_downscale=4, heatmap_dtype='uint8',
+                 upload_formats=UPLOAD_FORMATS, gzip_level=1):
+        self.sample_latency = parse_latency(latency)
+        self.heatmap_image, self.overlay_image = make_images(image_size, image_noise)
+        self.compact = compact
+        self.upload_formats = upload_formats
+        self.gzip_level = gzip_level
+        self.heatmap_array = make_heatmap_array(image_size, image_noise, heatmap_downscale, heatmap_dtype)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.reset_rate = reset_rate
+        self.slow_body_rate = slow_body_rate
+        self.slow_body_chunk = slow_body_chunk
+        self.slow_body_delay = slow_body_delay
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counters = {'requests': 0, 'ok': 0, 'errors': 0, 'resets': 0, 'slow_bodies': 0, 'in_flight': 0}
+
+    def draw(self):
+        """Fault and latency draws for one request"""
+        with self._lock:
+            return {
+                'latency': self.sample_latency(self._rng),
+                'reset': self._rng.random() < self.reset_rate,
+                'error': self._rng.random() < self.error_rate,
+                'slow_body': self._rng.random() < self.slow_body_rate
+            }
+
+    def count(self, name, delta=1):
+        with self._lock:
+            self._counters[name] += delta
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def predict(self, upload, compact=False):
+        """Contract response for the uploaded file bytes
+
+        Returns (body bytes, content type): JSON with base64 images, or the
+        compact format with the heatmap array when ``compact`` is accepted.
+        """
+        digest = hashlib.sha256(upload).digest()
+        class_index = digest[0] % len(MESSAGES)
+        confidence = 0.5 + (digest[1] / 255) * 0.49
+        payload = {
+            'class_index': class_index,
+            'confidence': round(confidence, 4),
+            'message': MESSAGES[class_index]
+        }
+        if compact and self.compact and self.heatmap_array is not None:
+            return encode_compact(payload, self.heatmap_array), COMPACT_MEDIA_TYPE
+        payload.update(heatmap_image=self.heatmap_image, overlay_image=self.overlay_image)
+        return json.dumps(payload).encode(), 'application/json'
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; Nagle would hold the body back
+    disable_nagle_algorithm = True
+    backend = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, slow=False, server_time=None):
+        self.send_body(status, json.dumps(payload).encode(), 'application/json', slow, server_time)
+
+    def send_body(self, status, body, content_type, slow=False, server_time=None):
+        accept_encoding = self.headers.get('Accept-Encoding', '')
+        compress = (
+            self.backend.gzip_level and len(body) >= GZIP_MIN_BYTES
+            and 'gzip' in [part.split(';')[0].strip() for part in accept_encoding.split(',')]
+        )
+        if compress:
+            body = gzip.compress(body, compresslevel=self.backend.gzip_level)
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        if self.backend.upload_formats:
+            self.send_header('Accept-Post', ', '.join(self.backend.upload_formats))
+        self.send_header('Content-Length', str(len(body)))
+        if self.headers.get('X-Request-ID'):
+            self.send_header('X-Request-ID', self.headers['X-Request-ID'])
+        if server_time is not None:
+            self.send_header('Server-Timing', f"app;dur={server_time * 1000:.1f}")
+        self.end_headers()
+
+        if not slow:
+            self.wfile.write(body)
+            return
+        # Trickle the body out so clients spend their time in the download phase
+        for start in range(0, len(body), self.backend.slow_body_chunk):
+            self.wfile.write(body[start:start + self.backend.slow_body_chunk])
+            self.wfile.flush()
+            time.sleep(self.backend.slow_body_delay)
+
+    def reset_connection(self):
+        """Abort the connection with a TCP RST instead of an orderly close"""
+        self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        self.close_connection = True
+        self.connection.close()
+
+    def do_GET(self):
+        if self.path == '/health':
+            self.send_json(200, {'status': 'ok'})
+        elif self.path == '/stats':
+            self.send_json(200, self.backend.stats())
+        else:
+            self.send_json(404, {'detail': 'Not Found'})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.rstrip('/') != '/predict':
+            self.send_json(404, {'detail': 'Not Found'})
+            return
+
+        backend = self.backend
+        draw = backend.draw()
+        backend.count('requests')
+        backend.count('in_flight')
+        started_at = time.perf_counter()
+        try:
+            time.sleep(draw['latency'])
+            if draw['reset']:
+                backend.count('resets')
+                self.reset_connection()
+            elif draw['error']:
+                backend.count('errors')
+                self.send_json(backend.error_status, {'detail': 'Injected failure'},
+                               server_time=time.perf_counter() - started_at)
+            else:
+                backend.count('ok')
+                backend.count('slow_bodies', draw['slow_body'])
+                response_body, content_type = backend.predict(
+                    upload_bytes(body, self.headers.get('Content-Type', '')),
+                    compact=COMPACT_MEDIA_TYPE in self.headers.get('Accept', '')
+                )
+                self.send_body(200, response_body, content_type, slow=draw['slow_body'],
+                               server_time=time.perf_counter() - started_at)
+        finally:
+            backend.count('in_flight', -1)
+
+def make_server(backend, host='127.0.0.1', port=8000):
+    """HTTP server answering with ``backend``; port 0 picks a free port"""
+    handler = type('BoundMockHandler', (MockHandler,), {'backend': backend})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def start_in_thread(backend, host='127.0.0.1', port=0):
+    """Serve ``backend`` from a daemon thread; returns (server, base_url)"""
+    server = make_server(backend, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def parse_size(value):
+    """WxH argument, or None for 0"""
+    if value in ('0', 'none'):
+        return None
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', default='lognormal:0.3,0.4', help="latency distribution, see above")
+    parser.add_argument('--image-size', type=parse_size, default=(227, 277),
+                        help="heatmap/overlay size WxH, 0 to send null images")
+    parser.add_argument('--image-noise', type=float, default=0.0,
+                        help="0-1, noisier images compress worse and make larger payloads")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with an error")
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--reset-rate', type=float, default=0.0, help="fraction of connections reset")
+    parser.add_argument('--slow-body-rate', type=float, default=0.0, help="fraction of bodies streamed slowly")
+    parser.add_argument('--slow-body-chunk', type=int, default=4096, help="bytes per slow body chunk")
+    parser.add_argument('--slow-body-delay', type=float, default=0.05, help="seconds between slow body chunks")
+    parser.add_argument('--heatmap-downscale', type=int, default=4,
+                        help="compact heatmap arrays are the image size divided by this")
+    parser.add_argument('--heatmap-dtype', choices=['uint8', 'float16'], default='uint8')
+    parser.add_argument('--no-compact', action='store_true',
+                        help="answer in JSON even to clients that accept the compact format")
+    parser.add_argument('--upload-formats', default=','.join(UPLOAD_FORMATS),
+                        help="comma-separated upload MIME types advertised in Accept-Post, empty for none")
+    parser.add_argument('--no-gzip', action='store_true', help="never compress responses")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    backend = MockBackend(
+        latency=args.latency,
+        image_size=args.image_size,
+        image_noise=args.image_noise,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        reset_rate=args.reset_rate,
+        slow_body_rate=args.slow_body_rate,
+        slow_body_chunk=args.slow_body_chunk,
+        slow_body_delay=args.slow_body_delay,
+        seed=args.seed,
+        compact=not args.no_compact,
+        heatmap_downscale=args.heatmap_downscale,
+        heatmap_dtype=args.heatmap_dtype,
+        upload_formats=tuple(mime_type for mime_type in args.upload_formats.split(',') if mime_type),
+        gzip_level=0 if args.no_gzip else 1
+    )
+    server = make_server(backend, args.host, args.port)
+    print(f"Mock backend on http://{args.host}:{server.server_address[1]} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
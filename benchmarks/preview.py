@@ -0,0 +1,86 @@
+"""Micro-benchmark of the upload and result previews
+
+Old path, run on every rerun: Image.open on the upload, then st.image
+re-encodes the full raster for the browser.
+New path: utils.previews.make_preview decodes at reduced resolution and
+encodes a display-size preview once per upload content; every rerun after
+that is a preview cache lookup.
+
+Usage: python -m benchmarks.preview [--size 2000x1500] [--format TIFF] [--repeat 10]
+"""
+import argparse
+import time
+from io import BytesIO
+import numpy as np
+from PIL import Image
+from utils.previews import PreviewCache, content_hash, make_preview
+
+def make_scene(width, height, image_format):
+    """Synthetic 8-bit grayscale surface image encoded in ``image_format``"""
+    y, x = np.mgrid[0:height, 0:width]
+    surface = 128 + 60 * np.sin(x / 37.0) * np.cos(y / 53.0) + np.random.default_rng(0).normal(0, 12, (height, width))
+    buffer = BytesIO()
+    Image.fromarray(np.clip(surface, 0, 255).astype(np.uint8), mode='L').save(buffer, format=image_format)
+    return buffer.getvalue()
+
+def old_path(data):
+    """Decode in full and re-encode at full resolution like st.image does for a PIL image"""
+    image = Image.open(BytesIO(data))
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return len(buffer.getvalue())
+
+def new_first_render(data):
+    """Reduced-resolution decode and a display-size encode"""
+    preview, _ = make_preview(data)
+    return len(preview)
+
+def new_rerun(cached):
+    """Every later rerun hashes nothing and looks the preview up"""
+    cache, key = cached
+    preview, _ = cache.get(key)
+    return len(preview)
+
+def time_call(fn, arg, repeat):
+    """Median wall time of fn(arg) in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        fn(arg)
+        samples.append((time.perf_counter() - started_at) * 1000)
+    return float(np.median(samples))
+
+def run(size, image_format, repeat):
+    """Time both paths and measure what goes to the browser for one input size"""
+    data = make_scene(*size, image_format)
+    cache = PreviewCache()
+    key = content_hash(data)
+    cache.put(key, make_preview(data))
+
+    return {
+        'size': f"{size[0]}x{size[1]}",
+        'old_ms': time_call(old_path, data, repeat),
+        'new_first_ms': time_call(new_first_render, data, repeat),
+        'new_rerun_ms': time_call(new_rerun, (cache, key), repeat),
+        'old_payload': old_path(data),
+        'new_payload': new_first_render(data)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', action='append', help="input size WxH, can be repeated")
+    parser.add_argument('--format', default='TIFF', help="input format: TIFF, JPEG or PNG")
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    sizes = [tuple(int(v) for v in s.split('x')) for s in (args.size or ['1024x1024', '4000x3000'])]
+    print(f"{'size':>10} {'old/rerun':>12} {'new/first':>12} {'new/rerun':>12} {'old bytes':>12} {'new bytes':>12}")
+    for size in sizes:
+        row = run(size, args.format, args.repeat)
+        print(
+            f"{row['size']:>10} {row['old_ms']:>10.2f}ms {row['new_first_ms']:>10.2f}ms "
+            f"{row['new_rerun_ms']:>10.4f}ms {row['old_payload']:>12,} {row['new_payload']:>12,}"
+        )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+"""Stage-level benchmark of the single-image classify path, with stored baselines
+
+Times each stage separately:
+    decode            full decode of PNG/JPEG/TIFF uploads of several sizes
+    decode_reduced    reduced-resolution decode to the model input size
+    preprocess        PNG re-encode for the upload, optimized and unoptimized
+    upload_codecs     encoding the model input with every upload codec
+    upload            multipart POST of the prepared upload to the mock backend
+    response_json     response.json() on responses with large base64 images
+    parse_response    parse_backend_response into the session blob store
+    heatmap           first render of the overlay and every rerun after it
+    compact           JSON vs compact response, from body bytes to the displayed overlay
+
+Each case is run --repeat times and reports its best time, which is far
+less noisy than the mean on a shared machine, and its median. Best times are
+compared with benchmarks/baselines.json. A case is suspect when it is slower
+than its baseline by more than --tolerance, by at least --min-delta
+milliseconds, and by more than its own spread in this run (median minus
+best). Suspect stages are then measured again with three times the repeats,
+and only cases still slower are flagged as regressions, so one noisy stretch
+of a run cannot fail it.
+
+Cases are keyed by stage and name only; the payload size of stages that
+move encoded bytes is printed next to them, so a different encoder output
+does not turn a case into a new one without a baseline.
+
+Baselines are machine-specific: record them with --save-baseline on the
+machine you compare on. A fixed calibration workload is stored with them and
+re-measured on every run; baselines are scaled by how much slower or faster
+it ran, so a busier or slower machine does not read as a regression.
+
+Usage: python -m benchmarks.stages [--stage decode] [--repeat 7]
+           [--save-baseline] [--tolerance 0.5] [--fail-on-regression]
+"""
+import argparse
+import base64
+import json
+import sys
+import time
+import zlib
+from io import BytesIO
+from pathlib import Path
+import numpy as np
+import requests
+from PIL import Image
+from benchmarks.mock_backend import MockBackend, make_heatmap_array, make_images, start_in_thread
+from utils.backend_client import BackendClient
+from utils.compact import COMPACT_MEDIA_TYPE, decode_response, encode_compact
+from utils.heatmap import get_overlay_display
+from utils.ingest import ImageReader
+from utils.negotiation import UPLOAD_CODECS, encode_upload
+from utils.preprocessing import get_model_input_size, preprocess_image
+from utils.previews import make_preview
+from utils.results import parse_backend_response
+from utils.session_store import BlobStore
+
+BASELINE_FILE = Path(__file__).resolve().parent / 'baselines.json'
+# Baseline key of the calibration workload's best time
+CALIBRATION_KEY = '_calibration'
+
+UPLOAD_SIZES = [(227, 277), (1024, 1024), (4000, 3000)]
+UPLOAD_FORMATS = ['PNG', 'JPEG', 'TIFF']
+RESPONSE_IMAGE_SIZES = [(227, 277), (1024, 1024)]
+
+def make_upload(size, image_format):
+    """Synthetic 8-bit grayscale surface image encoded in ``image_format``"""
+    width, height = size
+    y, x = np.mgrid[0:height, 0:width]
+    surface = 128 + 60 * np.sin(x / 37.0) * np.cos(y / 53.0) + np.random.default_rng(0).normal(0, 12, (height, width))
+    buffer = BytesIO()
+    Image.fromarray(np.clip(surface, 0, 255).astype(np.uint8), mode='L').save(buffer, format=image_format)
+    return buffer.getvalue()
+
+def make_response_body(image_size):
+    """Backend JSON body with base64 heatmap and overlay of ``image_size``"""
+    heatmap_image, overlay_image = make_images(image_size, noise=0.3)
+    return json.dumps({
+        'class_index': 1,
+        'confidence': 0.87,
+        'heatmap_image': heatmap_image,
+        'overlay_image': overlay_image,
+        'message': "Old crater detected"
+    }).encode()
+
+def make_response(body, content_type='application/json'):
+    """requests.Response carrying ``body``, as the client receives it"""
+    response = requests.models.Response()
+    response.status_code = 200
+    response.headers['Content-Type'] = content_type
+    response._content = body
+    response.encoding = 'utf-8'
+    return response
+
+def time_call(fn, repeat, setup=None):
+    """Best and median wall time of fn(setup()) in milliseconds, after one warm-up call"""
+    setup = setup or (lambda: None)
+    fn(setup())
+    samples = []
+    for _ in range(repeat):
+        arg = setup()
+        started_at = time.perf_counter()
+        fn(arg)
+        samples.append((time.perf_counter() - started_at) * 1000)
+    samples.sort()
+    return samples[0], samples[len(samples) // 2]
+
+def calibrate(repeat):
+    """Best time of a fixed decode, NumPy and zlib workload, the machine's speed at the moment"""
+    image = Image.open(BytesIO(make_upload((1024, 1024), 'PNG')))
+    image.load()
+
+    def workload(_):
+        pixels = np.asarray(image, dtype=np.float32)
+        zlib.compress(np.clip(pixels * 0.5 + 10, 0, 255).astype(np.uint8).tobytes(), 6)
+
+    return time_call(workload, repeat)[0]
+
+def bench_decode(repeat):
+    for size in UPLOAD_SIZES:
+        for image_format in UPLOAD_FORMATS:
+            data = make_upload(size, image_format)
+            yield f"{image_format} {size[0]}x{size[1]}", time_call(lambda _: ImageReader(data).decode(), repeat), None
+
+def bench_decode_reduced(repeat):
+    target_width, target_height = get_model_input_size()
+    for size in UPLOAD_SIZES[1:]:
+        for image_format in UPLOAD_FORMATS:
+            data = make_upload(size, image_format)
+            scale = max(target_width / size[0], target_height / size[1])
+            yield (
+                f"{image_format} {size[0]}x{size[1]}",
+                time_call(lambda _: ImageReader(data).read_reduced(scale), repeat),
+                None
+            )
+
+def bench_preprocess(repeat):
+    for size in UPLOAD_SIZES:
+        image = ImageReader(make_upload(size, 'PNG')).decode()
+        for enabled in (True, False):
+            name = f"{size[0]}x{size[1]} {'optimized' if enabled else 'unoptimized'}"
+            yield name, time_call(lambda _: preprocess_image(image, 'chip.png', 0, enabled=enabled), repeat), None
+
+def bench_upload_codecs(repeat):
+    image = ImageReader(make_upload(get_model_input_size(), 'PNG')).decode().convert('L')
+    for codec in UPLOAD_CODECS:
+        yield codec, time_call(lambda _: encode_upload(image, codec), repeat), len(encode_upload(image, codec))
+
+def bench_upload(repeat):
+    server, base_url = start_in_thread(MockBackend(image_size=None))
+    client = BackendClient(base_url)
+    try:
+        for size in UPLOAD_SIZES:
+            image = ImageReader(make_upload(size, 'PNG')).decode()
+            upload = preprocess_image(image, 'chip.png', 0, enabled=False)
+            yield (
+                f"{size[0]}x{size[1]}",
+                time_call(lambda _: client.predict(upload['filename'], upload['data'], upload['mime_type']), repeat),
+                len(upload['data'])
+            )
+    finally:
+        client.close()
+        server.shutdown()
+
+def bench_response_json(repeat):
+    for size in RESPONSE_IMAGE_SIZES:
+        body = make_response_body(size)
+        yield (
+            f"images {size[0]}x{size[1]}",
+            time_call(lambda response: response.json(), repeat, setup=lambda: make_response(body)),
+            len(body)
+        )
+
+def bench_parse_response(repeat):
+    for size in RESPONSE_IMAGE_SIZES:
+        response_data = json.loads(make_response_body(size))
+        yield (
+            f"images {size[0]}x{size[1]}",
+            time_call(lambda store: parse_backend_response(response_data, store), repeat, setup=BlobStore),
+            None
+        )
+
+def bench_heatmap(repeat):
+    for size in RESPONSE_IMAGE_SIZES:
+        overlay = base64.b64decode(make_images(size, noise=0.3)[1])
+
+        def fresh_result():
+            store = BlobStore()
+            return {'overlay_ref': store.put(overlay)}, store
+
+        rendered = fresh_result()
+        get_overlay_display(*rendered)
+        yield (
+            f"first render {size[0]}x{size[1]}",
+            time_call(lambda args: get_overlay_display(*args), repeat, setup=fresh_result),
+            None
+        )
+        yield f"rerun {size[0]}x{size[1]}", time_call(lambda _: get_overlay_display(*rendered), repeat), None
+
+def bench_compact(repeat):
+    for size in RESPONSE_IMAGE_SIZES:
+        preview, _ = make_preview(make_upload(size, 'JPEG'))
+        payload = {'class_index': 1, 'confidence': 0.87, 'message': "Old crater detected"}
+        bodies = [
+            ('json', make_response_body(size), 'application/json'),
+            ('compact', encode_compact(payload, make_heatmap_array(size, noise=0.3)), COMPACT_MEDIA_TYPE)
+        ]
+        for name, body, content_type in bodies:
+            def to_overlay(store):
+                result = parse_backend_response(decode_response(make_response(body, content_type)), store)
+                result['preview_ref'] = store.put(preview)
+                return get_overlay_display(result, store)
+
+            yield (
+                f"{name} {size[0]}x{size[1]}",
+                time_call(to_overlay, repeat, setup=BlobStore),
+                len(body)
+            )
+
+STAGES = {
+    'decode': bench_decode,
+    'decode_reduced': bench_decode_reduced,
+    'preprocess': bench_preprocess,
+    'upload_codecs': bench_upload_codecs,
+    'upload': bench_upload,
+    'response_json': bench_response_json,
+    'parse_response': bench_parse_response,
+    'heatmap': bench_heatmap,
+    'compact': bench_compact
+}
+
+def load_baselines():
+    if BASELINE_FILE.exists():
+        return json.loads(BASELINE_FILE.read_text())
+    return {}
+
+def baseline_scale(baselines, calibration_ms):
+    """Factor for the stored baselines from the calibration time measured now"""
+    if CALIBRATION_KEY not in baselines:
+        return 1.0
+    return calibration_ms / baselines[CALIBRATION_KEY]
+
+def is_slower(best_ms, median_ms, baseline, args):
+    """Whether a best time is slower than its (scaled) baseline beyond tolerance and noise"""
+    slowdown = best_ms - baseline
+    return (
+        best_ms / baseline - 1 > args.tolerance
+        and slowdown >= args.min_delta
+        and slowdown > median_ms - best_ms
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stage', action='append', choices=list(STAGES), help="stage to run, can be repeated")
+    parser.add_argument('--repeat', type=int, default=11)
+    parser.add_argument('--tolerance', type=float, default=0.5, help="allowed relative slowdown over the baseline")
+    parser.add_argument('--min-delta', type=float, default=1.0,
+                        help="slowdowns below this many milliseconds are never flagged")
+    parser.add_argument('--save-baseline', action='store_true', help="store these timings as the new baseline")
+    parser.add_argument('--fail-on-regression', action='store_true', help="exit with status 1 on a regression")
+    args = parser.parse_args()
+
+    baselines = load_baselines()
+    calibration_ms = calibrate(args.repeat)
+    # Baselines scaled to how fast this machine runs the calibration workload right now
+    speed = baseline_scale(baselines, calibration_ms)
+    print(f"Calibration: {calibration_ms:.2f}ms, baselines scaled by {speed:.2f}")
+
+    suspects, unmatched = {}, []
+    print(
+        f"{'stage':<16} {'case':<24} {'payload':>9} {'best':>10} {'median':>10} {'baseline':>10} {'change':>8}"
+    )
+    for stage in args.stage or list(STAGES):
+        for case, (best_ms, median_ms), payload_bytes in STAGES[stage](args.repeat):
+            key = f"{stage}/{case}"
+            baseline = baselines.get(key) * speed if baselines.get(key) else None
+            change, flag = '', ''
+            if baseline:
+                change = f"{best_ms / baseline - 1:+.0%}"
+                if is_slower(best_ms, median_ms, baseline, args):
+                    flag = '  SUSPECT'
+                    suspects.setdefault(stage, {})[case] = best_ms
+            elif baselines:
+                unmatched.append(key)
+            payload = f"{payload_bytes // 1024} KB" if payload_bytes is not None else ''
+            print(
+                f"{stage:<16} {case:<24} {payload:>9} {best_ms:>8.2f}ms {median_ms:>8.2f}ms "
+                f"{f'{baseline:.2f}ms' if baseline else '-':>10} {change:>8}{flag}"
+            )
+            if args.save_baseline:
+                baselines[key] = round(best_ms, 4)
+
+    # Suspect stages run again, longer and re-calibrated; the better of both best times counts
+    regressions = []
+    if suspects and not args.save_baseline:
+        speed = baseline_scale(baselines, calibrate(args.repeat))
+        print(f"Re-measuring {sum(map(len, suspects.values()))} suspect case(s), baselines scaled by {speed:.2f}")
+        for stage, cases in suspects.items():
+            for case, (best_ms, median_ms), _ in STAGES[stage](args.repeat * 3):
+                if case not in cases:
+                    continue
+                key = f"{stage}/{case}"
+                best_ms = min(best_ms, cases[case])
+                baseline = baselines[key] * speed
+                flag = ''
+                if is_slower(best_ms, median_ms, baseline, args):
+                    flag = '  REGRESSION'
+                    regressions.append(key)
+                print(
+                    f"{stage:<16} {case:<24} {'':>9} {best_ms:>8.2f}ms {median_ms:>8.2f}ms "
+                    f"{baseline:>8.2f}ms {best_ms / baseline - 1:>+8.0%}{flag}"
+                )
+
+    if args.save_baseline:
+        baselines[CALIBRATION_KEY] = round(calibration_ms, 4)
+        BASELINE_FILE.write_text(json.dumps(dict(sorted(baselines.items())), indent=2) + '\n')
+        print(f"Baselines written to {BASELINE_FILE}")
+    elif unmatched:
+        # A renamed case would otherwise drop out of the regression check unnoticed
+        print(f"{len(unmatched)} case(s) without a baseline, run --save-baseline: {', '.join(unmatched)}")
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
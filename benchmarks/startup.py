@@ -0,0 +1,121 @@
+"""Startup profile of every page: import-time breakdown and time to first render
+
+Each page is rendered in a fresh Python process, as on a cold start, with
+``-X importtime``. The first script run includes the page's imports; a
+second run shows the cost of a warm rerun. Imports made by the test harness
+itself are left out, so the breakdown shows what the page pulls in.
+
+The breakdown sums each module's own import time by top-level package
+(numpy, PIL, requests, utils, ...), and lists the slowest imports the page
+triggered, with their dependencies included.
+
+Usage: python -m benchmarks.startup [--page pages/classify.py] [--top 10]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGES = ['main.py', 'pages/about.py', 'pages/classify.py', 'pages/performance.py', 'pages/history.py']
+MARKER = '--- page run starts ---'
+
+def render_page(page):
+    """Child process: render ``page`` twice and print the timings as JSON"""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(str(ROOT / page), default_timeout=120)
+    app.secrets['BACKEND_URL'] = 'http://127.0.0.1:9'  # Never contacted by the first render
+    app.secrets['TELEMETRY_LOG'] = 'off'
+
+    print(MARKER, file=sys.stderr, flush=True)
+    started_at = time.perf_counter()
+    app.run()
+    first_render = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    app.run()
+    rerun = time.perf_counter() - started_at
+
+    heavy = [name for name in ('numpy', 'PIL', 'requests', 'pandas', 'pyarrow') if name in sys.modules]
+    print(json.dumps({
+        'first_render': first_render,
+        'rerun': rerun,
+        'exceptions': [exception.value for exception in app.exception],
+        'heavy_modules': heavy
+    }))
+
+def parse_importtime(stderr):
+    """(module, self µs, cumulative µs, depth) for each import logged after the marker"""
+    imports = []
+    lines = stderr.splitlines()
+    start = lines.index(MARKER) + 1 if MARKER in lines else 0
+    for line in lines[start:]:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+def profile_page(page):
+    """Render ``page`` in a fresh process and summarize its imports"""
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', 'benchmarks.startup', '--child', page],
+        capture_output=True, text=True, cwd=ROOT, env={**os.environ, 'PYTHONPATH': str(ROOT)}
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"{page} failed to render:\n{process.stderr[-2000:]}")
+
+    timings = json.loads(process.stdout.strip().splitlines()[-1])
+    imports = parse_importtime(process.stderr)
+    top_depth = min((depth for _, _, _, depth in imports), default=0)
+
+    by_package = {}
+    for name, self_us, _, _ in imports:
+        package = name.split('.')[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+
+    return {
+        **timings,
+        'import_time': sum(self_us for _, self_us, _, _ in imports) / 1e6,
+        'modules_imported': len(imports),
+        'by_package': {package: us / 1e6 for package, us in by_package.items()},
+        'slowest_imports': sorted(
+            ((name, cumulative_us / 1e6) for name, _, cumulative_us, depth in imports if depth == top_depth),
+            key=lambda item: -item[1]
+        )
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--page', action='append', choices=PAGES, help="page to profile, can be repeated")
+    parser.add_argument('--top', type=int, default=8, help="packages and imports listed per page")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        render_page(args.child)
+        return
+
+    for page in args.page or PAGES:
+        profile = profile_page(page)
+        print(
+            f"{page}: first render {profile['first_render'] * 1000:.0f} ms "
+            f"(imports {profile['import_time'] * 1000:.0f} ms, {profile['modules_imported']} modules) · "
+            f"rerun {profile['rerun'] * 1000:.0f} ms"
+        )
+        print(f"  heavy modules loaded: {', '.join(profile['heavy_modules']) or 'none'}")
+        packages = sorted(profile['by_package'].items(), key=lambda item: -item[1])[:args.top]
+        print("  by package: " + " · ".join(f"{package} {seconds * 1000:.0f} ms" for package, seconds in packages))
+        print("  slowest imports: " + " · ".join(
+            f"{name} {seconds * 1000:.0f} ms" for name, seconds in profile['slowest_imports'][:args.top]
+        ))
+        for exception in profile['exceptions']:
+            print(f"  exception: {exception}")
+
+if __name__ == '__main__':
+    main()
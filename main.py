@@ -3,6 +3,7 @@ import streamlit as st
 from pathlib import Path
 from utils.layout import init_layout, render_footer
 from utils.navigation import render_sidebar_navigation
+from utils.telemetry import get_telemetry
 
 # Initialize layout
 init_layout(page_title="Home", page_icon="🌙")
@@ -82,6 +83,8 @@ def hero_section():
 
 def main():
     """Main application entry point"""
+    # Starts the metrics endpoint and file writer with the app, before any classification
+    get_telemetry()
     hero_section()
     st.markdown("<br><br>", unsafe_allow_html=True)
     render_footer()
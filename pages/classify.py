@@ -1,16 +1,29 @@
 import streamlit as st
 import time
 import json
-import requests
-from io import BytesIO
-from PIL import Image
+from datetime import datetime
+from concurrent.futures import CancelledError
 import sys
 from pathlib import Path
-from urllib.parse import urljoin
 from utils.layout import init_layout, render_footer
-import base64
-import numpy as np
-import random
+from utils.backend_client import get_backend_client
+from utils.preprocessing import format_bytes, get_model_input_size
+from utils.ingest import ImageReader, ImageTooLargeError
+from utils.previews import get_preview_cache, get_upload_preview
+from utils.export import BATCH_COLUMNS, EXPORT_FORMATS, batch_records, export_bytes, export_columns
+from utils.heatmap import get_overlay_display
+from utils.history import get_history_store, record_result
+from utils.result_cache import get_result_cache, get_scene_result_cache, get_backend_version
+from utils.pipeline import run_classification, run_batch, BackendError
+from utils.scene import run_scene, tile_grid, SCENE_CLASS_ALPHA
+from utils.results import CLASS_LABELS, CLASS_MAPPING, parse_backend_response, result_refs
+from utils.jobs import get_job_runner, JobCancelled
+from utils.admission import get_admission_controller, QueueFullError
+from utils.resilience import CircuitOpenError, DeadlineExceededError
+from utils.session import get_session_id
+from utils.session_store import get_session_store, session_memory_report
+from utils.settings import get_setting
+from utils.telemetry import get_telemetry
 
 # Add parent directory to path to import utils
 sys.path.append(str(Path(__file__).parent.parent))
@@ -90,37 +103,23 @@ STYLES = """
 </style>
 """
 
-# Class mapping from backend
-CLASS_MAPPING = {
-    0: {
-        'classification': 'fresh_crater',
-        'display_name': 'Fresh Crater',
-        'color': 'purple',
-        'icon': '🌟',
-        'title': 'Fresh Crater Detected',
-        'description': 'This crater shows signs of recent impact with visible ejecta material. The sharp edges and bright rays indicate it formed relatively recently in geological terms.',
-        'age_range': (100, 900)  # million years
-    },
-    1: {
-        'classification': 'old_crater',
-        'display_name': 'Old Crater',
-        'color': 'blue',
-        'icon': '⏳',
-        'title': 'Old Crater Detected',
-        'description': 'This crater shows signs of degradation with softened edges and filled interior. The lack of visible ejecta suggests it formed over a billion years ago.',
-        'age_range': (1.0, 3.5)  # billion years
-    },
-    2: {
-        'classification': 'none',
-        'display_name': 'No Crater Detected',
-        'color': 'gray',
-        'icon': '🌑',
-        'title': 'No Crater Detected',
-        'description': 'The analyzed region appears to be lunar surface terrain without a significant crater formation.',
-        'age_range': None
-    }
+# Progress bar range and label of each classify phase
+PROGRESS_PHASES = {
+    'queued': (0, 0, "🕒 Waiting for a free worker..."),
+    'admission': (0, 0, "🚦 Waiting in queue..."),
+    'retry': (10, 10, "🔁 Backend hiccup, retrying..."),
+    'coalesced': (10, 10, "🤝 Same image already in flight, sharing its result..."),
+    'running': (0, 0, "🌙 Analyzing lunar surface..."),
+    'preprocess': (0, 10, "🖼️ Preparing image..."),
+    'upload': (10, 60, "📤 Uploading image..."),
+    'wait': (60, 85, "⏳ Waiting for backend response..."),
+    'download': (85, 95, "📥 Receiving result..."),
+    'decode': (95, 100, "🧮 Decoding result...")
 }
 
+# Seconds between polls of a running background job
+JOB_POLL_INTERVAL = 0.5
+
 # Info card data
 INFO_CARDS = [
     {'title': 'Fresh Crater', 'age': '< 1 billion years', 'color': 'purple', 'hex': '#c084fc'},
@@ -132,8 +131,19 @@ def init_session_state():
     """Initialize session state variables"""
     defaults = {
         'classification_result': None,
-        'image_preview': None,
-        'processing': False
+        'processing': False,
+        'classify_job': None,
+        'classify_error': None,
+        'speculative_key': None,
+        'speculative_job': None,
+        'speculative_result': None,
+        'batch_job': None,
+        'batch_results': [],
+        'batch_error': None,
+        'batch_table_version': 0,
+        'scene_job': None,
+        'scene_result': None,
+        'scene_error': None
     }
     for key, value in defaults.items():
         if key not in st.session_state:
@@ -150,8 +160,39 @@ def render_header():
         </div>
     """, unsafe_allow_html=True)
 
+def render_backend_health():
+    """Warn while the backend circuit breaker is failing requests fast"""
+    backend_url = get_setting("BACKEND_URL")
+    if not backend_url:
+        return
+
+    breaker = get_backend_client(backend_url).breaker.snapshot()
+    if breaker['state'] == 'open':
+        st.warning(
+            f"🔌 The backend is failing. Classifications fail fast for the next "
+            f"{breaker['retry_after']:.0f} seconds."
+        )
+    elif breaker['state'] == 'half_open':
+        st.info("🔌 Checking whether the backend has recovered...")
+
 def render_upload_section():
     """Render image upload section"""
+    render_backend_health()
+
+    mode = st.radio(
+        "Mode",
+        ["Single image", "Batch", "Scene"],
+        horizontal=True,
+        key="upload_mode",
+        label_visibility="collapsed"
+    )
+    if mode == "Batch":
+        render_batch_section()
+        return
+    if mode == "Scene":
+        render_scene_section()
+        return
+
     st.markdown('<div class="upload-area">', unsafe_allow_html=True)
 
     uploaded_file = st.file_uploader(
@@ -164,131 +205,661 @@ def render_upload_section():
     st.markdown('</div>', unsafe_allow_html=True)
 
     if uploaded_file:
-        image = Image.open(uploaded_file)
-
-        # Preview
+        # Display-size preview, built once per upload content and reused by the result view
         _, col, _ = st.columns([1, 2, 1])
         with col:
-            st.image(image, caption="Preview", width='stretch')
+            try:
+                preview_bytes, preview_format = get_upload_preview(uploaded_file)
+            except ImageTooLargeError as e:
+                st.warning(f"🖼️ No preview: {e}")
+            except (OSError, ValueError):
+                st.warning("🖼️ No preview: the file could not be read as an image. It may be corrupt or truncated.")
+            else:
+                st.image(preview_bytes, caption="Preview", width='stretch', output_format=preview_format)
+                render_previous_classification(st.session_state.upload_preview_key[1])
 
-        # Classify button
+        # Classify button, or the progress of the running classification
         _, col, _ = st.columns([1, 1, 1])
         with col:
-            if st.button("🔬 Classify Image", width='stretch', type="primary"):
-                classify_image(uploaded_file, image)
-
-def parse_backend_response(response_data):
-    """Parse backend response and map to frontend format"""
-    class_index = response_data['class_index']
-    confidence = response_data['confidence'] * 100  # Convert to percentage
-    heatmap_base64 = response_data.get('heatmap_image')
-    overlay_image = response_data.get('overlay_image')
-
-    class_info = CLASS_MAPPING[class_index]
-
-    # Calculate estimated age based on class (frontend logic)
-    estimated_age = None
-    if class_info['age_range']:
-        if class_index == 0:  # Fresh crater (million years)
-            estimated_age = f"{random.randint(*class_info['age_range'])} million years"
-        elif class_index == 1:  # Old crater (billion years)
-            estimated_age = f"{random.uniform(*class_info['age_range']):.1f} billion years"
+            if st.session_state.classify_job is not None:
+                render_classify_job()
+                return
 
-    return {
-        'classification': class_info['classification'],
-        'display_name': class_info['display_name'],
-        'confidence': round(confidence, 1),
-        'estimated_age': estimated_age,
-        'color': class_info['color'],
-        'icon': class_info['icon'],
-        'title': class_info['title'],
-        'description': class_info['description'],
-        'heatmap_base64': heatmap_base64,
-        'overlay_image': overlay_image,
-        'raw_response': response_data
-    }
+            optimize = st.toggle(
+                "Optimize upload for model input",
+                value=get_setting("PREPROCESS_UPLOADS", True),
+                help="Downsample to the model input size and send 8-bit grayscale",
+                key="optimize_upload"
+            )
+            speculative = st.toggle(
+                "Start classifying on upload",
+                value=get_setting("SPECULATIVE_CLASSIFY", False),
+                help="Send the image to the backend as soon as it is uploaded",
+                key="speculative_mode"
+            )
 
-def classify_image(uploaded_file, image):
-    """Handle image classification with backend API"""
-    st.session_state.processing = True
-    st.session_state.image_preview = image
+            speculative_key = (uploaded_file.file_id, optimize)
+            if speculative:
+                start_speculative_job(uploaded_file, optimize, speculative_key)
+                render_speculative_status()
+            else:
+                cancel_speculative_job()
 
-    with st.spinner("🌙 Analyzing lunar surface..."):
-        progress_bar = st.progress(0)
+            if st.button("🔬 Classify Image", width='stretch', type="primary", key="classify_button"):
+                if not reveal_speculative_result(speculative_key):
+                    classify_image(uploaded_file, optimize)
+    else:
+        cancel_speculative_job()
 
-        try:
-            # Prepare image for API
-            img_byte_arr = BytesIO()
-            image.save(img_byte_arr, format='PNG')
-            img_byte_arr.seek(0)
+    render_classify_error()
 
-            # Update progress - preparation
-            for i in range(30):
-                time.sleep(0.01)
-                progress_bar.progress(i + 1)
+def render_batch_section():
+    """Render multi-file batch upload and the batch results table"""
+    st.markdown('<div class="upload-area">', unsafe_allow_html=True)
 
-            # Call backend API
-            files = {'file': (uploaded_file.name, img_byte_arr, 'image/png')}
+    uploaded_files = st.file_uploader(
+        "Drop your lunar crater images here or click to browse",
+        type=['png', 'jpg', 'jpeg', 'tif', 'tiff'],
+        accept_multiple_files=True,
+        help="Upload a set of lunar surface chips to classify in one go",
+        key="batch_uploader",
+        label_visibility="collapsed"
+    )
 
-            # Get backend_url from session state with fallback
-            #backend_url = st.secrets.get("BACKEND_URL", "http://localhost:8000")
-            backend_url = st.secrets["BACKEND_URL"]
+    st.markdown('</div>', unsafe_allow_html=True)
 
-            # Ensure proper URL formatting
-            api_url = urljoin(backend_url.rstrip('/') + '/', 'predict')
+    if st.session_state.batch_job is not None:
+        render_batch_job()
+        return
 
-            # Temporary debugging line
-            #st.info(f"📡 Calling API: {api_url}")
+    if uploaded_files:
+        max_concurrency = get_setting("BATCH_MAX_CONCURRENCY", 8)
 
-            response = requests.post(
-                api_url,
-                files=files,
-                timeout=60
+        _, col, _ = st.columns([1, 1, 1])
+        with col:
+            optimize = st.toggle(
+                "Optimize upload for model input",
+                value=get_setting("PREPROCESS_UPLOADS", True),
+                help="Downsample to the model input size and send 8-bit grayscale",
+                key="optimize_upload"
+            )
+            concurrency = st.slider(
+                "Concurrent backend requests",
+                min_value=1,
+                max_value=max_concurrency,
+                value=min(get_setting("BATCH_CONCURRENCY", 4), max_concurrency),
+                key="batch_concurrency"
             )
+            if st.button(f"🚀 Classify {len(uploaded_files)} Images", width='stretch', type="primary"):
+                classify_batch(uploaded_files, optimize, concurrency)
+
+    if st.session_state.batch_error:
+        st.error(st.session_state.batch_error)
+    if st.session_state.batch_results:
+        render_batch_table()
+
+def build_result(outcome, store):
+    """Frontend result for a classify outcome produced by the pipeline
+
+    Image bytes go to the session blob store; the result keeps their keys.
+    """
+    started_at = time.perf_counter()
+    result = parse_backend_response(outcome['response'], store)
+    preview_bytes, result['preview_format'] = outcome['preview']
+    result['preview_ref'] = store.put(preview_bytes)
+    result['cache_hit'] = outcome['cache_hit']
+    result['coalesced'] = outcome.get('coalesced', False)
+    result['attempts'] = outcome['attempts']
+    result['upload_stats'] = {
+        'optimized': outcome['upload']['optimized'],
+        'bytes_before': outcome['upload']['bytes_before'],
+        'bytes_after': outcome['upload']['bytes_after'],
+        'codec': outcome['upload']['codec']
+    }
+    result['transfer'] = outcome.get('transfer')
+    result['timings'] = {**outcome['timings'], 'decode': time.perf_counter() - started_at}
+    result['ingest'] = outcome['ingest']
+    result['request_id'] = outcome['request_id']
+    result['content_hash'] = outcome['content_hash']
+    result['filename'] = outcome['filename']
+    return result
+
+def build_batch_item(name, request_id, outcome, error):
+    """Turn a finished batch entry into a batch results item, and record it"""
+    import requests
+
+    item = {'name': name, 'result': None, 'error': None}
+
+    if isinstance(error, BackendError):
+        item['error'] = f"Backend error {error.status_code}"
+    elif isinstance(error, QueueFullError):
+        item['error'] = "Rejected, queue full"
+    elif isinstance(error, CircuitOpenError):
+        item['error'] = "Backend unavailable"
+    elif isinstance(error, DeadlineExceededError):
+        item['error'] = "Deadline exceeded"
+    elif isinstance(error, requests.exceptions.Timeout):
+        item['error'] = "Timed out"
+    elif isinstance(error, requests.exceptions.ConnectionError):
+        item['error'] = "Connection error"
+    elif error is not None:
+        item['error'] = str(error)
+    else:
+        item['result'] = build_result(outcome, get_session_store())
+        record_result(get_history_store(), item['result'], outcome['preview'][0])
+        item['result']['recorded'] = True
+
+    result = item['result'] or {}
+    get_telemetry().record(
+        'batch', request_id, result.get('timings'), error,
+        cache_hit=result.get('cache_hit'), coalesced=result.get('coalesced'), attempts=result.get('attempts'),
+        classification=result.get('classification'), transfer=result.get('transfer')
+    )
+    return item
+
+def batch_table_rows(items):
+    """Table rows for the batch results dataframe"""
+    rows = []
+    for item in items:
+        result = item['result'] or {}
+        rows.append({
+            'File': item['name'],
+            'Classification': result.get('display_name'),
+            'Confidence (%)': result.get('confidence'),
+            'Estimated Age': result.get('estimated_age'),
+            'Cached': result.get('cache_hit'),
+            'Status': item['error'] or 'OK'
+        })
+    return rows
+
+def classify_batch(uploaded_files, optimize, concurrency):
+    """Start a background job classifying a set of uploads"""
+    backend_url = st.secrets["BACKEND_URL"]
+    files = [(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files]
+
+    st.session_state.batch_results = []
+    st.session_state.batch_error = None
+    st.session_state.processing = True
+    st.session_state.batch_job = get_job_runner().submit(
+        get_session_id(),
+        run_batch,
+        get_backend_client(backend_url),
+        get_result_cache(),
+        get_backend_version(backend_url),
+        files,
+        optimize,
+        concurrency,
+        get_admission_controller(),
+        get_preview_cache()
+    )
+    st.rerun()
 
-            # Update progress - processing
-            for i in range(30, 90):
-                time.sleep(0.01)
-                progress_bar.progress(i + 1)
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def render_batch_job():
+    """Poll the running batch job, filling the results table as entries arrive"""
+    job = st.session_state.batch_job
+    if job is None:
+        return
+    job.touch()
+
+    # Checked before draining, so entries appended just before the job finished are still drained
+    finished = job.done()
+
+    # Only results that arrived since the last poll are parsed
+    items = st.session_state.batch_results
+    for name, request_id, outcome, error in job.partial_results[len(items):]:
+        items.append(build_batch_item(name, request_id, outcome, error))
+
+    if finished:
+        finish_batch_job(job)
+        st.rerun(scope="app")
+
+    st.progress(job.progress, text=f"🌙 {len(items)} images classified...")
+    if st.button("✖️ Cancel Batch"):
+        job.cancel()
+        st.session_state.batch_job = None
+        st.session_state.processing = False
+        st.rerun(scope="app")
+    st.dataframe(batch_table_rows(items), hide_index=True, width='stretch')
+
+def finish_batch_job(job):
+    """Clear the finished batch job, keeping the error it failed with outside its entries"""
+    st.session_state.batch_job = None
+    st.session_state.processing = False
+
+    try:
+        job.result()
+    except (JobCancelled, CancelledError):
+        return
+    except Exception as e:
+        st.session_state.batch_error = f"❌ Batch classification failed: {e}"
+
+def render_batch_table():
+    """Render sortable batch results; selecting a row opens its result view"""
+    items = st.session_state.batch_results
+    failed = sum(1 for item in items if item['error'])
+
+    st.markdown(f"##### Batch Results ({len(items) - failed} classified, {failed} failed)")
+    event = st.dataframe(
+        batch_table_rows(items),
+        key=f"batch_table_{st.session_state.batch_table_version}",
+        on_select="rerun",
+        selection_mode="single-row",
+        hide_index=True,
+        width='stretch'
+    )
+    st.caption("Click a row to open its detailed result. Click a column header to sort.")
+
+    if event.selection.rows:
+        item = items[event.selection.rows[0]]
+        if item['result'] is not None:
+            st.session_state.classification_result = item['result']
+            # A fresh table key drops the selection once we come back
+            st.session_state.batch_table_version += 1
+            st.rerun()
 
-            if response.status_code == 200:
-                backend_data = response.json()
-                result = parse_backend_response(backend_data)
+    render_batch_export(items)
+
+    if st.button("🗑️ Clear Batch Results"):
+        batch_refs = set().union(*(result_refs(item['result']) for item in items))
+        # Blobs are stored once per content, so keep those the other views still show
+        kept = result_refs(st.session_state.classification_result) | result_refs(st.session_state.speculative_result)
+        if st.session_state.scene_result is not None:
+            kept.add(st.session_state.scene_result['overlay_ref'])
+        get_session_store().discard(batch_refs - kept)
+        st.session_state.batch_results = []
+        st.rerun()
+
+def render_batch_export(items):
+    """Download of the batch results as CSV, NDJSON or Parquet, encoded only when clicked"""
+    store = get_session_store()
+    col_format, col_images, col_download = st.columns([1, 1, 1])
+    with col_format:
+        export_format = st.selectbox(
+            "Format", list(EXPORT_FORMATS), format_func=str.upper, key="batch_export_format",
+            label_visibility="collapsed"
+        )
+    with col_images:
+        include_images = st.toggle("Include images", key="batch_export_images")
+    with col_download:
+        mime_type, extension = EXPORT_FORMATS[export_format]
+        columns = export_columns(BATCH_COLUMNS, include_images)
+        st.download_button(
+            "💾 Export Batch Results",
+            data=lambda: export_bytes(batch_records(items, store, include_images), columns, export_format),
+            file_name=f"batch_results{extension}",
+            mime=mime_type,
+            on_click="ignore",
+            width='stretch'
+        )
 
-                # Complete progress
-                progress_bar.progress(100)
-                time.sleep(0.3)
+def render_scene_section():
+    """Render scene upload, tiling options and the scene class map"""
+    st.markdown('<div class="upload-area">', unsafe_allow_html=True)
 
-                st.session_state.classification_result = result
-                st.session_state.processing = False
-                st.success(f"✅ {backend_data.get('message', 'Classification complete!')}")
+    uploaded_file = st.file_uploader(
+        "Drop a large lunar surface scene here or click to browse",
+        type=['png', 'jpg', 'jpeg', 'tif', 'tiff'],
+        help="The scene is cut into model-size tiles that are classified one by one",
+        key="scene_uploader",
+        label_visibility="collapsed"
+    )
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    if st.session_state.scene_job is not None:
+        render_scene_job()
+        return
+
+    if uploaded_file:
+        max_concurrency = get_setting("BATCH_MAX_CONCURRENCY", 8)
+
+        _, col, _ = st.columns([1, 1, 1])
+        with col:
+            overlap = st.select_slider(
+                "Tile overlap",
+                options=[0, 25, 50, 75],
+                value=get_setting("SCENE_TILE_OVERLAP", 0),
+                format_func=lambda percent: f"{percent}%",
+                key="scene_overlap"
+            )
+            concurrency = st.slider(
+                "Concurrent backend requests",
+                min_value=1,
+                max_value=max_concurrency,
+                value=min(get_setting("SCENE_CONCURRENCY", 4), max_concurrency),
+                key="scene_concurrency"
+            )
+
+            # Only the header is read to size the grid
+            try:
+                reader = ImageReader(uploaded_file.getvalue())
+            except ImageTooLargeError as e:
+                st.error(f"🖼️ {e}")
+            except (OSError, ValueError):
+                # PIL raises OSError subclasses for unknown, corrupt and truncated files
+                st.error(
+                    f"🖼️ {uploaded_file.name} could not be read as an image. "
+                    "It may be corrupt, truncated or in an unsupported format."
+                )
             else:
-                st.session_state.processing = False
-                st.error(f"❌ Backend error: {response.status_code} - {response.text}")
-                st.info("Please check your backend connection and try again.")
-                return
+                grid = tile_grid(reader.size, get_model_input_size(), overlap / 100)
+                rows, cols = len(grid['ys']), len(grid['xs'])
+                st.caption(
+                    f"{cols} × {rows} grid, {rows * cols} tiles · "
+                    f"{'read in windows' if reader.windowed else 'decoded in full once'}"
+                )
+
+                if st.button(f"🛰️ Classify {rows * cols} Tiles", width='stretch', type="primary"):
+                    classify_scene(uploaded_file, overlap / 100, concurrency)
+
+    if st.session_state.scene_error:
+        st.error(st.session_state.scene_error)
+    if st.session_state.scene_result:
+        render_scene_result()
+
+def classify_scene(uploaded_file, overlap, concurrency):
+    """Start a background job classifying an uploaded scene tile by tile"""
+    backend_url = st.secrets["BACKEND_URL"]
+
+    st.session_state.scene_result = None
+    st.session_state.scene_error = None
+    st.session_state.processing = True
+    st.session_state.scene_job = get_job_runner().submit(
+        get_session_id(),
+        run_scene,
+        get_backend_client(backend_url),
+        get_scene_result_cache(),
+        get_backend_version(backend_url),
+        uploaded_file.getvalue(),
+        uploaded_file.name,
+        overlap,
+        concurrency,
+        get_admission_controller()
+    )
+    st.rerun()
 
-        except requests.exceptions.ConnectionError as e:
-            st.session_state.processing = False
-            st.error(f"⚠️ Could not connect to backend at {api_url}")
-            st.info("Please ensure your backend server is running and try again.")
-            st.code(f"Connection Error: {str(e)}")
-            return
-
-        except requests.exceptions.Timeout:
-            st.session_state.processing = False
-            st.error("⏱️ Backend request timed out (60 seconds)")
-            st.info("The server might be overloaded. Please try again in a moment.")
-            return
-
-        except Exception as e:
-            st.session_state.processing = False
-            st.error(f"❌ Unexpected error: {str(e)}")
-            st.info("Please try again or contact support if the issue persists.")
-            return
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def render_scene_job():
+    """Poll the running scene job"""
+    job = st.session_state.scene_job
+    if job is None:
+        return
+    job.touch()
+
+    if job.done():
+        finish_scene_job(job)
+        st.rerun(scope="app")
+
+    st.progress(job.progress, text=f"🛰️ {job.progress:.0%} of tiles classified...")
+    if st.button("✖️ Cancel Scene"):
+        job.cancel()
+        st.session_state.scene_job = None
+        st.session_state.processing = False
+        st.rerun(scope="app")
+
+def finish_scene_job(job):
+    """Store the finished scene job's class map, or the error it failed with"""
+    st.session_state.scene_job = None
+    st.session_state.processing = False
+
+    try:
+        scene = job.result()
+    except (JobCancelled, CancelledError):
+        return
+    except Exception as e:
+        get_telemetry().record('scene', job.id, error=e)
+        st.session_state.scene_error = f"❌ Scene classification failed: {e}"
+        return
+
+    get_telemetry().record(
+        'scene', job.id, total=scene['elapsed'],
+        tiles=scene['tiles'], failed=scene['failed'], cache_hits=scene['cache_hits']
+    )
+
+    overlay = scene.pop('overlay')
+    scene['overlay_ref'] = get_session_store().put(overlay)
+    st.session_state.scene_result = scene
+
+def render_scene_result():
+    """Render the scene class map over the scene preview with per-class tile counts"""
+    scene = st.session_state.scene_result
+    class_map = scene['class_map']
+
+    st.markdown(f"##### Scene Map ({scene['filename']})")
+    overlay = get_session_store().get(scene['overlay_ref'])
+    if overlay is not None:
+        st.image(overlay, width='stretch', output_format='JPEG')
+    else:
+        st.info("The scene preview was dropped to stay within this session's memory budget.")
 
+    cols = st.columns(len(CLASS_MAPPING))
+    for col, (class_index, class_info) in zip(cols, CLASS_MAPPING.items()):
+        mask = class_map == class_index
+        with col:
+            st.metric(f"{class_info['icon']} {class_info['display_name']}", int(mask.sum()))
+            if mask.any():
+                st.caption(f"Mean confidence {scene['confidence_map'][mask].mean():.0%}")
+
+    tinted = [info['display_name'] for index, info in CLASS_MAPPING.items() if SCENE_CLASS_ALPHA[index]]
+    st.caption(
+        f"Tinted: {', '.join(tinted)}, stronger with higher confidence · "
+        f"{scene['tiles']} tiles, {scene['failed']} failed, {scene['cache_hits']} cached · "
+        f"{scene['elapsed']:.1f} s"
+    )
+    st.caption(format_ingest(scene['ingest']))
+
+    if st.button("🗑️ Clear Scene"):
+        st.session_state.scene_result = None
+        st.rerun()
+
+def progress_state(phase, fraction):
+    """Progress bar value and label for a (phase, fraction) report"""
+    # The backend is working once the last byte of the upload is sent
+    if phase == 'upload' and fraction >= 1.0:
+        phase, fraction = 'wait', 0.0
+
+    start, end, text = PROGRESS_PHASES.get(phase, PROGRESS_PHASES['queued'])
+    return int(start + (end - start) * fraction), text
+
+def submit_classification(uploaded_file, optimize=True):
+    """Submit a background classification job for the uploaded image"""
+    backend_url = st.secrets["BACKEND_URL"]
+    return get_job_runner().submit(
+        get_session_id(),
+        run_classification,
+        get_backend_client(backend_url),
+        get_result_cache(),
+        get_backend_version(backend_url),
+        uploaded_file.getvalue(),
+        uploaded_file.name,
+        optimize,
+        get_admission_controller(),
+        get_preview_cache()
+    )
+
+def classify_image(uploaded_file, optimize=True):
+    """Start classifying the uploaded image and show the job's progress"""
+    st.session_state.processing = True
+    st.session_state.classify_error = None
+    st.session_state.classify_job = submit_classification(uploaded_file, optimize)
     st.rerun()
 
+def start_speculative_job(uploaded_file, optimize, key):
+    """Classify the upload in the background before the user asks for it
+
+    A new file, or a changed upload option, cancels the previous speculative job.
+    """
+    if st.session_state.speculative_key == key:
+        return
+
+    cancel_speculative_job()
+    st.session_state.speculative_key = key
+    st.session_state.speculative_job = submit_classification(uploaded_file, optimize)
+
+def cancel_speculative_job():
+    """Drop the speculative job and any result it produced"""
+    job = st.session_state.speculative_job
+    if job is not None:
+        job.cancel()
+
+    st.session_state.speculative_key = None
+    st.session_state.speculative_job = None
+    st.session_state.speculative_result = None
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def render_speculative_status():
+    """Keep the speculative job alive and park its result in the session's result slot"""
+    job = st.session_state.speculative_job
+    if job is None:
+        if st.session_state.speculative_result is not None:
+            st.caption("⚡ Result ready")
+        return
+    job.touch()
+
+    if not job.done():
+        st.caption("⚡ Classifying in the background...")
+        return
+
+    # A failed speculative run is dropped; the click then classifies normally
+    st.session_state.speculative_job = None
+    try:
+        outcome = job.result()
+    except Exception:
+        pass
+    else:
+        st.session_state.speculative_result = build_result(outcome, get_session_store())
+    st.rerun(scope="app")
+
+def reveal_speculative_result(key):
+    """Show the speculative result, or adopt the running speculative job, for the clicked upload"""
+    if st.session_state.speculative_key != key:
+        return False
+
+    speculative_result = st.session_state.speculative_result
+    job = st.session_state.speculative_job
+    if speculative_result is None and job is None:
+        return False
+
+    st.session_state.speculative_key = None
+    st.session_state.speculative_job = None
+    st.session_state.speculative_result = None
+    st.session_state.classify_error = None
+
+    if speculative_result is not None:
+        st.session_state.classification_result = speculative_result
+    else:
+        st.session_state.processing = True
+        st.session_state.classify_job = job
+    st.rerun()
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def render_classify_job():
+    """Poll the running classification job and show its progress"""
+    job = st.session_state.classify_job
+    if job is None:
+        return
+    job.touch()
+
+    if job.done():
+        finish_classify_job(job)
+        st.rerun(scope="app")
+
+    value, text = progress_state(job.phase, job.progress)
+    if job.phase == 'admission':
+        text = f"🚦 Position {job.queue_position + 1} in queue · about {job.queue_eta:.0f}s wait"
+    st.progress(value, text=text)
+    if st.button("✖️ Cancel", width='stretch'):
+        job.cancel()
+        st.session_state.classify_job = None
+        st.session_state.processing = False
+        st.rerun(scope="app")
+
+def classify_error_details(error, client):
+    """Message and hint shown for a classification that failed with ``error``"""
+    import requests
+
+    if isinstance(error, BackendError):
+        return {
+            'message': f"❌ Backend error: {error.status_code} - {error.text}",
+            'hint': "Please check your backend connection and try again."
+        }
+    if isinstance(error, QueueFullError):
+        return {
+            'message': f"🚦 Too many classifications are waiting ({error.queued} in queue)",
+            'hint': "The backend is at capacity. Please try again in a moment."
+        }
+    if isinstance(error, CircuitOpenError):
+        return {
+            'message': "🔌 The backend is failing, requests are paused to fail fast",
+            'hint': f"The backend will be probed again in {error.retry_after:.0f} seconds."
+        }
+    if isinstance(error, DeadlineExceededError):
+        return {
+            'message': f"⏱️ Classification did not finish within {error.deadline:g} seconds",
+            'hint': "The server might be overloaded. Please try again in a moment."
+        }
+    if isinstance(error, ImageTooLargeError):
+        return {
+            'message': f"🖼️ {error}",
+            'hint': "Enable upload optimization, or upload the image as an uncompressed TIFF or a JPEG."
+        }
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return {
+            'message': f"⚠️ Could not connect to backend at {client.url('predict')}",
+            'hint': "Please ensure your backend server is running and try again.",
+            'detail': f"Connection Error: {str(error)}"
+        }
+    if isinstance(error, requests.exceptions.Timeout):
+        return {
+            'message': f"⏱️ Backend request timed out ({client.read_timeout:g} seconds)",
+            'hint': "The server might be overloaded. Please try again in a moment."
+        }
+    return {
+        'message': f"❌ Unexpected error: {str(error)}",
+        'hint': "Please try again or contact support if the issue persists."
+    }
+
+def finish_classify_job(job):
+    """Store the finished job's result, or the error it failed with"""
+    st.session_state.classify_job = None
+    st.session_state.processing = False
+
+    try:
+        outcome = job.result()
+    except (JobCancelled, CancelledError):
+        return
+    except Exception as e:
+        get_telemetry().record('single', job.id, error=e)
+        client = get_backend_client(st.secrets["BACKEND_URL"])
+        st.session_state.classify_error = {**classify_error_details(e, client), 'request_id': job.id}
+        return
+
+    st.session_state.classification_result = build_result(outcome, get_session_store())
+    st.toast(f"✅ {outcome['response'].get('message', 'Classification complete!')}")
+
+def render_classify_error():
+    """Render the error of the last failed classification"""
+    error = st.session_state.classify_error
+    if not error:
+        return
+
+    st.error(error['message'])
+    st.info(error['hint'])
+    if error.get('detail'):
+        st.code(error['detail'])
+    if error.get('request_id'):
+        st.caption(f"Request ID `{error['request_id']}`")
+
+def format_ingest(ingest):
+    """Caption describing how an upload was decoded and the memory it took"""
+    parts = [f"🧠 Decoded {ingest['decoded_pixels'] / 1e6:.1f} MP ({ingest['strategy']})"]
+    if ingest.get('size'):
+        parts[0] += f" of a {ingest['size'][0]}×{ingest['size'][1]} image"
+    if ingest['peak_rss_growth'] is not None:
+        parts.append(f"peak RSS +{format_bytes(max(ingest['peak_rss_growth'], 0))}")
+    return " · ".join(parts)
+
 def get_confidence_badge_class(confidence):
     """Get CSS class for confidence badge"""
     if confidence >= 85:
@@ -297,38 +868,64 @@ def get_confidence_badge_class(confidence):
         return "confidence-medium"
     return "confidence-low"
 
+def render_previous_classification(content_hash):
+    """Note when the history already holds this upload, classified by the current model"""
+    history = get_history_store()
+    if history is None:
+        return
+    previous = history.find_by_hash(content_hash, model_version=get_setting("MODEL_VERSION", "default"))
+    if previous is not None:
+        classified_at = datetime.fromtimestamp(previous['created_at']).strftime('%Y-%m-%d %H:%M')
+        display_name = CLASS_LABELS.get(previous['classification'], previous['classification'])
+        st.caption(
+            f"🕘 Classified before as {display_name} ({previous['confidence']:.1f}%) on {classified_at}"
+        )
+
 def render_result_section():
     """Render classification results"""
     result = st.session_state.classification_result
-    image = st.session_state.image_preview
+    store = get_session_store()
+    render_started_at = time.perf_counter()
 
     col1, col_heatmap, col3 = st.columns([1, 1, 1.2])
 
     with col1:
         st.markdown("##### Input Image")
-        st.image(image, width='stretch', caption="Analyzed Image")
+        preview = store.get(result['preview_ref'])
+        if preview is not None:
+            st.image(preview, width='stretch', caption="Analyzed Image", output_format=result['preview_format'])
+        else:
+            st.info("The preview was dropped to stay within this session's memory budget.")
 
     with col_heatmap:
         st.markdown("##### Activation Heatmap (Grad-CAM)")
 
-        heatmap_data = result.get('overlay_image')
-
-        if heatmap_data:
-            # Decode base64
-            heatmap_bytes = base64.b64decode(heatmap_data)
-            heatmap_img = Image.open(BytesIO(heatmap_bytes)).convert("RGB")  #convert("L")
-
-            # Convert to numpy
-            heatmap_np = np.array(heatmap_img) / 255.0
+        # Decoded once per result; the encoded bytes go straight to the browser
+        overlay = get_overlay_display(result, store)
 
+        if overlay:
+            overlay_bytes, overlay_format = overlay
             st.image(
-                heatmap_np,
+                overlay_bytes,
                 caption="Red/Yellow indicates high-impact regions",
-                width='stretch'
+                width='stretch',
+                output_format=overlay_format
             )
         else:
             st.warning("Heatmap visualization is unavailable.")
 
+    # Time the first render of this result as the last classify phase, then record it once;
+    # batch results were recorded in telemetry and the history when their entry finished
+    if not result.get('recorded'):
+        result['timings']['render'] = time.perf_counter() - render_started_at
+        get_telemetry().record(
+            'single', result.get('request_id'), result['timings'],
+            cache_hit=result['cache_hit'], coalesced=result.get('coalesced'), attempts=result['attempts'],
+            classification=result['classification'], transfer=result.get('transfer')
+        )
+        record_result(get_history_store(), result, preview)
+        result['recorded'] = True
+
     with col3:
         st.markdown("### Classification Result")
         st.markdown(f"#### {result['display_name']}")
@@ -345,6 +942,36 @@ def render_result_section():
         if result.get('estimated_age'):
             st.markdown(f"**Estimated Age:** {result['estimated_age']}")
 
+        # Upload size saving
+        upload_stats = result.get('upload_stats')
+        if upload_stats:
+            st.caption(
+                f"Upload: {format_bytes(upload_stats['bytes_before'])} → "
+                f"{format_bytes(upload_stats['bytes_after'])} as {upload_stats.get('codec', 'png')}"
+                f"{'' if upload_stats['optimized'] else ' (unoptimized)'}"
+            )
+        transfer = result.get('transfer')
+        if transfer:
+            encoding = transfer['content_encoding']
+            st.caption(
+                f"Response: {format_bytes(transfer['decoded_bytes'])} {transfer['response_format']}"
+                + (f", {format_bytes(transfer['response_bytes'])} with {encoding}" if encoding != 'identity' else "")
+            )
+        if result.get('cache_hit'):
+            st.caption("⚡ Served from result cache")
+        if result.get('coalesced'):
+            st.caption("🤝 Shared with an identical request already in flight")
+        if result.get('attempts', 0) > 1:
+            st.caption(f"🔁 Succeeded after {result['attempts']} attempts")
+        if result.get('timings'):
+            st.caption("⏱️ " + " · ".join(
+                f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in result['timings'].items()
+            ))
+        if result.get('ingest'):
+            st.caption(format_ingest(result['ingest']))
+        if result.get('request_id'):
+            st.caption(f"Request ID `{result['request_id']}`")
+
         # Details
         st.markdown("---")
         st.markdown("##### Details")
@@ -357,7 +984,6 @@ def render_result_section():
     with col_dl:
         if st.button("🔄 Classify Another Image", width='stretch'):
             st.session_state.classification_result = None
-            st.session_state.image_preview = None
             st.rerun()
 
     with col_reset:
@@ -367,6 +993,7 @@ def render_result_section():
             'display_name': result['display_name'],
             'confidence': result['confidence'],
             'estimated_age': result['estimated_age'],
+            'request_id': result.get('request_id'),
             'backend_response': result.get('raw_response')
         }
 
@@ -399,10 +1026,98 @@ def render_info_cards():
                 </div>
             """, unsafe_allow_html=True)
 
+def render_backend_stats():
+    """Render connection pool, result cache and session memory counters"""
+    backend_url = get_setting("BACKEND_URL")
+    if not backend_url:
+        return
+
+    client = get_backend_client(backend_url)
+    pool_stats = client.stats()
+    breaker_stats = client.breaker.snapshot()
+    cache_stats = get_result_cache().stats()
+    preview_stats = get_preview_cache().stats()
+    admission_stats = get_admission_controller().stats()
+
+    with st.expander("📊 Backend statistics"):
+        col_pool, col_cache, col_queue, col_breaker = st.columns(4)
+        with col_pool:
+            st.markdown("##### Connection Pool")
+            st.metric("Requests", pool_stats['requests'])
+            st.caption(f"Hits: {pool_stats['pool_hits']} · Misses: {pool_stats['pool_misses']}")
+            if 'http2_responses' in pool_stats:
+                st.caption(f"Async client · HTTP/2 responses: {pool_stats['http2_responses']}")
+            if client.negotiator is not None:
+                negotiator_stats = client.negotiator.stats()
+                throughput = negotiator_stats['throughput']
+                st.caption(
+                    "Upload formats: " + (", ".join(
+                        f"{codec} ×{count}" for codec, count in negotiator_stats['chosen'].items()
+                    ) or "none yet")
+                    + (f" · Link ≈ {format_bytes(throughput)}/s" if throughput else "")
+                )
+            if client.coalescer is not None:
+                coalescer_stats = client.coalescer.stats()
+                st.caption(
+                    f"Coalesced: {coalescer_stats['coalesced']} of "
+                    f"{coalescer_stats['calls'] + coalescer_stats['coalesced']} · "
+                    f"In flight: {coalescer_stats['in_flight']}"
+                )
+        with col_cache:
+            st.markdown("##### Result Cache")
+            st.metric("Hit Ratio", f"{cache_stats['hit_ratio']:.0%}")
+            st.caption(
+                f"Hits: {cache_stats['hits']} · Misses: {cache_stats['misses']} · "
+                f"Evictions: {cache_stats['evictions']} · "
+                f"Entries: {cache_stats['entries']} ({format_bytes(cache_stats['bytes'])})"
+            )
+            st.caption(
+                f"Previews: {preview_stats['entries']} cached ({format_bytes(preview_stats['bytes'])}) · "
+                f"Hit ratio: {preview_stats['hit_ratio']:.0%}"
+            )
+        with col_queue:
+            st.markdown("##### Admission Queue")
+            st.metric("In Flight", f"{admission_stats['in_flight']} / {admission_stats['max_in_flight']}")
+            st.caption(
+                f"Queued: {admission_stats['queued']} · Sessions waiting: "
+                f"{admission_stats['waiting_sessions']} · Rejected: {admission_stats['rejected']}"
+            )
+        with col_breaker:
+            st.markdown("##### Circuit Breaker")
+            st.metric("State", breaker_stats['state'].replace('_', ' ').title())
+            st.caption(
+                f"Consecutive failures: {breaker_stats['consecutive_failures']} · "
+                f"Trips: {breaker_stats['trips']}"
+            )
+
+        session_usage = get_session_store().usage()
+        all_sessions = session_memory_report()
+        total_memory = sum(usage['memory_bytes'] for usage in all_sessions.values())
+        st.caption(
+            f"Session memory: {format_bytes(session_usage['memory_bytes'])} of "
+            f"{format_bytes(session_usage['budget_bytes'])} in {session_usage['blobs']} blobs · "
+            f"Spilled: {format_bytes(session_usage['disk_bytes'])} · Evicted: {session_usage['evicted']} · "
+            f"All {len(all_sessions)} sessions: {format_bytes(total_memory)}"
+        )
+
+def watch_jobs():
+    """Keep every job of this session alive on each full run, whichever view is shown
+
+    Only the shown view polls its job, so ``processing`` is also settled here
+    for jobs that ended while another view was open.
+    """
+    jobs = [st.session_state[key] for key in ('classify_job', 'batch_job', 'scene_job')]
+    for job in [*jobs, st.session_state.speculative_job]:
+        if job is not None:
+            job.touch()
+    st.session_state.processing = any(job is not None and not job.done() for job in jobs)
+
 def classify_page():
     """Main classify page"""
     st.markdown(STYLES, unsafe_allow_html=True)
     init_session_state()
+    get_telemetry()  # Metrics are served from the first visit, also when it lands here
+    watch_jobs()
     render_header()
 
     if st.session_state.classification_result is None:
@@ -411,6 +1126,7 @@ def classify_page():
         render_result_section()
 
     render_info_cards()
+    render_backend_stats()
     render_footer()
 
 def main():
@@ -0,0 +1,185 @@
+import streamlit as st
+import base64
+import sys
+from datetime import datetime, time as day_time, timedelta
+from pathlib import Path
+from utils.layout import init_layout, render_footer
+from utils.export import EXPORT_FORMATS, HISTORY_COLUMNS, export_bytes, export_columns, history_records
+from utils.history import get_history_store
+from utils.results import CLASS_LABELS
+from utils.settings import get_setting
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+# Initialize layout
+init_layout(page_title="History", page_icon="🕘")
+
+# Constants
+PAGE_SIZES = [25, 50, 100, 200]
+DEFAULT_PAGE_SIZE = get_setting("HISTORY_PAGE_SIZE", 50)
+# The download is built in server memory, larger exports go through `make export_history`
+EXPORT_MAX_ROWS = get_setting("HISTORY_EXPORT_MAX_ROWS", 50000)
+
+def render_header():
+    """Render page header"""
+    st.markdown("""
+        <h1 style="font-size: 2.5rem; font-weight: 700; margin-bottom: 0.5rem;">
+            <span class="gradient-text">History</span>
+        </h1>
+        <p style="color: #9ca3af; font-size: 1.125rem;">
+            Every classification shown by this server, newest first
+        </p>
+    """, unsafe_allow_html=True)
+
+def read_filters():
+    """Filter widgets; returns the history filter dict and the page size"""
+    col_class, col_confidence, col_dates, col_hash, col_size = st.columns([2, 2, 2, 2, 1])
+    with col_class:
+        classes = st.multiselect(
+            "Class", options=list(CLASS_LABELS), format_func=CLASS_LABELS.get, placeholder="All classes"
+        )
+    with col_confidence:
+        min_confidence, max_confidence = st.slider("Confidence (%)", 0, 100, (0, 100))
+    with col_dates:
+        dates = st.date_input("Date range", value=(), format="YYYY-MM-DD")
+    with col_hash:
+        hash_prefix = st.text_input("Content hash prefix", placeholder="e.g. 3fa2c1")
+    with col_size:
+        default_size = DEFAULT_PAGE_SIZE if DEFAULT_PAGE_SIZE in PAGE_SIZES else PAGE_SIZES[1]
+        page_size = st.selectbox("Rows", PAGE_SIZES, index=PAGE_SIZES.index(default_size))
+
+    filters = {
+        'classes': classes,
+        'min_confidence': min_confidence if min_confidence > 0 else None,
+        'max_confidence': max_confidence if max_confidence < 100 else None,
+        'hash_prefix': hash_prefix.strip()
+    }
+    if dates:
+        # Whole local days; a range still being picked has only its start
+        filters['since'] = datetime.combine(dates[0], day_time.min).timestamp()
+        filters['until'] = datetime.combine(dates[-1] + timedelta(days=1), day_time.min).timestamp()
+    return filters, page_size
+
+def thumbnail_uri(history, ref):
+    """Data URI of a row's thumbnail, or None"""
+    thumbnail = history.thumbnail(ref)
+    if thumbnail is None:
+        return None
+    return "data:image/jpeg;base64," + base64.b64encode(thumbnail).decode('ascii')
+
+def history_rows(history, rows):
+    """Table data of one page of history rows"""
+    return [
+        {
+            'Thumbnail': thumbnail_uri(history, row['thumbnail_ref']),
+            'Time': datetime.fromtimestamp(row['created_at']),
+            'Class': CLASS_LABELS.get(row['classification'], row['classification']),
+            'Confidence': row['confidence'],
+            'File': row['filename'],
+            'Model': row['model_version'],
+            'Content hash': row['content_hash'][:16],
+            'Request ID': row['request_id']
+        }
+        for row in rows
+    ]
+
+def render_history(history):
+    """One page of matching rows, with keyset cursors kept in the session"""
+    filters, page_size = read_filters()
+
+    # A new filter or page size starts again from the newest row
+    view_key = (repr(sorted(filters.items())), page_size)
+    if st.session_state.get('history_view_key') != view_key:
+        st.session_state.history_view_key = view_key
+        st.session_state.history_cursors = [None]
+    cursors = st.session_state.history_cursors
+
+    # One row past the page tells whether an older page exists
+    rows = history.page(filters, limit=page_size + 1, before=cursors[-1])
+    has_older = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if not rows:
+        st.info("No classifications match these filters." if len(cursors) == 1 else "No older classifications.")
+    else:
+        st.dataframe(
+            history_rows(history, rows),
+            column_config={
+                'Thumbnail': st.column_config.ImageColumn("Thumbnail", width='small'),
+                'Time': st.column_config.DatetimeColumn("Time", format="YYYY-MM-DD HH:mm:ss"),
+                'Confidence': st.column_config.ProgressColumn(
+                    "Confidence", format="%.1f%%", min_value=0, max_value=100
+                )
+            },
+            hide_index=True,
+            width='stretch',
+            row_height=56
+        )
+
+    col_newer, col_position, col_older = st.columns([1, 3, 1])
+    with col_newer:
+        st.button(
+            "◀ Newer", key="history_newer", width='stretch', disabled=len(cursors) == 1,
+            on_click=cursors.pop
+        )
+    total = history.count(filters)
+    with col_position:
+        first = (len(cursors) - 1) * page_size + 1 if rows else 0
+        st.caption(f"Rows {first:,}–{first + len(rows) - 1 if rows else 0:,} of {total:,} matching")
+    with col_older:
+        st.button(
+            "Older ▶", key="history_older", width='stretch', disabled=not has_older,
+            on_click=cursors.append, args=((rows[-1]['created_at'], rows[-1]['id']),) if rows else ()
+        )
+
+    render_export(history, filters, total)
+
+def render_export(history, filters, total):
+    """Download of every row matching the filters, encoded only when clicked"""
+    st.markdown("##### Export")
+    col_format, col_images, col_download = st.columns([1, 1, 1])
+    with col_format:
+        export_format = st.selectbox(
+            "Format", list(EXPORT_FORMATS), format_func=str.upper, key="history_export_format",
+            label_visibility="collapsed"
+        )
+    with col_images:
+        include_images = st.toggle("Include thumbnails", key="history_export_images")
+    with col_download:
+        mime_type, extension = EXPORT_FORMATS[export_format]
+        columns = export_columns(HISTORY_COLUMNS, include_images)
+        too_large = total > EXPORT_MAX_ROWS
+        st.download_button(
+            f"💾 Export {total:,} rows",
+            data=lambda: export_bytes(history_records(history, filters, include_images), columns, export_format),
+            file_name=f"classification_history{extension}",
+            mime=mime_type,
+            on_click="ignore",
+            disabled=not total or too_large,
+            width='stretch'
+        )
+    if too_large:
+        st.caption(
+            f"Downloads are limited to {EXPORT_MAX_ROWS:,} rows. Narrow the filters, "
+            "or export the whole history with `make export_history`."
+        )
+
+def history_page():
+    """Main history page"""
+    render_header()
+    history = get_history_store()
+    if history is None:
+        st.info("The classification history is turned off (HISTORY_DIR=off).")
+    else:
+        render_history(history)
+    render_footer()
+
+if __name__ == "__main__":
+    st.set_page_config(
+        page_title="History - LunarCrater",
+        page_icon="🕘",
+        layout="wide",
+        initial_sidebar_state="collapsed"
+    )
+    history_page()
@@ -0,0 +1,224 @@
+import streamlit as st
+import sys
+import time
+from pathlib import Path
+from utils.layout import init_layout, render_footer
+from utils.admission import get_admission_controller
+from utils.backend_client import get_backend_client
+from utils.jobs import get_job_runner
+from utils.preprocessing import format_bytes
+from utils.previews import get_preview_cache
+from utils.result_cache import get_result_cache
+from utils.session_store import session_memory_report
+from utils.settings import get_setting
+from utils.telemetry import get_telemetry, STATUSES
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+# Initialize layout
+init_layout(page_title="Performance", page_icon="📈")
+
+# Constants
+REFRESH_SECONDS = get_setting("DASHBOARD_REFRESH_SECONDS", 2.0)
+RATE_WINDOW = 60  # Seconds the headline rates are computed over
+RATE_BIN = 10  # Seconds per bar of the request rate chart
+QUANTILES = (0.5, 0.95, 0.99)
+BREAKER_LABELS = {'closed': "🟢 Closed", 'open': "🔴 Open", 'half_open': "🟡 Half open"}
+STAGE_ORDER = [
+    'preprocess', 'queue', 'coalesced', 'encode', 'connect', 'upload', 'wait', 'server',
+    'download', 'json', 'decode', 'render'
+]
+
+def render_header():
+    """Render page header"""
+    st.markdown("""
+        <h1 style="font-size: 2.5rem; font-weight: 700; margin-bottom: 0.5rem;">
+            <span class="gradient-text">Performance</span>
+        </h1>
+        <p style="color: #9ca3af; font-size: 1.125rem;">
+            Live figures for every session of this server process
+        </p>
+    """, unsafe_allow_html=True)
+
+def format_ms(seconds):
+    """Milliseconds label for a duration in seconds, or a dash"""
+    return f"{seconds * 1000:.0f} ms" if seconds is not None else "–"
+
+def format_bound(bound):
+    """Bucket label for a histogram upper bound in seconds"""
+    return f"≤{bound * 1000:g} ms" if bound < 1 else f"≤{bound:g} s"
+
+def histogram_rows(histogram):
+    """Bar chart data of a histogram: one bar per bucket, +Inf included"""
+    labels = [format_bound(bound) for bound in histogram.buckets] + [f">{histogram.buckets[-1]:g} s"]
+    return {'Latency': labels, 'Classifications': histogram.counts}
+
+def render_traffic(telemetry):
+    """Request rate and error, timeout and rejection rates"""
+    totals = telemetry.rates.totals(RATE_WINDOW)
+    finished = sum(totals.values())
+
+    def share(status):
+        return f"{totals[status] / finished:.1%}" if finished else "–"
+
+    st.markdown("##### Traffic")
+    cols = st.columns(4)
+    cols[0].metric("Requests / min", f"{finished * 60 / RATE_WINDOW:.0f}")
+    cols[1].metric("Error Rate", share('error'))
+    cols[2].metric("Timeout Rate", share('timeout'))
+    cols[3].metric("Rejected", share('rejected'))
+
+    # Charts pull in pandas and altair, so an idle process skips them
+    series = telemetry.rates.series()
+    if not any(sum(counts.values()) for _, counts in series):
+        st.caption(f"No classifications in the last {len(series) // 60} minutes.")
+        return
+
+    bins = {'Seconds ago': []}
+    bins.update({status: [] for status in STATUSES})
+    now = series[-1][0]
+    for start in range(0, len(series), RATE_BIN):
+        chunk = series[start:start + RATE_BIN]
+        bins['Seconds ago'].append(now - chunk[-1][0])
+        for status in STATUSES:
+            bins[status].append(sum(counts[status] for _, counts in chunk))
+    st.bar_chart(bins, x='Seconds ago', y=list(STATUSES), y_label=f"Classifications per {RATE_BIN} s",
+                 sort=False, height=220)
+
+def render_latency(telemetry):
+    """Latency histograms and per-stage quantiles"""
+    metrics = telemetry.metrics
+    st.markdown("##### Latency")
+
+    histograms = {}
+    backend = metrics.histograms('backend_seconds')
+    if backend:
+        histograms["Backend round trip"] = next(iter(backend.values()))
+    for labels, histogram in sorted(metrics.histograms('classification_seconds').items()):
+        histograms[f"End to end ({dict(labels)['kind']})"] = histogram
+
+    if not histograms:
+        st.info("No classifications yet.")
+        return
+
+    col_chart, col_table = st.columns([3, 2])
+    with col_chart:
+        name = st.selectbox("Histogram", list(histograms), label_visibility="collapsed")
+        histogram = histograms[name]
+        st.bar_chart(histogram_rows(histogram), x='Latency', y='Classifications', sort=False, height=260)
+        st.caption(
+            f"{histogram.count} observations · mean {format_ms(histogram.sum / histogram.count)} · "
+            + " · ".join(f"p{q * 100:g} {format_ms(histogram.quantile(q))}" for q in QUANTILES)
+        )
+
+    with col_table:
+        stages = {
+            dict(labels)['stage']: histogram
+            for labels, histogram in metrics.histograms('classification_stage_seconds').items()
+        }
+        ordered = [stage for stage in STAGE_ORDER if stage in stages]
+        ordered += sorted(stage for stage in stages if stage not in STAGE_ORDER)
+        st.dataframe(
+            [
+                {
+                    'Stage': stage,
+                    'Count': stages[stage].count,
+                    **{f"p{q * 100:g} (ms)": round(stages[stage].quantile(q) * 1000, 1) for q in QUANTILES}
+                }
+                for stage in ordered
+            ],
+            hide_index=True,
+            width='stretch'
+        )
+        st.caption("Quantiles are estimated from fixed histogram buckets.")
+
+def render_capacity():
+    """Queue depth, jobs and cache hit ratios"""
+    admission_stats = get_admission_controller().stats()
+    job_stats = get_job_runner().stats()
+    cache_stats = get_result_cache().stats()
+    preview_stats = get_preview_cache().stats()
+
+    st.markdown("##### Queue and Caches")
+    cols = st.columns(5)
+    cols[0].metric("In Flight", f"{admission_stats['in_flight']} / {admission_stats['max_in_flight']}")
+    cols[1].metric("Queue Depth", admission_stats['queued'])
+    cols[2].metric("Running Jobs", job_stats['running'])
+    cols[3].metric("Result Cache Hits", f"{cache_stats['hit_ratio']:.0%}")
+    cols[4].metric("Preview Cache Hits", f"{preview_stats['hit_ratio']:.0%}")
+    st.caption(
+        f"Sessions waiting: {admission_stats['waiting_sessions']} · "
+        f"Rejected: {admission_stats['rejected']} · Queued jobs: {job_stats['queued']} · "
+        f"Orphans cancelled: {job_stats['orphans_cancelled']} · "
+        f"Result cache: {cache_stats['entries']} ({format_bytes(cache_stats['bytes'])}) · "
+        f"Previews: {preview_stats['entries']} ({format_bytes(preview_stats['bytes'])})"
+    )
+
+def render_backend():
+    """Circuit breaker state of the backend client"""
+    backend_url = get_setting("BACKEND_URL")
+    if not backend_url:
+        return
+
+    breaker = get_backend_client(backend_url).breaker.snapshot()
+    st.markdown("##### Backend")
+    cols = st.columns(3)
+    cols[0].metric("Circuit Breaker", BREAKER_LABELS[breaker['state']])
+    cols[1].metric("Consecutive Failures", breaker['consecutive_failures'])
+    cols[2].metric("Trips", breaker['trips'])
+    if breaker['state'] == 'open':
+        st.caption(f"Failing fast; a probe request goes through in {breaker['retry_after']:.0f} s")
+
+def render_sessions():
+    """Active sessions and the image memory each one holds"""
+    report = session_memory_report()
+    total_memory = sum(usage['memory_bytes'] for usage in report.values())
+
+    st.markdown("##### Sessions")
+    cols = st.columns(2)
+    cols[0].metric("Active Sessions", len(report))
+    cols[1].metric("Session Memory", format_bytes(total_memory))
+
+    if report:
+        st.dataframe(
+            [
+                {
+                    'Session': session_id[:8],
+                    'Memory': format_bytes(usage['memory_bytes']),
+                    'Budget Used (%)': round(100 * usage['memory_bytes'] / usage['budget_bytes'], 1),
+                    'Spilled': format_bytes(usage['disk_bytes']),
+                    'Blobs': usage['blobs'],
+                    'Evicted': usage['evicted']
+                }
+                for session_id, usage in sorted(report.items(), key=lambda item: -item[1]['memory_bytes'])
+            ],
+            hide_index=True,
+            width='stretch'
+        )
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def render_dashboard():
+    """Every panel, refreshed in place"""
+    telemetry = get_telemetry()
+    render_traffic(telemetry)
+    render_latency(telemetry)
+    render_capacity()
+    render_backend()
+    render_sessions()
+    st.caption(f"Updated {time.strftime('%H:%M:%S')} · refreshes every {REFRESH_SECONDS:g} s")
+
+def performance_page():
+    """Main performance page"""
+    render_header()
+    render_dashboard()
+    render_footer()
+
+if __name__ == "__main__":
+    st.set_page_config(
+        page_title="Performance - LunarCrater",
+        page_icon="📈",
+        layout="wide",
+        initial_sidebar_state="collapsed"
+    )
+    performance_page()
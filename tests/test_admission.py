@@ -0,0 +1,52 @@
+import threading
+import time
+import pytest
+from utils.admission import AdmissionController, QueueFullError
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached in time"
+        time.sleep(0.005)
+
+def queue_behind_holder(controller, sessions, admitted):
+    """Start one admit() thread per session ID, each queued before the next starts"""
+    threads = []
+    for index, session_id in enumerate(sessions):
+        def request(session_id=session_id, label=f"{session_id}{sessions[:index + 1].count(session_id)}"):
+            with controller.admit(session_id):
+                admitted.append(label)
+
+        thread = threading.Thread(target=request)
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: controller.stats()['queued'] == index + 1)
+    return threads
+
+def test_free_slots_go_round_robin_over_sessions():
+    controller = AdmissionController(max_in_flight=1, max_queue=10)
+    admitted = []
+    with controller.admit('holder'):
+        threads = queue_behind_holder(controller, ['a', 'a', 'a', 'b', 'b', 'c'], admitted)
+        assert controller.stats()['waiting_sessions'] == 3
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert admitted == ['a1', 'b1', 'c1', 'a2', 'b2', 'a3']
+    stats = controller.stats()
+    assert (stats['admitted'], stats['in_flight'], stats['queued'], stats['waiting_sessions']) == (7, 0, 0, 0)
+
+def test_full_queue_rejects_instead_of_waiting():
+    controller = AdmissionController(max_in_flight=1, max_queue=1)
+    admitted = []
+    with controller.admit('holder'):
+        threads = queue_behind_holder(controller, ['a'], admitted)
+        with pytest.raises(QueueFullError) as excinfo:
+            with controller.admit('b'):
+                pass
+        assert excinfo.value.queued == 1
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert admitted == ['a1']
+    assert controller.stats()['rejected'] == 1
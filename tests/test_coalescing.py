@@ -0,0 +1,96 @@
+import threading
+from utils.coalescing import RequestCoalescer
+from utils.jobs import JobCancelled
+
+class Caller(threading.Thread):
+    """Runs coalescer.run() on its own thread and keeps its outcome"""
+
+    def __init__(self, coalescer, call, on_wait=None):
+        super().__init__()
+        self.coalescer, self.call, self.on_wait = coalescer, call, on_wait
+        self.result = self.error = None
+        self.waiting = threading.Event()
+        self.start()
+
+    def run(self):
+        def on_wait():
+            self.waiting.set()
+            if self.on_wait:
+                self.on_wait()
+
+        try:
+            self.result = self.coalescer.run('key', self.call, on_wait)
+        except BaseException as e:
+            self.error = e
+
+def blocked_call(outcome):
+    """Call that blocks until ``release`` is set, then returns or raises ``outcome``"""
+    started, release = threading.Event(), threading.Event()
+
+    def call():
+        started.set()
+        assert release.wait(5)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    return call, started, release
+
+def leader_and_follower(coalescer, outcome, follower_call=None, follower_on_wait=None):
+    call, started, release = blocked_call(outcome)
+    leader = Caller(coalescer, call)
+    assert started.wait(5)
+    follower = Caller(coalescer, follower_call or call, follower_on_wait)
+    assert follower.waiting.wait(5)
+    return leader, follower, release
+
+def test_follower_shares_the_leaders_result():
+    coalescer = RequestCoalescer(poll_interval=0.01)
+    follower_calls = []
+    leader, follower, release = leader_and_follower(coalescer, 'answer', follower_call=lambda: follower_calls.append(1))
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert leader.result == ('answer', False)
+    assert follower.result == ('answer', True)
+    assert follower_calls == []
+    assert coalescer.stats() == {'calls': 1, 'coalesced': 1, 'in_flight': 0}
+
+def test_leader_error_propagates_to_followers():
+    coalescer = RequestCoalescer(poll_interval=0.01)
+    error = ValueError("backend said no")
+    leader, follower, release = leader_and_follower(coalescer, error)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert leader.error is error
+    assert follower.error is error
+    assert coalescer.stats() == {'calls': 1, 'coalesced': 0, 'in_flight': 0}
+
+def test_cancelled_leader_hands_the_call_over():
+    coalescer = RequestCoalescer(poll_interval=0.01)
+    leader, follower, release = leader_and_follower(coalescer, JobCancelled(), follower_call=lambda: 'own answer')
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert isinstance(leader.error, JobCancelled)
+    assert follower.result == ('own answer', False)
+    assert coalescer.stats() == {'calls': 2, 'coalesced': 0, 'in_flight': 0}
+
+def test_cancelled_follower_stops_waiting_without_the_leader():
+    coalescer = RequestCoalescer(poll_interval=0.01)
+
+    def cancel():
+        raise JobCancelled()
+
+    leader, follower, release = leader_and_follower(coalescer, 'answer', follower_on_wait=cancel)
+    follower.join(5)
+    assert isinstance(follower.error, JobCancelled)
+
+    release.set()
+    leader.join(5)
+    assert leader.result == ('answer', False)
+    assert coalescer.stats() == {'calls': 1, 'coalesced': 0, 'in_flight': 0}
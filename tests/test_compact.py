@@ -0,0 +1,78 @@
+import base64
+import json
+import struct
+import numpy as np
+import pytest
+import requests
+from utils.compact import COMPACT_MEDIA_TYPE, MAGIC, CompactFormatError, decode_compact, decode_response, encode_compact
+
+PAYLOAD = {'class_index': 1, 'confidence': 0.87, 'message': "Old crater detected"}
+
+def heatmap(dtype):
+    values = np.linspace(0, 1, 6 * 5).reshape(6, 5)
+    return (values * 255).astype(np.uint8) if dtype == 'uint8' else values.astype(np.float16)
+
+def body_with(header, raw):
+    header = json.dumps(header).encode() if isinstance(header, dict) else header
+    return MAGIC + struct.pack('>I', len(header)) + header + raw
+
+@pytest.mark.parametrize('dtype', ['uint8', 'float16'])
+def test_round_trip_keeps_payload_and_heatmap(dtype):
+    array = heatmap(dtype)
+    data = decode_compact(encode_compact(PAYLOAD, array))
+
+    heatmap_array = data.pop('heatmap_array')
+    assert data == PAYLOAD
+    assert (heatmap_array['dtype'], heatmap_array['shape']) == (dtype, [6, 5])
+    decoded = np.frombuffer(base64.b64decode(heatmap_array['data']), dtype=np.dtype(dtype).newbyteorder('<'))
+    assert np.array_equal(decoded.reshape(6, 5), array)
+    json.dumps(data)  # Cacheable as JSON like any response
+
+def test_big_endian_arrays_are_sent_little_endian():
+    array = heatmap('float16')
+    body = encode_compact(PAYLOAD, array.astype('>f2'))
+    assert body.endswith(array.astype('<f2').tobytes())
+
+@pytest.mark.parametrize('array', [np.zeros((4, 4), np.float32), np.zeros((2, 2, 2), np.uint8)])
+def test_encode_rejects_other_dtypes_and_shapes(array):
+    with pytest.raises(ValueError):
+        encode_compact(PAYLOAD, array)
+
+GOOD_HEADER = {**PAYLOAD, 'heatmap': {'dtype': 'uint8', 'shape': [2, 3]}}
+
+@pytest.mark.parametrize('body', [
+    b"",
+    b"LCH1",
+    b"PNG\x00\x00\x00\x00\x02{}",
+    b'{"class_index": 1}',
+    MAGIC + struct.pack('>I', 1000) + b'{"class_index": 1}',  # Header length past the end
+    body_with(b"not json", bytes(6)),
+    body_with(PAYLOAD, bytes(6)),  # No heatmap description
+    body_with({**PAYLOAD, 'heatmap': {'dtype': 'uint8'}}, bytes(6)),
+    body_with({**PAYLOAD, 'heatmap': {'dtype': 'float32', 'shape': [2, 3]}}, bytes(24)),
+    body_with({**PAYLOAD, 'heatmap': {'dtype': 'uint8', 'shape': [6]}}, bytes(6)),
+    body_with({**PAYLOAD, 'heatmap': {'dtype': 'uint8', 'shape': ['a', 3]}}, bytes(6)),
+    body_with({**PAYLOAD, 'heatmap': {'dtype': 'uint8', 'shape': [-2, -3]}}, bytes(6)),
+    body_with({**PAYLOAD, 'heatmap': {'dtype': 'float16', 'shape': [2, 3]}}, bytes(6)),  # Half the bytes
+    body_with(GOOD_HEADER, bytes(5)),  # Truncated heatmap
+    body_with(GOOD_HEADER, bytes(7))  # Trailing garbage
+])
+def test_malformed_bodies_raise_compact_format_error(body):
+    with pytest.raises(CompactFormatError):
+        decode_compact(body)
+
+def test_well_formed_body_from_parts_decodes():
+    assert decode_compact(body_with(GOOD_HEADER, bytes(range(6))))['heatmap_array']['shape'] == [2, 3]
+
+def make_response(body, content_type):
+    response = requests.models.Response()
+    response.status_code = 200
+    response.headers['Content-Type'] = content_type
+    response._content = body
+    response.encoding = 'utf-8'
+    return response
+
+def test_decode_response_follows_the_content_type():
+    compact = make_response(encode_compact(PAYLOAD, heatmap('uint8')), f"{COMPACT_MEDIA_TYPE}; charset=binary")
+    assert 'heatmap_array' in decode_response(compact)
+    assert decode_response(make_response(json.dumps(PAYLOAD).encode(), 'application/json')) == PAYLOAD
@@ -0,0 +1,51 @@
+import csv
+import io
+import json
+import pytest
+from utils.export import HISTORY_COLUMNS, history_records, stream_csv, stream_ndjson, stream_parquet
+from utils.history import HistoryStore
+
+ROWS = 10
+
+@pytest.fixture
+def history(tmp_path):
+    history = HistoryStore(tmp_path)
+    for index in range(ROWS):
+        # Pairs of rows share a timestamp, so the export pages through ties
+        history.add(f"{index:064x}", 'old_crater', 40.0 + index, 'v1', request_id=f"r{index}",
+                    created_at=1_700_000_000.0 + index // 2)
+    yield history
+    history.close()
+
+def records(history):
+    return history_records(history, rows_per_batch=3)
+
+def test_history_records_read_every_row_once_in_batches(history):
+    request_ids = [record['request_id'] for record in records(history)]
+    assert request_ids == [f"r{index}" for index in reversed(range(ROWS))]
+
+def test_csv_stream_has_a_header_and_every_row(history):
+    chunks = list(stream_csv(records(history), HISTORY_COLUMNS, chunk_size=512))
+    rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode())))
+
+    assert len(chunks) > 1
+    assert len(rows) == ROWS
+    assert rows[0]['created_at'] == '2023-11-14T22:13:24+00:00'
+
+def test_ndjson_stream_has_one_line_per_row(history):
+    chunks = list(stream_ndjson(records(history), HISTORY_COLUMNS, chunk_size=512))
+    lines = b"".join(chunks).decode().splitlines()
+
+    assert len(chunks) > 1
+    assert len(lines) == ROWS
+    assert json.loads(lines[-1])['confidence'] == 40.0
+
+def test_parquet_stream_has_one_row_group_per_batch(history):
+    pq = pytest.importorskip('pyarrow.parquet')
+    chunks = list(stream_parquet(records(history), HISTORY_COLUMNS, rows_per_batch=3))
+    parquet_file = pq.ParquetFile(io.BytesIO(b"".join(chunks)))
+
+    assert len(chunks) == 4
+    assert parquet_file.metadata.num_rows == ROWS
+    assert parquet_file.metadata.num_row_groups == 4
+    assert parquet_file.read().column('request_id').to_pylist()[:2] == ['r9', 'r8']
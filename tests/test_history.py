@@ -0,0 +1,52 @@
+import pytest
+from utils.history import HistoryStore
+
+@pytest.fixture
+def history(tmp_path):
+    history = HistoryStore(tmp_path)
+    yield history
+    history.close()
+
+def add_rows(history, created_ats, classification='fresh_crater'):
+    return [
+        history.add(f"{index:064x}", classification, 50.0 + index, 'v1', created_at=created_at)
+        for index, created_at in enumerate(created_ats)
+    ]
+
+def all_pages(history, filters=None, limit=2):
+    """Every page, following the (created_at, id) cursor of each page's last row"""
+    pages, before = [], None
+    while True:
+        rows = history.page(filters, limit=limit, before=before)
+        if not rows:
+            return pages
+        pages.append([row['id'] for row in rows])
+        before = (rows[-1]['created_at'], rows[-1]['id'])
+
+def test_pages_split_tied_timestamps_without_gaps_or_repeats(history):
+    # Five rows share one timestamp, so pages must break the tie on the row ID
+    ids = add_rows(history, [100.0, 200.0, 200.0, 200.0, 200.0, 200.0, 300.0])
+
+    pages = all_pages(history, limit=2)
+
+    assert pages == [[ids[6], ids[5]], [ids[4], ids[3]], [ids[2], ids[1]], [ids[0]]]
+    assert history.count() == 7
+
+def test_pages_keep_filters_across_cursors(history):
+    ids = add_rows(history, [100.0, 100.0, 100.0, 100.0])
+    add_rows(history, [100.0, 100.0], classification='old_crater')
+
+    pages = all_pages(history, {'classes': ['fresh_crater'], 'min_confidence': 51}, limit=2)
+
+    assert pages == [[ids[3], ids[2]], [ids[1]]]
+    assert history.count({'classes': ['fresh_crater'], 'min_confidence': 51}) == 3
+
+def test_rows_added_after_the_first_page_do_not_shift_later_pages(history):
+    ids = add_rows(history, [100.0, 100.0, 100.0])
+    first = history.page(limit=2)
+    history.add('f' * 64, 'fresh_crater', 90.0, 'v1', created_at=100.0)
+
+    second = history.page(limit=2, before=(first[-1]['created_at'], first[-1]['id']))
+
+    assert [row['id'] for row in first] == [ids[2], ids[1]]
+    assert [row['id'] for row in second] == [ids[0]]
@@ -0,0 +1,132 @@
+import math
+import struct
+from io import BytesIO
+import numpy as np
+import pytest
+from PIL import Image
+from utils import ingest
+from utils.ingest import ImageReader, ImageTooLargeError
+
+WIDTH, HEIGHT = 320, 240
+
+def make_image(mode):
+    rng = np.random.default_rng(0)
+    if mode == 'I;16':
+        return Image.frombytes('I;16', (WIDTH, HEIGHT), (rng.random((HEIGHT, WIDTH)) * 65535).astype('<u2').tobytes())
+    if mode == 'RGB':
+        return Image.fromarray((rng.random((HEIGHT, WIDTH, 3)) * 255).astype(np.uint8), 'RGB')
+    return Image.fromarray((rng.random((HEIGHT, WIDTH)) * 255).astype(np.uint8), 'L')
+
+def stripped_tiff(image, rows_per_strip=16):
+    buffer = BytesIO()
+    image.save(buffer, format='TIFF', tiffinfo={278: rows_per_strip})
+    return buffer.getvalue()
+
+def tiled_tiff(image, tile=64):
+    """Uncompressed tiled 8-bit grayscale TIFF, which Pillow cannot write itself"""
+    pixels = np.asarray(image)
+    across, down = math.ceil(WIDTH / tile), math.ceil(HEIGHT / tile)
+    padded = np.zeros((down * tile, across * tile), dtype=np.uint8)
+    padded[:HEIGHT, :WIDTH] = pixels
+    tiles = [
+        padded[row * tile:(row + 1) * tile, col * tile:(col + 1) * tile].tobytes()
+        for row in range(down) for col in range(across)
+    ]
+
+    offsets_at = 8 + len(tiles) * tile * tile
+    counts_at = offsets_at + 4 * len(tiles)
+    ifd_at = counts_at + 4 * len(tiles)
+    entries = [
+        (256, 4, 1, WIDTH), (257, 4, 1, HEIGHT), (258, 3, 1, 8), (259, 3, 1, 1), (262, 3, 1, 1),
+        (277, 3, 1, 1), (322, 4, 1, tile), (323, 4, 1, tile),
+        (324, 4, len(tiles), offsets_at), (325, 4, len(tiles), counts_at)
+    ]
+    return b"".join([
+        struct.pack('<2sHI', b'II', 42, ifd_at),
+        *tiles,
+        struct.pack(f'<{len(tiles)}I', *(8 + index * tile * tile for index in range(len(tiles)))),
+        struct.pack(f'<{len(tiles)}I', *[tile * tile] * len(tiles)),
+        struct.pack('<H', len(entries)),
+        *(struct.pack('<HHII', *entry) for entry in entries),
+        struct.pack('<I', 0)
+    ])
+
+TIFFS = {
+    'stripped L': lambda: stripped_tiff(make_image('L')),
+    'stripped RGB': lambda: stripped_tiff(make_image('RGB')),
+    'stripped I;16': lambda: stripped_tiff(make_image('I;16')),
+    'single strip L': lambda: stripped_tiff(make_image('L'), rows_per_strip=HEIGHT),
+    'tiled L': lambda: tiled_tiff(make_image('L'))
+}
+
+@pytest.fixture(params=list(TIFFS))
+def tiff(request):
+    return TIFFS[request.param]()
+
+def full_decode(data):
+    image = Image.open(BytesIO(data))
+    image.load()
+    return image
+
+def assert_same_pixels(image, expected):
+    assert image.mode == expected.mode
+    assert image.size == expected.size
+    assert image.tobytes() == expected.tobytes()
+
+def test_uncompressed_tiffs_are_windowed(tiff):
+    assert ImageReader(tiff).windowed
+
+@pytest.mark.parametrize('box', [
+    (0, 0, WIDTH, HEIGHT),
+    (0, 0, 1, 1),
+    (5, 7, 69, 71),  # Across tile and strip borders
+    (250, 200, 320, 240),  # The partial edge tiles
+    (64, 16, 128, 32)  # Exactly one tile column, exactly one strip
+])
+def test_read_region_matches_a_cropped_full_decode(tiff, box):
+    reader = ImageReader(tiff)
+    region = reader.read_region(box)
+
+    assert_same_pixels(region, full_decode(tiff).crop(box))
+    assert reader.strategy == 'windowed'
+    assert reader._decoded is None
+
+def test_read_region_decodes_only_the_rows_of_the_box():
+    reader = ImageReader(stripped_tiff(make_image('L')))
+    reader.read_region((10, 100, 20, 110))
+    # Uncompressed strips are trimmed to the box's rows, but stay full width
+    assert reader.decoded_pixels == WIDTH * 10
+
+def test_read_reduced_matches_a_resized_full_decode(tiff, monkeypatch):
+    # Bands of 40 rows, which a quarter-size target splits evenly
+    monkeypatch.setattr(ingest, 'WINDOW_PIXELS', WIDTH * 40)
+    reader = ImageReader(tiff)
+    reduced = reader.read_reduced(0.25)
+
+    expected = full_decode(tiff)
+    mode = 'F' if expected.mode == 'I;16' else expected.mode
+    expected = expected.convert(mode).resize((WIDTH // 4, HEIGHT // 4), Image.Resampling.BOX)
+    assert reader.strategy == 'windowed bands'
+    assert reduced.size == expected.size
+    assert np.allclose(np.asarray(reduced, dtype=np.float64), np.asarray(expected, dtype=np.float64), atol=1)
+
+def test_region_over_the_decode_limit_is_refused(tiff):
+    # Strips are decoded full width, so the limit leaves room for that
+    reader = ImageReader(tiff, max_decode_pixels=WIDTH * 100)
+    with pytest.raises(ImageTooLargeError):
+        reader.read_region((0, 0, WIDTH, 101))
+    assert reader.read_region((0, 0, 100, 100)).size == (100, 100)
+
+def test_pil_bomb_limit_is_restored_after_opening():
+    limit = Image.MAX_IMAGE_PIXELS
+    ImageReader(stripped_tiff(make_image('L')))
+    assert Image.MAX_IMAGE_PIXELS == limit
+
+def test_compressed_tiff_is_decoded_in_full():
+    buffer = BytesIO()
+    make_image('L').save(buffer, format='TIFF', compression='tiff_deflate')
+    reader = ImageReader(buffer.getvalue())
+
+    assert not reader.windowed
+    assert_same_pixels(reader.read_region((5, 7, 69, 71)), full_decode(buffer.getvalue()).crop((5, 7, 69, 71)))
+    assert reader.strategy == 'full'
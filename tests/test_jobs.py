@@ -0,0 +1,37 @@
+import threading
+import pytest
+from utils import jobs
+from utils.jobs import JobCancelled, JobRunner
+
+@pytest.fixture
+def runner():
+    return JobRunner(max_workers=2, orphan_timeout=60.0)
+
+def wait_for_cancel(job, release):
+    while not release.wait(0.01):
+        job.check_cancelled()
+
+def test_unpolled_job_of_a_closed_session_is_cancelled(runner, monkeypatch):
+    monkeypatch.setattr(jobs, 'session_is_active', lambda session_id: False)
+    release = threading.Event()
+    job = runner.submit('closed-tab', wait_for_cancel, release)
+    job.last_polled_at -= 61
+
+    runner.reap_orphans()
+
+    with pytest.raises(JobCancelled):
+        job.result()
+    assert runner.stats()['orphans_cancelled'] == 1
+
+def test_unpolled_job_of_a_connected_session_keeps_running(runner, monkeypatch):
+    monkeypatch.setattr(jobs, 'session_is_active', lambda session_id: session_id == 'other-view')
+    release = threading.Event()
+    job = runner.submit('other-view', wait_for_cancel, release)
+    job.last_polled_at -= 61
+
+    runner.reap_orphans()
+    release.set()
+
+    assert job.result() is None
+    assert not job.cancelled
+    assert runner.stats()['orphans_cancelled'] == 0
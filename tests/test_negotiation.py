@@ -0,0 +1,61 @@
+import logging
+from PIL import Image
+from utils.negotiation import FormatNegotiator, parse_accept_post
+
+def model_input():
+    return Image.linear_gradient('L').resize((64, 48))
+
+def test_forced_codec_waits_for_the_backend_to_accept_it(caplog):
+    negotiator = FormatNegotiator(codec='webp')
+    with caplog.at_level(logging.WARNING, logger='utils.negotiation'):
+        assert negotiator.encode(model_input())[1] == 'png-fast'
+        assert negotiator.encode(model_input())[1] == 'png-fast'
+    assert len(caplog.records) == 1
+
+    negotiator.observe_response("image/png, image/webp", 1000, {'upload': 0.01})
+    data, codec = negotiator.encode(model_input())
+    assert codec == 'webp'
+    assert data[8:12] == b'WEBP'
+
+def test_forced_baseline_codec_is_used_right_away():
+    assert FormatNegotiator(codec='png').choose(64 * 48) == 'png'
+
+def test_accept_post_is_parsed_by_media_type():
+    header = "image/png, Image/WebP;q=0.8, application/x-npy , text/plain"
+    assert parse_accept_post(header) == ['png', 'png-fast', 'webp', 'npy']
+    assert parse_accept_post(None) == []
+
+def negotiator_with_figures(throughput):
+    """Auto negotiator accepting every codec, with fixed per-pixel figures and link throughput"""
+    negotiator = FormatNegotiator()
+    negotiator.observe_response("image/png, image/webp, application/x-npy", throughput, {'upload': 1.0})
+    figures = {'png': (4e-6, 0.6), 'png-fast': (1e-6, 0.7), 'webp': (5e-6, 0.5), 'npy': (1e-8, 2.0)}
+    for codec, (seconds_per_pixel, bytes_per_pixel) in figures.items():
+        negotiator.observe_encode(codec, 1000, seconds_per_pixel * 1000, bytes_per_pixel * 1000)
+    return negotiator
+
+def test_auto_uses_the_default_until_every_codec_is_measured():
+    negotiator = FormatNegotiator()
+    negotiator.observe_response("image/webp", 1000, {'upload': 0.01})
+    negotiator.observe_encode('png-fast', 1000, 0.001, 500)
+    assert negotiator.choose(1000) == 'png-fast'
+
+def test_auto_picks_the_fastest_codec_end_to_end_for_the_link():
+    # Slow link: the smallest upload wins; fast link: the cheapest encode wins
+    assert negotiator_with_figures(throughput=10 * 1024).choose(50_000) == 'webp'
+    assert negotiator_with_figures(throughput=1e9).choose(50_000) == 'npy'
+    assert negotiator_with_figures(throughput=1e6).choose(50_000) == 'png-fast'
+
+def test_link_time_excludes_the_backends_processing():
+    negotiator = FormatNegotiator()
+    negotiator.observe_response(None, 1000, {'upload': 0.5, 'wait': 2.0, 'server': 1.5})
+    assert negotiator.stats()['throughput'] == 1000.0
+
+def test_first_upload_calibrates_every_accepted_codec():
+    negotiator = FormatNegotiator(calibrate_every=50)
+    negotiator.observe_response("image/webp", 1000, {'upload': 0.01})
+    data, codec = negotiator.encode(model_input())
+
+    assert codec in ('png', 'png-fast', 'webp')
+    assert all(negotiator.estimate(codec, 100) is not None for codec in ('png', 'png-fast', 'webp'))
+    assert negotiator.stats()['chosen'] == {codec: 1}
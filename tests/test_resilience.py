@@ -0,0 +1,65 @@
+import types
+import pytest
+from utils import resilience
+from utils.resilience import CircuitBreaker, CircuitOpenError
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake monotonic clock of the resilience module, moved by hand"""
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(resilience, 'time', types.SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.record_failure()
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30.0)
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.record_success()
+    assert breaker.snapshot()['consecutive_failures'] == 0
+
+    trip(breaker)
+    clock.now += 10
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.retry_after == 20.0
+    assert breaker.snapshot() == {'state': 'open', 'consecutive_failures': 3, 'retry_after': 20.0, 'trips': 1}
+
+def test_half_open_probe_success_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30.0)
+    trip(breaker)
+    clock.now += 30
+
+    breaker.before_call()  # The probe
+    assert breaker.snapshot()['state'] == 'half_open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # Only one probe at a time
+
+    breaker.record_success()
+    breaker.before_call()
+    assert breaker.snapshot() == {'state': 'closed', 'consecutive_failures': 0, 'retry_after': 0.0, 'trips': 1}
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30.0)
+    trip(breaker)
+    clock.now += 30
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.snapshot() == {'state': 'open', 'consecutive_failures': 3, 'retry_after': 30.0, 'trips': 2}
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_abandoned_probe_lets_the_next_call_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5.0)
+    trip(breaker)
+    clock.now += 5
+
+    breaker.before_call()
+    breaker.abandon()
+    breaker.before_call()
+    assert breaker.snapshot()['state'] == 'half_open'
@@ -0,0 +1,41 @@
+from utils.result_cache import ResultCache, response_size
+
+def response(index, image_bytes=1000):
+    return {'class_index': index, 'confidence': 0.5, 'overlay_image': 'A' * image_bytes}
+
+def test_cache_is_bounded_by_total_response_size():
+    size = response_size(response(0))
+    cache = ResultCache(max_bytes=3 * size)
+    for index in range(3):
+        cache.put(f"k{index}", response(index))
+    cache.get('k0')  # Now the most recently used
+    cache.put('k3', response(3))
+
+    assert cache.get('k1') is None
+    assert [cache.get(key)['class_index'] for key in ('k0', 'k2', 'k3')] == [0, 2, 3]
+    stats = cache.stats()
+    assert (stats['entries'], stats['bytes'], stats['evictions']) == (3, 3 * size, 1)
+
+def test_replacing_an_entry_does_not_count_it_twice():
+    cache = ResultCache(max_bytes=10 * 1024)
+    cache.put('k', response(0, image_bytes=4000))
+    cache.put('k', response(1, image_bytes=100))
+
+    assert cache.stats()['bytes'] == response_size(response(1, image_bytes=100))
+
+def test_a_single_response_over_the_budget_is_still_kept():
+    cache = ResultCache(max_bytes=100)
+    cache.put('k', response(0))
+    assert cache.get('k')['class_index'] == 0
+
+def test_persisted_entries_count_with_their_file_size(tmp_path):
+    cache = ResultCache(max_bytes=10 * 1024, disk_dir=tmp_path)
+    for index in range(3):
+        cache.put(f"k{index}", response(index))
+
+    reloaded = ResultCache(max_bytes=2 * response_size(response(0)), disk_dir=tmp_path)
+
+    assert reloaded.stats()['entries'] == 2
+    assert reloaded.get('k0') is None
+    assert reloaded.get('k2')['class_index'] == 2
+    assert not (tmp_path / 'k0.json').exists()
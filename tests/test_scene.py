@@ -0,0 +1,32 @@
+import pytest
+from utils.scene import tile_grid, tile_origins
+
+def test_tiles_fit_exactly_without_overlap():
+    grid = tile_grid((300, 200), (100, 100))
+    assert (grid['xs'], grid['ys'], grid['stride']) == ([0, 100, 200], [0, 100], (100, 100))
+
+def test_last_tile_is_flush_with_the_far_edge():
+    assert tile_origins(250, 100, 100) == [0, 100, 150]
+
+def test_scene_smaller_than_a_tile_has_one_tile():
+    grid = tile_grid((60, 40), (227, 277))
+    assert (grid['xs'], grid['ys']) == ([0], [0])
+
+@pytest.mark.parametrize('overlap, stride', [(0.25, 75), (0.5, 50), (0.75, 25)])
+def test_overlap_shortens_the_stride(overlap, stride):
+    grid = tile_grid((400, 100), (100, 100), overlap)
+    assert grid['stride'] == (stride, stride)
+    assert grid['xs'][:2] == [0, stride]
+
+@pytest.mark.parametrize('scene_size', [(227, 277), (1000, 751), (4000, 3000), (228, 278)])
+@pytest.mark.parametrize('overlap', [0.0, 0.25, 0.75])
+def test_tiles_cover_the_scene_and_stay_inside_it(scene_size, overlap):
+    tile_size = (227, 277)
+    grid = tile_grid(scene_size, tile_size, overlap)
+    for origins, length, tile, stride in zip(
+        (grid['xs'], grid['ys']), scene_size, tile_size, grid['stride']
+    ):
+        assert origins[0] == 0
+        assert origins[-1] + tile == length
+        assert origins == sorted(set(origins))
+        assert all(later - earlier <= stride for earlier, later in zip(origins, origins[1:]))
@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+import streamlit as st
+from utils.settings import get_setting
+
+class QueueFullError(Exception):
+    """The admission queue has no room for another backend request"""
+
+    def __init__(self, queued):
+        super().__init__(f"Admission queue is full ({queued} requests waiting)")
+        self.queued = queued
+
+class _Ticket:
+    __slots__ = ('session_id', 'granted')
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.granted = False
+
+class AdmissionController:
+    """Process-wide cap on in-flight backend calls with fair queuing between sessions
+
+    Waiting requests are kept in one FIFO per session. Free slots are handed
+    out round-robin over sessions, so one batch-heavy session cannot starve
+    the others. When ``max_queue`` requests are already waiting new ones are
+    rejected with QueueFullError instead of piling up behind timeouts.
+    """
+
+    def __init__(self, max_in_flight=8, max_queue=64, initial_service_time=2.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._queued = 0
+        self._queues = OrderedDict()  # session id -> deque of tickets, in round-robin order
+        self._service_time = initial_service_time
+        self._counters = {'admitted': 0, 'rejected': 0}
+
+    def _dispatch(self):
+        """Grant free slots to the head tickets of sessions, round-robin"""
+        while self._in_flight < self.max_in_flight and self._queues:
+            session_id, tickets = next(iter(self._queues.items()))
+            ticket = tickets.popleft()
+            if tickets:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+
+            ticket.granted = True
+            self._queued -= 1
+            self._in_flight += 1
+            self._counters['admitted'] += 1
+        self._cond.notify_all()
+
+    def _position(self, ticket):
+        """Number of queued requests that will be admitted before this ticket"""
+        sessions = list(self._queues)
+        rank = sessions.index(ticket.session_id)
+        index = self._queues[ticket.session_id].index(ticket)
+
+        # Round-robin: each earlier session gets index + 1 turns first, later ones index turns
+        ahead = index
+        for other_rank, session_id in enumerate(sessions):
+            if session_id != ticket.session_id:
+                turns = index + 1 if other_rank < rank else index
+                ahead += min(len(self._queues[session_id]), turns)
+        return ahead
+
+    def _estimated_wait(self, position):
+        waves = position // self.max_in_flight + 1
+        return waves * self._service_time
+
+    def _withdraw(self, ticket):
+        with self._cond:
+            if ticket.granted:
+                return
+            tickets = self._queues.get(ticket.session_id)
+            if tickets and ticket in tickets:
+                tickets.remove(ticket)
+                self._queued -= 1
+                if not tickets:
+                    del self._queues[ticket.session_id]
+
+    def _release(self, service_time):
+        with self._cond:
+            self._in_flight -= 1
+            # Exponentially weighted average feeds the wait estimates
+            self._service_time = 0.8 * self._service_time + 0.2 * service_time
+            self._dispatch()
+
+    @contextmanager
+    def admit(self, session_id, on_wait=None):
+        """Hold an in-flight slot for the duration of the block
+
+        ``on_wait(position, estimated_wait_seconds)`` is called while the
+        request is queued; an exception raised from it withdraws the request.
+        """
+        ticket = _Ticket(session_id)
+        with self._cond:
+            if self._queued >= self.max_queue:
+                self._counters['rejected'] += 1
+                raise QueueFullError(self._queued)
+            self._queues.setdefault(session_id, deque()).append(ticket)
+            self._queued += 1
+            self._dispatch()
+
+        try:
+            with self._cond:
+                while not ticket.granted:
+                    if on_wait:
+                        position = self._position(ticket)
+                        on_wait(position, self._estimated_wait(position))
+                    self._cond.wait(timeout=0.25)
+        except BaseException:
+            self._withdraw(ticket)
+            if ticket.granted:
+                self._release(self._service_time)
+            raise
+
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started_at)
+
+    def stats(self):
+        """In-flight and queue counters"""
+        with self._cond:
+            return {
+                **self._counters,
+                'in_flight': self._in_flight,
+                'queued': self._queued,
+                'waiting_sessions': len(self._queues),
+                'max_in_flight': self.max_in_flight,
+                'avg_service_time': self._service_time
+            }
+
+@st.cache_resource
+def get_admission_controller():
+    """Admission controller shared by every session of this server process"""
+    return AdmissionController(
+        max_in_flight=get_setting("BACKEND_MAX_IN_FLIGHT", 8),
+        max_queue=get_setting("BACKEND_MAX_QUEUE", 64)
+    )
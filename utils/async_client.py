@@ -0,0 +1,195 @@
+import asyncio
+import threading
+import time
+import streamlit as st
+from importlib.util import find_spec
+from urllib.parse import urljoin
+from utils.backend_client import parse_server_time
+from utils.compact import ACCEPT_COMPACT
+from utils.negotiation import default_accept_encoding
+from utils.resilience import CircuitBreaker, RetryPolicy
+from utils.telemetry import REQUEST_ID_HEADER
+
+# Bytes handed to the transport per body chunk, so upload progress advances smoothly
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+class EventLoopThread:
+    """An asyncio event loop running forever on a daemon thread
+
+    Worker threads submit coroutines with ``run`` and block on their result,
+    so every backend call of the process shares one loop and one connection pool.
+    """
+
+    def __init__(self, name='backend-event-loop'):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def _run_forever(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coroutine):
+        """Run a coroutine on the loop and return its result in the calling thread"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+@st.cache_resource
+def get_event_loop():
+    """Event loop shared by every session of this server process"""
+    return EventLoopThread()
+
+class AsyncBackendClient:
+    """httpx-based client for the prediction backend, on a shared event loop
+
+    Drop-in replacement for BackendClient: ``predict`` blocks the calling
+    worker thread while the request runs on the loop. HTTP/2 is negotiated
+    through TLS ALPN when the h2 package is installed and the server offers
+    it; plain http:// backends are spoken to over HTTP/1.1.
+    """
+
+    def __init__(self, base_url, event_loop, pool_size=10, connect_timeout=3.05,
+                 read_timeout=60, keep_alive=True, http2=True, retry_policy=None,
+                 breaker=None, coalescer=None, compact_response=True, negotiator=None,
+                 accept_encoding=None):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.event_loop = event_loop
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keep_alive = keep_alive
+        self.http2 = http2 and find_spec('h2') is not None
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.coalescer = coalescer
+        self.compact_response = compact_response
+        self.negotiator = negotiator
+        self.accept_encoding = accept_encoding
+
+        self._client = None
+        self._counters = {'requests': 0, 'connections': 0, 'http2_responses': 0}
+
+    def _get_client(self):
+        """Pooled httpx client, created on the loop on first use"""
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size if self.keep_alive else 0
+                )
+            )
+        return self._client
+
+    @property
+    def timeout(self):
+        """(connect, read) timeout tuple, as for BackendClient"""
+        return (self.connect_timeout, self.read_timeout)
+
+    def url(self, path):
+        """Absolute backend URL for an endpoint path"""
+        return urljoin(self.base_url, path)
+
+    def timeout_within(self, budget):
+        """(connect, read) timeouts clipped to the remaining time budget"""
+        return (min(self.connect_timeout, budget), min(self.read_timeout, budget))
+
+    def predict(self, filename, data, mime_type, on_progress=None, timeout=None, request_id=None):
+        """Send an encoded image to the /predict endpoint
+
+        Same contract as BackendClient.predict. httpx errors are raised as
+        their requests counterparts, so retries and error messages treat both
+        clients alike.
+        """
+        import httpx
+        import requests
+
+        try:
+            return self.event_loop.run(self._predict(filename, data, mime_type, on_progress, timeout, request_id))
+        except httpx.ConnectTimeout as e:
+            raise requests.exceptions.ConnectTimeout(str(e)) from e
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e)) from e
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e)) from e
+
+    async def _predict(self, filename, data, mime_type, on_progress, timeout, request_id):
+        import httpx
+        from urllib3 import encode_multipart_formdata
+
+        client = self._get_client()
+        encode_started_at = time.perf_counter()
+        body, content_type = encode_multipart_formdata({'file': (filename, data, mime_type)})
+        headers = {'Content-Type': content_type, 'Content-Length': str(len(body))}
+        if request_id:
+            headers[REQUEST_ID_HEADER] = request_id
+        if self.compact_response:
+            headers['Accept'] = ACCEPT_COMPACT
+        headers['Accept-Encoding'] = self.accept_encoding or default_accept_encoding('httpx')
+        marks = {}
+
+        async def stream_body():
+            view = memoryview(body)
+            marks['upload_started'] = time.perf_counter()
+            for offset in range(0, len(view), UPLOAD_CHUNK_SIZE):
+                yield view[offset:offset + UPLOAD_CHUNK_SIZE].tobytes()
+                if on_progress:
+                    on_progress('upload', min(offset + UPLOAD_CHUNK_SIZE, len(view)) / len(view))
+            marks['upload_finished'] = time.perf_counter()
+
+        async def trace(event, info):
+            if event == 'connection.connect_tcp.complete':
+                self._counters['connections'] += 1
+
+        connect_timeout, read_timeout = timeout or self.timeout
+        request = client.build_request(
+            'POST', self.url('predict'), content=stream_body(), headers=headers,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            extensions={'trace': trace}
+        )
+
+        started_at = time.perf_counter()
+        response = await client.send(request, stream=True)
+        headers_at = time.perf_counter()
+        self._counters['requests'] += 1
+        if response.http_version == 'HTTP/2':
+            self._counters['http2_responses'] += 1
+
+        if on_progress:
+            on_progress('download', 0.0)
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+        finished_at = time.perf_counter()
+
+        upload_started = marks.get('upload_started', started_at)
+        upload_finished = marks.get('upload_finished', upload_started)
+        timings = {
+            'encode': started_at - encode_started_at,
+            'connect': upload_started - started_at,
+            'upload': upload_finished - upload_started,
+            'wait': headers_at - upload_finished,
+            'download': finished_at - headers_at
+        }
+        server_time = parse_server_time(response.headers)
+        if server_time is not None:
+            timings['server'] = server_time
+        return response, timings
+
+    def stats(self):
+        """Pool hit/miss counters, as for BackendClient, plus HTTP/2 responses"""
+        counters = dict(self._counters)
+        return {
+            'requests': counters['requests'],
+            'pool_hits': max(counters['requests'] - counters['connections'], 0),
+            'pool_misses': counters['connections'],
+            'http2_responses': counters['http2_responses']
+        }
+
+    def close(self):
+        """Close all pooled connections"""
+        if self._client is not None:
+            self.event_loop.run(self._client.aclose())
+            self._client = None
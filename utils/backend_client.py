@@ -0,0 +1,260 @@
+import logging
+import threading
+import time
+import streamlit as st
+from importlib.util import find_spec
+from urllib.parse import urljoin
+from utils.coalescing import RequestCoalescer
+from utils.compact import ACCEPT_COMPACT
+from utils.negotiation import FormatNegotiator, default_accept_encoding
+from utils.resilience import CircuitBreaker, RetryPolicy
+from utils.settings import get_setting
+from utils.telemetry import REQUEST_ID_HEADER
+
+logger = logging.getLogger(__name__)
+
+def parse_server_time(headers):
+    """Backend processing time in seconds from Server-Timing or X-Process-Time, if sent"""
+    server_timing = headers.get('Server-Timing')
+    if server_timing:
+        total = 0.0
+        for metric in server_timing.split(','):
+            for param in metric.split(';')[1:]:
+                name, _, value = param.strip().partition('=')
+                if name == 'dur':
+                    try:
+                        total += float(value.strip('"')) / 1000
+                    except ValueError:
+                        pass
+        if total:
+            return total
+    process_time = headers.get('X-Process-Time')
+    if process_time:
+        try:
+            return float(process_time)
+        except ValueError:
+            pass
+    return None
+
+def response_wire_bytes(response):
+    """Size of a response body as received, before gzip/zstd decoding"""
+    if hasattr(response, 'num_bytes_downloaded'):  # httpx
+        return response.num_bytes_downloaded
+    raw = getattr(response, 'raw', None)
+    if raw is not None and hasattr(raw, 'tell'):  # requests over urllib3
+        return raw.tell()
+    return len(response.content)
+
+class ProgressBody:
+    """File-like request body that reports how many bytes were handed to the socket
+
+    requests sizes the body through ``__len__`` (so a Content-Length header is
+    sent) and urllib3 streams it by calling ``read`` in blocks.
+    """
+
+    def __init__(self, data, on_progress=None):
+        self._data = memoryview(data)
+        self._offset = 0
+        self._on_progress = on_progress
+        self.started_at = None
+        self.finished_at = None
+
+    def __len__(self):
+        return len(self._data)
+
+    def read(self, size=-1):
+        if self.started_at is None:
+            self.started_at = time.perf_counter()
+
+        if size is None or size < 0:
+            size = len(self._data) - self._offset
+        chunk = self._data[self._offset:self._offset + size].tobytes()
+        self._offset += len(chunk)
+
+        if self._offset >= len(self._data) and self.finished_at is None:
+            self.finished_at = time.perf_counter()
+        if self._on_progress and chunk:
+            self._on_progress('upload', self._offset / len(self._data))
+        return chunk
+
+class BackendClient:
+    """Pooled, keep-alive HTTP client for the prediction backend
+
+    The requests session is created on the first request, so pages that only
+    read the breaker state or pool counters don't import requests. With a
+    ``coalescer``, concurrent classifications of the same upload share a call;
+    a ``negotiator`` picks the upload format for the measured link.
+    """
+
+    def __init__(self, base_url, pool_size=10, connect_timeout=3.05,
+                 read_timeout=60, keep_alive=True, retry_policy=None, breaker=None,
+                 coalescer=None, compact_response=True,
+                 negotiator=None, accept_encoding=None):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keep_alive = keep_alive
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.coalescer = coalescer
+        self.compact_response = compact_response
+        self.negotiator = negotiator
+        self.accept_encoding = accept_encoding
+
+        self.adapter = None
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """Pooled requests session, created on first use"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    self.adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                    session.mount('http://', self.adapter)
+                    session.mount('https://', self.adapter)
+                    if not self.keep_alive:
+                        session.headers['Connection'] = 'close'
+                    self._session = session
+        return self._session
+
+    @property
+    def timeout(self):
+        """(connect, read) timeout tuple passed to requests"""
+        return (self.connect_timeout, self.read_timeout)
+
+    def url(self, path):
+        """Absolute backend URL for an endpoint path"""
+        return urljoin(self.base_url, path)
+
+    def post(self, path, **kwargs):
+        """POST to a backend endpoint through the pooled session"""
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.post(self.url(path), **kwargs)
+
+    def timeout_within(self, budget):
+        """(connect, read) timeouts clipped to the remaining time budget"""
+        return (min(self.connect_timeout, budget), min(self.read_timeout, budget))
+
+    def predict(self, filename, data, mime_type, on_progress=None, timeout=None, request_id=None):
+        """Send an encoded image to the /predict endpoint
+
+        Returns the response, with its body already read, and the duration in
+        seconds of the encode, connect, upload, wait and download phases, plus
+        the backend's own processing time as ``server`` when it reports one.
+        ``on_progress`` is called with (phase, fraction) as the request advances.
+        ``request_id`` is sent as the X-Request-ID header. With
+        ``compact_response`` the compact binary response format is accepted,
+        and ``accept_encoding`` replaces the default Accept-Encoding of the
+        compressions urllib3 can decode.
+        """
+        from urllib3 import encode_multipart_formdata
+
+        encode_started_at = time.perf_counter()
+        body, content_type = encode_multipart_formdata({'file': (filename, data, mime_type)})
+        progress_body = ProgressBody(body, on_progress)
+        headers = {'Content-Type': content_type}
+        if request_id:
+            headers[REQUEST_ID_HEADER] = request_id
+        if self.compact_response:
+            headers['Accept'] = ACCEPT_COMPACT
+        headers['Accept-Encoding'] = self.accept_encoding or default_accept_encoding('requests')
+
+        started_at = time.perf_counter()
+        response = self.post(
+            'predict',
+            data=progress_body,
+            headers=headers,
+            stream=True,
+            timeout=timeout or self.timeout
+        )
+        headers_at = time.perf_counter()
+
+        if on_progress:
+            on_progress('download', 0.0)
+        response.content  # Read the body while timing it
+        finished_at = time.perf_counter()
+
+        upload_started = progress_body.started_at or started_at
+        upload_finished = progress_body.finished_at or upload_started
+        timings = {
+            'encode': started_at - encode_started_at,
+            'connect': upload_started - started_at,
+            'upload': upload_finished - upload_started,
+            'wait': headers_at - upload_finished,
+            'download': finished_at - headers_at
+        }
+        server_time = parse_server_time(response.headers)
+        if server_time is not None:
+            timings['server'] = server_time
+        return response, timings
+
+    def stats(self):
+        """Pool hit/miss counters aggregated over all connection pools"""
+        requests_sent = 0
+        connections_opened = 0
+        pools = self.adapter.poolmanager.pools if self.adapter is not None else {}
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_sent += pool.num_requests
+            connections_opened += pool.num_connections
+
+        return {
+            'requests': requests_sent,
+            'pool_hits': max(requests_sent - connections_opened, 0),
+            'pool_misses': connections_opened
+        }
+
+    def close(self):
+        """Close all pooled connections"""
+        if self._session is not None:
+            self._session.close()
+
+@st.cache_resource
+def get_backend_client(base_url):
+    """Backend client shared by every session of this server process
+
+    BACKEND_ASYNC selects the httpx client on the shared event loop instead
+    of the requests one; it falls back to requests when httpx is missing.
+    """
+    options = dict(
+        pool_size=get_setting("BACKEND_POOL_SIZE", 10),
+        connect_timeout=get_setting("BACKEND_CONNECT_TIMEOUT", 3.05),
+        read_timeout=get_setting("BACKEND_READ_TIMEOUT", 60.0),
+        keep_alive=get_setting("BACKEND_KEEP_ALIVE", True),
+        retry_policy=RetryPolicy(
+            max_attempts=get_setting("BACKEND_RETRY_ATTEMPTS", 3),
+            base_delay=get_setting("BACKEND_RETRY_BASE_DELAY", 0.25),
+            max_delay=get_setting("BACKEND_RETRY_MAX_DELAY", 4.0),
+            deadline=get_setting("CLASSIFY_DEADLINE_SECONDS", 90.0)
+        ),
+        breaker=CircuitBreaker(
+            failure_threshold=get_setting("BREAKER_FAILURE_THRESHOLD", 5),
+            reset_timeout=get_setting("BREAKER_RESET_SECONDS", 30.0)
+        ),
+        coalescer=RequestCoalescer() if get_setting("BACKEND_COALESCE_REQUESTS", True) else None,
+        compact_response=get_setting("BACKEND_COMPACT_RESPONSE", True),
+        negotiator=FormatNegotiator(
+            codec=get_setting("UPLOAD_FORMAT", "auto"),
+            calibrate_every=get_setting("UPLOAD_FORMAT_CALIBRATE_EVERY", 50)
+        ),
+        accept_encoding=get_setting("BACKEND_ACCEPT_ENCODING", None)
+    )
+
+    if get_setting("BACKEND_ASYNC", False):
+        if find_spec('httpx') is not None:
+            from utils.async_client import AsyncBackendClient, get_event_loop
+
+            return AsyncBackendClient(
+                base_url, get_event_loop(), http2=get_setting("BACKEND_HTTP2", True), **options
+            )
+        logger.warning("BACKEND_ASYNC is set but httpx is not installed, using the requests client")
+    return BackendClient(base_url, **options)
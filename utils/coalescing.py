@@ -0,0 +1,66 @@
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from utils.jobs import JobCancelled
+
+class RequestCoalescer:
+    """Collapse concurrent calls for the same key into one in-flight call
+
+    The first caller for a key runs the call; callers arriving while it is in
+    flight wait for its result, or its exception, instead of calling again.
+    A leader that is cancelled hands the call over to one of its waiters.
+    """
+
+    def __init__(self, poll_interval=0.25):
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._counters = {'calls': 0, 'coalesced': 0}
+
+    def run(self, key, call, on_wait=None):
+        """Return (result of ``call()`` for ``key``, whether another caller's call produced it)
+
+        ``on_wait`` is called every ``poll_interval`` seconds while waiting
+        for another caller's call and may raise to stop waiting.
+        """
+        while True:
+            with self._lock:
+                future = self._in_flight.get(key)
+                leader = future is None
+                if leader:
+                    future = self._in_flight[key] = Future()
+                    self._counters['calls'] += 1
+
+            if leader:
+                try:
+                    result = call()
+                except BaseException as e:
+                    future.set_exception(e)
+                    raise
+                else:
+                    future.set_result(result)
+                    return result, False
+                finally:
+                    with self._lock:
+                        del self._in_flight[key]
+
+            try:
+                result = self._wait(future, on_wait)
+            except JobCancelled:
+                if not future.done():
+                    raise  # This caller was cancelled while waiting
+                continue  # The leader was cancelled; call again
+            with self._lock:
+                self._counters['coalesced'] += 1
+            return result, True
+
+    def _wait(self, future, on_wait):
+        while True:
+            try:
+                return future.result(timeout=self.poll_interval)
+            except FutureTimeoutError:
+                if on_wait:
+                    on_wait()
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, 'in_flight': len(self._in_flight)}
@@ -0,0 +1,63 @@
+import base64
+import json
+import struct
+
+# Compact /predict response: instead of JSON with base64 heatmap and overlay
+# PNGs, a backend that accepts COMPACT_MEDIA_TYPE answers with
+#     MAGIC | header length (4 bytes, big-endian) | JSON header | heatmap
+# The header holds the usual fields plus ``heatmap: {dtype, shape}`` for the
+# raw little-endian Grad-CAM array that follows: a low-resolution uint8 map
+# quantized to 0-255, or a float16 one in 0-1. The overlay is composited
+# locally from it (utils.heatmap.composite_overlay).
+COMPACT_MEDIA_TYPE = 'application/vnd.lunarcrater.compact'
+MAGIC = b'LCH1'
+HEATMAP_DTYPES = ('uint8', 'float16')
+
+# Sent with every /predict request; backends that don't know the compact format answer in JSON
+ACCEPT_COMPACT = f"{COMPACT_MEDIA_TYPE}, application/json;q=0.9"
+
+class CompactFormatError(ValueError):
+    """A compact response body that could not be decoded"""
+
+def encode_compact(payload, heatmap):
+    """Compact response body for a JSON-able ``payload`` and a 2-D heatmap array"""
+    if heatmap.dtype.name not in HEATMAP_DTYPES or heatmap.ndim != 2:
+        raise ValueError(f"Heatmap must be a 2-D {' or '.join(HEATMAP_DTYPES)} array")
+    header = json.dumps({
+        **payload,
+        'heatmap': {'dtype': heatmap.dtype.name, 'shape': list(heatmap.shape)}
+    }).encode()
+    data = heatmap.astype(heatmap.dtype.newbyteorder('<'), copy=False).tobytes()
+    return MAGIC + struct.pack('>I', len(header)) + header + data
+
+def decode_compact(body):
+    """Backend data of a compact body
+
+    The heatmap stays raw bytes, base64 encoded under ``heatmap_array`` with
+    its dtype and shape, so the data can be cached as JSON like any response.
+    """
+    if body[:4] != MAGIC or len(body) < 8:
+        raise CompactFormatError("Not a compact response body")
+    header_length, = struct.unpack('>I', body[4:8])
+    try:
+        data = json.loads(body[8:8 + header_length])
+        heatmap = data.pop('heatmap')
+        dtype, shape = heatmap['dtype'], [int(side) for side in heatmap['shape']]
+    except (ValueError, KeyError, TypeError) as e:
+        raise CompactFormatError(f"Invalid compact header: {e}") from e
+
+    raw = body[8 + header_length:]
+    itemsize = 1 if dtype == 'uint8' else 2
+    valid_shape = len(shape) == 2 and min(shape) > 0
+    if dtype not in HEATMAP_DTYPES or not valid_shape or len(raw) != shape[0] * shape[1] * itemsize:
+        raise CompactFormatError(f"Heatmap of {len(raw)} bytes does not match {dtype} {shape}")
+
+    data['heatmap_array'] = {'dtype': dtype, 'shape': shape, 'data': base64.b64encode(raw).decode('ascii')}
+    return data
+
+def decode_response(response):
+    """Backend data of a /predict response, compact or JSON"""
+    content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+    if content_type == COMPACT_MEDIA_TYPE:
+        return decode_compact(response.content)
+    return response.json()
@@ -0,0 +1,220 @@
+import argparse
+import base64
+import csv
+import io
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+# Export formats by name: (MIME type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', '.csv'),
+    'ndjson': ('application/x-ndjson', '.ndjson'),
+    'parquet': ('application/vnd.apache.parquet', '.parquet')
+}
+
+# Columns of each export source; IMAGE_COLUMN is appended when images are included
+HISTORY_COLUMNS = (
+    'created_at', 'content_hash', 'classification', 'confidence', 'model_version', 'filename', 'request_id'
+)
+BATCH_COLUMNS = (
+    'filename', 'content_hash', 'classification', 'confidence', 'estimated_age', 'cache_hit', 'request_id', 'error'
+)
+IMAGE_COLUMN = 'image'
+COLUMN_TYPES = {
+    'created_at': 'timestamp', 'confidence': 'float', 'cache_hit': 'bool', IMAGE_COLUMN: 'binary'
+}
+
+# Rows read from the history, and written per Parquet row group, at a time
+ROWS_PER_BATCH = 1000
+# Text formats are yielded in chunks of about this many bytes
+CHUNK_SIZE = 256 * 1024
+
+def export_columns(columns, include_images):
+    """Columns of an export, with the image column when images are included"""
+    return (*columns, IMAGE_COLUMN) if include_images else tuple(columns)
+
+def history_records(history, filters=None, include_images=False, rows_per_batch=ROWS_PER_BATCH):
+    """Export records of every history row matching ``filters``, newest first
+
+    Rows are read one keyset page at a time, so only ``rows_per_batch`` of
+    them are in memory however large the history is. The image is the
+    row's JPEG thumbnail.
+    """
+    before = None
+    while True:
+        rows = history.page(filters, limit=rows_per_batch, before=before)
+        for row in rows:
+            record = {column: row[column] for column in HISTORY_COLUMNS}
+            record['created_at'] = datetime.fromtimestamp(row['created_at'], timezone.utc)
+            if include_images:
+                record[IMAGE_COLUMN] = history.thumbnail(row['thumbnail_ref'])
+            yield record
+        if len(rows) < rows_per_batch:
+            return
+        before = (rows[-1]['created_at'], rows[-1]['id'])
+
+def batch_records(items, store, include_images=False):
+    """Export records of batch results items; the image is the analyzed preview"""
+    for item in items:
+        result = item['result'] or {}
+        record = {column: result.get(column) for column in BATCH_COLUMNS}
+        record['filename'] = item['name']
+        record['error'] = item['error']
+        if include_images:
+            record[IMAGE_COLUMN] = store.get(result['preview_ref']) if result.get('preview_ref') else None
+        yield record
+
+def text_value(value):
+    """JSON- and CSV-friendly form of a record value: ISO 8601 times, base64 images"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('ascii')
+    return value
+
+def stream_csv(records, columns, chunk_size=CHUNK_SIZE):
+    """CSV of export records as UTF-8 byte chunks, header first"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    for record in records:
+        writer.writerow({column: text_value(record.get(column)) for column in columns})
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+def stream_ndjson(records, columns, chunk_size=CHUNK_SIZE):
+    """Newline-delimited JSON of export records as UTF-8 byte chunks"""
+    lines, size = [], 0
+    for record in records:
+        line = json.dumps({column: text_value(record.get(column)) for column in columns}) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield "".join(lines).encode()
+            lines, size = [], 0
+    yield "".join(lines).encode()
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last ``drain``
+
+    The position keeps counting across drains, so a Parquet writer can record
+    the file offsets of its column chunks while the bytes already left.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def arrow_schema(columns):
+    """pyarrow schema of export columns"""
+    import pyarrow as pa
+
+    arrow_types = {
+        'timestamp': pa.timestamp('us', tz='UTC'), 'float': pa.float64(), 'bool': pa.bool_(), 'binary': pa.binary()
+    }
+    return pa.schema([(column, arrow_types.get(COLUMN_TYPES.get(column), pa.string())) for column in columns])
+
+def stream_parquet(records, columns, rows_per_batch=ROWS_PER_BATCH):
+    """Parquet file of export records as byte chunks, one row group per ``rows_per_batch`` records"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(columns)
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema, compression='zstd')
+
+    def write(batch):
+        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+
+    batch = []
+    try:
+        for record in records:
+            batch.append(record)
+            if len(batch) == rows_per_batch:
+                write(batch)
+                batch = []
+                yield sink.drain()
+        if batch:
+            write(batch)
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def stream_export(records, columns, export_format):
+    """Byte chunks of export records in one of EXPORT_FORMATS"""
+    if export_format == 'csv':
+        return stream_csv(records, columns)
+    if export_format == 'ndjson':
+        return stream_ndjson(records, columns)
+    if export_format == 'parquet':
+        return stream_parquet(records, columns)
+    raise ValueError(f"Unknown export format: {export_format}")
+
+def export_bytes(records, columns, export_format):
+    """Whole export as bytes, for ``st.download_button``
+
+    Rows are still encoded as a stream, so only the finished file is held,
+    never the records. That file still grows with the row count, which is
+    why the History page caps its downloads at HISTORY_EXPORT_MAX_ROWS.
+    """
+    return b"".join(stream_export(records, columns, export_format))
+
+def main():
+    """Stream the classification history to a file or stdout"""
+    from utils.history import HistoryStore
+    from utils.results import CLASS_LABELS
+
+    parser = argparse.ArgumentParser(description="Export the classification history as CSV, NDJSON or Parquet")
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='parquet', help="export format")
+    parser.add_argument('--output', help="file to write, standard output when omitted")
+    parser.add_argument('--history-dir', default=os.environ.get('HISTORY_DIR', '.history'), help="history directory")
+    parser.add_argument('--class', dest='classes', action='append', choices=CLASS_LABELS,
+                        help="only this class, can be repeated")
+    parser.add_argument('--min-confidence', type=float, help="lowest confidence in percent")
+    parser.add_argument('--since', type=datetime.fromisoformat, help="first time included, ISO 8601")
+    parser.add_argument('--until', type=datetime.fromisoformat, help="first time excluded, ISO 8601")
+    parser.add_argument('--images', action='store_true', help="include the thumbnails")
+    args = parser.parse_args()
+
+    filters = {
+        'classes': args.classes,
+        'min_confidence': args.min_confidence,
+        'since': args.since.timestamp() if args.since else None,
+        'until': args.until.timestamp() if args.until else None
+    }
+    history = HistoryStore(args.history_dir)
+    columns = export_columns(HISTORY_COLUMNS, args.images)
+    chunks = stream_export(history_records(history, filters, args.images), columns, args.format)
+
+    output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+        history.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+from functools import lru_cache
+from io import BytesIO
+
+# Longest side of heatmaps sent to the browser; columns are narrower than this
+DISPLAY_MAX_SIDE = 640
+
+# Formats st.image passes through untouched when output_format matches
+BROWSER_FORMATS = ('PNG', 'JPEG')
+
+# Weight of the colormapped heatmap over the preview, out of 256
+OVERLAY_ALPHA = 102
+OVERLAY_JPEG_QUALITY = 90
+
+def prepare_overlay(raw, max_side=DISPLAY_MAX_SIDE):
+    """Turn encoded overlay bytes into display-sized, browser-ready image bytes
+
+    Returns (bytes, format). An overlay that is already a PNG/JPEG of display
+    size is returned as is, without decoding its pixels. Larger ones are
+    downsampled in uint8 and re-encoded once.
+    """
+    from PIL import Image
+
+    image = Image.open(BytesIO(raw))  # Reads the header only
+
+    if image.format in BROWSER_FORMATS and max(image.size) <= max_side:
+        return raw, image.format
+
+    if image.format == 'JPEG':
+        image.draft('RGB', (max_side, max_side))  # Decode at reduced scale
+    if image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGB')
+    image.thumbnail((max_side, max_side), Image.Resampling.BILINEAR)
+
+    buffer = BytesIO()
+    image.save(buffer, format='PNG', compress_level=1)
+    return buffer.getvalue(), 'PNG'
+
+@lru_cache(maxsize=1)
+def colormap_lut():
+    """256×3 uint8 jet colormap, the one Grad-CAM overlays are usually drawn with"""
+    import numpy as np
+
+    x = np.linspace(0, 1, 256)
+    channels = [np.clip(1.5 - np.abs(4 * x - offset), 0, 1) for offset in (3, 2, 1)]
+    lut = np.round(np.stack(channels, axis=-1) * 255).astype(np.uint8)
+    lut.setflags(write=False)
+    return lut
+
+def heatmap_to_uint8(data, dtype, shape):
+    """2-D uint8 array of raw heatmap bytes; float16 maps in 0-1 are quantized"""
+    import numpy as np
+
+    heatmap = np.frombuffer(data, dtype=np.dtype(dtype).newbyteorder('<')).reshape(shape)
+    if heatmap.dtype == np.uint8:
+        return heatmap
+    return np.clip(np.nan_to_num(heatmap.astype(np.float32)) * 255 + 0.5, 0, 255).astype(np.uint8)
+
+@lru_cache(maxsize=4)
+def blend_luts(alpha):
+    """Premultiplied lookup tables: preview level -> its share, heatmap level -> its colour's share"""
+    import numpy as np
+
+    base = (np.arange(256, dtype=np.uint16) * (256 - alpha) >> 8).astype(np.uint8)
+    colors = (colormap_lut().astype(np.uint16) * alpha >> 8).astype(np.uint8)
+    return base, colors
+
+def composite_overlay(preview, heatmap, alpha=OVERLAY_ALPHA):
+    """Colormapped ``heatmap`` (2-D uint8) blended onto encoded ``preview`` bytes, as (JPEG bytes, format)
+
+    The low-resolution heatmap is upsampled to the preview size; blending
+    is then two table lookups and one uint8 addition per pixel, which cannot
+    overflow because the premultiplied shares add up to at most 255.
+    """
+    import numpy as np
+    from PIL import Image
+
+    base = Image.open(BytesIO(preview))
+    base.draft(base.mode, (DISPLAY_MAX_SIDE, DISPLAY_MAX_SIDE))
+    if base.mode not in ('L', 'RGB'):
+        base = base.convert('RGB')
+    base.thumbnail((DISPLAY_MAX_SIDE, DISPLAY_MAX_SIDE), Image.Resampling.BILINEAR)
+
+    base_lut, color_lut = blend_luts(alpha)
+    upsampled = np.asarray(Image.fromarray(heatmap, mode='L').resize(base.size, Image.Resampling.BILINEAR))
+    blended = np.take(color_lut, upsampled, axis=0)
+    base_share = np.take(base_lut, np.asarray(base))
+    blended += base_share[..., None] if base_share.ndim == 2 else base_share
+
+    buffer = BytesIO()
+    Image.fromarray(blended, mode='RGB').save(buffer, format='JPEG', quality=OVERLAY_JPEG_QUALITY)
+    return buffer.getvalue(), 'JPEG'
+
+def get_overlay_display(result, store):
+    """Display-ready overlay of a result as (bytes, format), prepared once and kept in the session store
+
+    The overlay comes from the backend's overlay image or, for compact
+    responses, is composited from the heatmap array onto the upload preview.
+    Returns None when the result has no overlay or its blobs were evicted.
+    """
+    data = store.get(result['overlay_display_ref']) if result.get('overlay_display_ref') else None
+    if data is not None:
+        return data, result['overlay_display_format']
+
+    raw = store.get(result['overlay_ref']) if result.get('overlay_ref') else None
+    heatmap = result.get('heatmap_array')
+    if raw is not None:
+        data, image_format = prepare_overlay(raw)
+    elif heatmap and result.get('preview_ref'):
+        heatmap_data = store.get(heatmap['ref'])
+        preview = store.get(result['preview_ref'])
+        if heatmap_data is None or preview is None:
+            return None
+        data, image_format = composite_overlay(
+            preview, heatmap_to_uint8(heatmap_data, heatmap['dtype'], heatmap['shape'])
+        )
+    else:
+        return None
+
+    result['overlay_display_ref'] = store.put(data)
+    result['overlay_display_format'] = image_format
+    return data, image_format
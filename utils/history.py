@@ -0,0 +1,199 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+import streamlit as st
+from utils.settings import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Longest side of the thumbnails kept next to the history database
+THUMBNAIL_SIDE = 96
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS classifications (
+    id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    classification TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    created_at REAL NOT NULL,
+    model_version TEXT NOT NULL,
+    thumbnail_ref TEXT,
+    filename TEXT,
+    request_id TEXT
+);
+CREATE INDEX IF NOT EXISTS classifications_hash ON classifications (content_hash, created_at);
+CREATE INDEX IF NOT EXISTS classifications_class_confidence ON classifications (classification, confidence);
+CREATE INDEX IF NOT EXISTS classifications_class_time ON classifications (classification, created_at);
+CREATE INDEX IF NOT EXISTS classifications_time ON classifications (created_at);
+"""
+
+COLUMNS = (
+    'id', 'content_hash', 'classification', 'confidence', 'created_at',
+    'model_version', 'thumbnail_ref', 'filename', 'request_id'
+)
+
+def build_filter(filters):
+    """SQL WHERE clause and parameters of a history filter dict
+
+    Known keys: ``classes`` (list), ``min_confidence`` / ``max_confidence``
+    (percent), ``since`` / ``until`` (Unix time, until exclusive) and
+    ``hash_prefix`` (hex).
+    """
+    clauses, params = [], []
+    filters = filters or {}
+    if filters.get('classes'):
+        clauses.append(f"classification IN ({', '.join('?' * len(filters['classes']))})")
+        params.extend(filters['classes'])
+    if filters.get('min_confidence') is not None:
+        clauses.append("confidence >= ?")
+        params.append(filters['min_confidence'])
+    if filters.get('max_confidence') is not None:
+        clauses.append("confidence <= ?")
+        params.append(filters['max_confidence'])
+    if filters.get('since') is not None:
+        clauses.append("created_at >= ?")
+        params.append(filters['since'])
+    if filters.get('until') is not None:
+        clauses.append("created_at < ?")
+        params.append(filters['until'])
+    if filters.get('hash_prefix'):
+        prefix = ''.join(char for char in filters['hash_prefix'].lower() if char in '0123456789abcdef')
+        # GLOB is case sensitive, so SQLite can answer a prefix match from the hash index
+        clauses.append("content_hash GLOB ?")
+        params.append(prefix + '*')
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+class HistoryStore:
+    """Classification history in an embedded SQLite database, shared by every session
+
+    Rows hold the upload's content hash, class, confidence (percent),
+    timestamp, model version and a reference to a small JPEG thumbnail kept
+    in ``thumbnails/`` next to the database. Pages are read with keyset
+    pagination on (created_at, id), so a page costs the same however deep
+    into the history it is. One connection is shared behind a lock; the
+    database runs in WAL mode so readers in other processes never block.
+    """
+
+    def __init__(self, directory, thumbnail_side=THUMBNAIL_SIDE):
+        self.directory = Path(directory)
+        self.thumbnail_dir = self.directory / 'thumbnails'
+        self.thumbnail_side = thumbnail_side
+        self.thumbnail_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.directory / 'classifications.sqlite3', check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def _thumbnail_path(self, ref):
+        return self.thumbnail_dir / ref
+
+    def save_thumbnail(self, content_hash, preview):
+        """Write a thumbnail of encoded preview bytes once per content hash and return its reference"""
+        from PIL import Image
+
+        ref = f"{content_hash[:2]}/{content_hash}.jpg"
+        path = self._thumbnail_path(ref)
+        if path.exists():
+            return ref
+
+        image = Image.open(BytesIO(preview))
+        image.draft('RGB', (self.thumbnail_side, self.thumbnail_side))
+        if image.mode not in ('L', 'RGB'):
+            image = image.convert('RGB')
+        image.thumbnail((self.thumbnail_side, self.thumbnail_side), Image.Resampling.BILINEAR)
+
+        path.parent.mkdir(exist_ok=True)
+        temp_path = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        image.save(temp_path, format='JPEG', quality=80)
+        os.replace(temp_path, path)
+        return ref
+
+    def add(self, content_hash, classification, confidence, model_version,
+            preview=None, filename=None, request_id=None, created_at=None):
+        """Record one classification and return its row ID"""
+        thumbnail_ref = self.save_thumbnail(content_hash, preview) if preview else None
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO classifications (content_hash, classification, confidence, created_at,"
+                " model_version, thumbnail_ref, filename, request_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (content_hash, classification, confidence, created_at or time.time(),
+                 model_version, thumbnail_ref, filename, request_id)
+            )
+            return cursor.lastrowid
+
+    def find_by_hash(self, content_hash, model_version=None):
+        """Most recent row for an upload's content hash, optionally for one model version, or None"""
+        sql = f"SELECT {', '.join(COLUMNS)} FROM classifications WHERE content_hash = ?"
+        params = [content_hash]
+        if model_version is not None:
+            sql += " AND model_version = ?"
+            params.append(model_version)
+        sql += " ORDER BY created_at DESC LIMIT 1"
+        with self._lock:
+            row = self._connection.execute(sql, params).fetchone()
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def page(self, filters=None, limit=50, before=None):
+        """Up to ``limit`` rows matching ``filters``, newest first
+
+        ``before`` is the (created_at, id) cursor of the last row of the
+        previous page; the next page starts right after it.
+        """
+        where, params = build_filter(filters)
+        if before is not None:
+            where += (" AND " if where else " WHERE ") + "(created_at, id) < (?, ?)"
+            params.extend(before)
+        sql = (
+            f"SELECT {', '.join(COLUMNS)} FROM classifications{where}"
+            " ORDER BY created_at DESC, id DESC LIMIT ?"
+        )
+        with self._lock:
+            rows = self._connection.execute(sql, [*params, limit]).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def count(self, filters=None):
+        """Number of rows matching ``filters``"""
+        where, params = build_filter(filters)
+        with self._lock:
+            return self._connection.execute(f"SELECT COUNT(*) FROM classifications{where}", params).fetchone()[0]
+
+    def thumbnail(self, ref):
+        """Thumbnail JPEG bytes of a row, or None"""
+        if not ref:
+            return None
+        try:
+            return self._thumbnail_path(ref).read_bytes()
+        except OSError:
+            return None
+
+    def close(self):
+        with self._lock:
+            self._connection.execute("PRAGMA optimize")
+            self._connection.close()
+
+def record_result(history, result, preview=None, model_version=None):
+    """Add a finished classification result to the history; a failing write is logged, not raised"""
+    if history is None or not result.get('content_hash'):
+        return
+    try:
+        history.add(
+            result['content_hash'], result['classification'], result['confidence'],
+            model_version or get_setting("MODEL_VERSION", "default"), preview=preview,
+            filename=result.get('filename'), request_id=result.get('request_id')
+        )
+    except (sqlite3.Error, OSError) as e:
+        logger.warning("Could not record classification %s in the history: %s", result.get('request_id'), e)
+
+@st.cache_resource
+def get_history_store():
+    """History store shared by every session of this server process, or None when disabled"""
+    directory = get_setting("HISTORY_DIR", ".history")
+    if not directory or directory == 'off':
+        return None
+    return HistoryStore(directory, thumbnail_side=get_setting("HISTORY_THUMBNAIL_SIDE", THUMBNAIL_SIDE))
@@ -0,0 +1,246 @@
+import math
+import os
+import threading
+from io import BytesIO
+from utils.settings import get_setting
+
+# Pixels decoded per band when a windowed image is downsampled band by band
+WINDOW_PIXELS = 4 * 1024 * 1024
+
+# 16/32-bit and float modes are downsampled as float so bands share one scale
+FLOAT_MODES = ('I', 'I;16', 'I;16B', 'I;16L', 'F')
+
+# Held while PIL's process-wide decompression bomb limit is lifted for one header read
+_OPEN_LOCK = threading.Lock()
+
+class ImageTooLargeError(Exception):
+    """The image, or the part of it to decode, is over a configured pixel limit"""
+
+    def __init__(self, pixels, limit, action="decoded at once"):
+        super().__init__(f"Image has {pixels:,} pixels, more than the {limit:,} that can be {action}")
+        self.pixels = pixels
+        self.limit = limit
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+class PeakRssMonitor:
+    """Sample the process RSS while a block runs and keep its peak
+
+    RSS is process-wide: uploads ingested at the same time show up in each
+    other's figures, so treat ``growth`` as an upper bound.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start = None
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss() or 0)
+
+    def __enter__(self):
+        self.start = current_rss()
+        if self.start is not None:
+            self.peak = self.start
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self.peak, current_rss() or 0)
+        return False
+
+    @property
+    def growth(self):
+        """Peak RSS above the RSS at entry, in bytes"""
+        return None if self.start is None else self.peak - self.start
+
+class ImageReader:
+    """Decode only the parts of an encoded image that are needed
+
+    Opening reads the header only. ``read_reduced`` decodes at reduced
+    resolution where the format allows it: JPEG DCT scaling (draft mode), a
+    smaller page of a pyramidal TIFF, or band-by-band downsampling of an
+    uncompressed TIFF. ``read_region`` decodes just the strips or tiles of an
+    uncompressed TIFF that cover a window. Everything else is decoded in full
+    once, up to ``max_decode_pixels``.
+    """
+
+    def __init__(self, data, max_decode_pixels=None, max_image_pixels=None):
+        self.data = data
+        self.max_decode_pixels = max_decode_pixels or get_setting("INGEST_MAX_DECODE_PIXELS", 178956970)
+        self.max_image_pixels = max_image_pixels or get_setting("INGEST_MAX_IMAGE_PIXELS", 1_000_000_000)
+
+        image = self._open()
+        pixels = image.width * image.height
+        if pixels > self.max_image_pixels:
+            raise ImageTooLargeError(pixels, self.max_image_pixels, action="opened")
+        self.size = image.size
+        self.mode = image.mode
+        self.format = image.format
+        self.frames = getattr(image, 'n_frames', 1)
+        # Compressed TIFFs go through libtiff, which decodes the whole image in one call
+        self.windowed = image.format == 'TIFF' and all(tile.codec_name != 'libtiff' for tile in image.tile)
+
+        self.strategy = None
+        self.decoded_pixels = 0
+        self._decoded = None
+
+    def _open(self):
+        # PIL is only needed once an image is read, not by pages importing this module
+        from PIL import Image
+
+        # PIL's decompression bomb check only sees the header size and would refuse
+        # scenes that are read in windows. ImageReader enforces its own limits on the
+        # header and on what it decodes, so PIL's is lifted for this header read only.
+        with _OPEN_LOCK:
+            max_image_pixels = Image.MAX_IMAGE_PIXELS
+            Image.MAX_IMAGE_PIXELS = None
+            try:
+                return Image.open(BytesIO(self.data))
+            finally:
+                Image.MAX_IMAGE_PIXELS = max_image_pixels
+
+    def _check(self, size):
+        pixels = size[0] * size[1]
+        if pixels > self.max_decode_pixels:
+            raise ImageTooLargeError(pixels, self.max_decode_pixels)
+
+    def _load(self, image, strategy):
+        self._check(image.size)
+        image.load()
+        self.strategy = strategy
+        self.decoded_pixels += image.width * image.height
+        return image
+
+    def decode(self):
+        """The full-resolution image, decoded once"""
+        if self._decoded is None:
+            self._decoded = self._load(self._open(), 'full')
+        return self._decoded
+
+    def read_region(self, box):
+        """Full-resolution pixels of ``box`` (left, top, right, bottom)"""
+        if not self.windowed or self._decoded is not None:
+            return self.decode().crop(box)
+
+        left, top, right, bottom = box
+        self._check((right - left, bottom - top))
+        image = self._open()
+        tiles = [
+            _trim_raw(tile, top, bottom, image.mode) for tile in image.tile
+            if tile.extents[0] < right and tile.extents[2] > left
+            and tile.extents[1] < bottom and tile.extents[3] > top
+        ]
+        x0 = min(tile.extents[0] for tile in tiles)
+        y0 = min(tile.extents[1] for tile in tiles)
+        x1 = max(tile.extents[2] for tile in tiles)
+        y1 = max(tile.extents[3] for tile in tiles)
+
+        # Decode a smaller image made of just the strips/tiles that cover the box
+        image.tile = [
+            tile._replace(extents=(tile.extents[0] - x0, tile.extents[1] - y0,
+                                   tile.extents[2] - x0, tile.extents[3] - y0))
+            for tile in tiles
+        ]
+        # The TIFF plugin allocates, and bomb-checks, its tile size rather than the image size.
+        # These are private Pillow fields, hence the version range in requirements.txt
+        image._size = image._tile_size = (x1 - x0, y1 - y0)
+        self._load(image, 'windowed')
+        return image.crop((left - x0, top - y0, right - x0, bottom - y0))
+
+    def read_reduced(self, scale):
+        """The image downsampled by about ``scale`` (0-1], decoding as little as possible
+
+        The result is at least ``scale`` times the full size on both axes;
+        callers resize the rest of the way.
+        """
+        if scale >= 1:
+            return self.decode()
+
+        width, height = self.size
+        target = (max(math.ceil(width * scale), 1), max(math.ceil(height * scale), 1))
+
+        if self.format == 'JPEG':
+            image = self._open()
+            image.draft(image.mode if image.mode in ('L', 'RGB') else None, target)
+            return self._load(image, f"jpeg 1/{round(width / image.width)}")
+
+        level = self._pyramid_level(target)
+        if level is not None:
+            image = self._open()
+            image.seek(level)
+            return self._load(image, f"tiff level {level}")
+
+        if self.windowed:
+            return self._read_bands(target)
+
+        return self.decode()
+
+    def _pyramid_level(self, target):
+        """Smallest page of a multi-page TIFF with the scene's aspect that still covers ``target``"""
+        if self.format != 'TIFF' or self.frames < 2:
+            return None
+
+        image = self._open()
+        aspect = self.size[0] / self.size[1]
+        best, best_pixels = None, self.size[0] * self.size[1]
+        for frame in range(1, self.frames):
+            image.seek(frame)
+            frame_width, frame_height = image.size
+            if frame_width < target[0] or frame_height < target[1]:
+                continue
+            if abs(frame_width / frame_height - aspect) > 0.01 * aspect:
+                continue
+            if frame_width * frame_height < best_pixels:
+                best, best_pixels = frame, frame_width * frame_height
+        return best
+
+    def _read_bands(self, target):
+        """Downsample a windowed image band by band with an area filter"""
+        from PIL import Image
+
+        width, height = self.size
+        scale_y = target[1] / height
+        mode = 'F' if self.mode in FLOAT_MODES else self.mode
+        reduced = Image.new(mode, target)
+        band_rows = max(WINDOW_PIXELS // width, 1)
+
+        for top in range(0, height, band_rows):
+            bottom = min(top + band_rows, height)
+            out_top, out_bottom = round(top * scale_y), round(bottom * scale_y)
+            if out_bottom <= out_top:
+                continue
+            band = self.read_region((0, top, width, bottom))
+            if band.mode != mode:
+                band = band.convert(mode)
+            reduced.paste(band.resize((target[0], out_bottom - out_top), Image.Resampling.BOX), (0, out_top))
+
+        self.strategy = 'windowed bands'
+        return reduced
+
+def _trim_raw(tile, top, bottom, mode):
+    """Cut an uncompressed strip down to the rows inside [top, bottom)"""
+    from PIL import Image
+
+    x0, y0, x1, y1 = tile.extents
+    args = tuple(tile.args) if isinstance(tile.args, tuple) else (tile.args,)
+    rawmode, stride, ystep = (args + (0, 1))[:3]
+    if tile.codec_name != 'raw' or rawmode != mode or ystep != 1:
+        return tile
+
+    stride = stride or len(Image.new(mode, (x1 - x0, 1)).tobytes())
+    new_top, new_bottom = max(y0, top), min(y1, bottom)
+    return tile._replace(extents=(x0, new_top, x1, new_bottom), offset=tile.offset + (new_top - y0) * stride)
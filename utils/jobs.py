@@ -0,0 +1,150 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+from utils.settings import get_setting
+
+class JobCancelled(Exception):
+    """Raised inside a job's work once the job has been cancelled"""
+
+class Job:
+    """Handle for work running on the shared background executor
+
+    The handle lives in ``st.session_state``; the page polls it from a fragment,
+    which also marks the job as still watched. Work functions receive the job
+    as their first argument and report progress through ``report``.
+    """
+
+    def __init__(self, session_id):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.created_at = time.time()
+        self.last_polled_at = self.created_at
+        self.phase = 'queued'
+        self.progress = 0.0
+        self.queue_position = None
+        self.queue_eta = None
+        self.partial_results = []
+        self.future = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        """Raise JobCancelled if the job was cancelled"""
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def report(self, phase, fraction):
+        """Progress callback for the running work; aborts it once cancelled"""
+        self.check_cancelled()
+        self.phase = phase
+        self.progress = fraction
+
+    def report_queue(self, position, estimated_wait):
+        """Admission callback while the work waits for a backend slot"""
+        self.check_cancelled()
+        self.phase = 'admission'
+        self.queue_position = position
+        self.queue_eta = estimated_wait
+
+    def cancel(self):
+        """Stop the job: drop it if still queued, abort it at its next progress report otherwise"""
+        self._cancel_event.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def touch(self):
+        """Mark the job as still watched by its session"""
+        self.last_polled_at = time.time()
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def result(self):
+        """Return value of the work, re-raising its exception"""
+        return self.future.result()
+
+def session_is_active(session_id):
+    """Whether the browser session is still connected; None without a Streamlit server to ask"""
+    from streamlit.runtime import Runtime
+
+    if session_id is None or not Runtime.exists():
+        return None
+    return Runtime.instance().is_active_session(session_id)
+
+class JobRunner:
+    """Shared executor running classification work off the Streamlit script threads
+
+    A reaper thread cancels running jobs of sessions that went away (the tab
+    was closed) once they have not been polled for ``orphan_timeout``
+    seconds, and forgets finished ones. Running jobs of connected sessions
+    are kept alive even when no view is polling them.
+    """
+
+    def __init__(self, max_workers=8, orphan_timeout=30.0):
+        self.orphan_timeout = orphan_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='classify-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._orphans_cancelled = 0
+
+        reaper = threading.Thread(target=self._reap_forever, name='classify-job-reaper', daemon=True)
+        reaper.start()
+
+    def submit(self, session_id, fn, *args, **kwargs):
+        """Run ``fn(job, *args, **kwargs)`` in the background and return the job handle"""
+        job = Job(session_id)
+        with self._lock:
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    @staticmethod
+    def _run(job, fn, args, kwargs):
+        job.check_cancelled()
+        job.phase = 'running'
+        return fn(job, *args, **kwargs)
+
+    def reap_orphans(self):
+        """Cancel unwatched running jobs and drop unwatched finished ones"""
+        now = time.time()
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if not job.done() and session_is_active(job.session_id):
+                    job.touch()
+                    continue
+                if now - job.last_polled_at <= self.orphan_timeout:
+                    continue
+                if not job.done():
+                    job.cancel()
+                    self._orphans_cancelled += 1
+                del self._jobs[job_id]
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(max(self.orphan_timeout / 3, 1.0))
+            self.reap_orphans()
+
+    def stats(self):
+        """Job counts by state"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        running = sum(1 for job in jobs if job.phase != 'queued' and not job.done())
+        queued = sum(1 for job in jobs if job.phase == 'queued' and not job.done())
+        return {
+            'running': running,
+            'queued': queued,
+            'orphans_cancelled': self._orphans_cancelled
+        }
+
+@st.cache_resource
+def get_job_runner():
+    """Background job runner shared by every session of this server process"""
+    return JobRunner(
+        max_workers=get_setting("JOB_WORKERS", 8),
+        orphan_timeout=get_setting("JOB_ORPHAN_TIMEOUT_SECONDS", 30.0)
+    )
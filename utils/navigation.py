@@ -38,4 +38,14 @@ def render_sidebar_navigation():
                      type="primary" if current_page == "about" else "secondary"):
             st.switch_page("pages/about.py")
 
+        if st.button("📈 Performance", use_container_width=True,
+                     key="nav_performance_btn",
+                     type="primary" if current_page == "performance" else "secondary"):
+            st.switch_page("pages/performance.py")
+
+        if st.button("🕘 History", use_container_width=True,
+                     key="nav_history_btn",
+                     type="primary" if current_page == "history" else "secondary"):
+            st.switch_page("pages/history.py")
+
         st.markdown("---")
@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+from functools import lru_cache
+from importlib.util import find_spec
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+# Upload encodings of the 8-bit model input, by codec name: (MIME type, file extension)
+UPLOAD_CODECS = {
+    'png': ('image/png', '.png'),
+    'png-fast': ('image/png', '.png'),
+    'webp': ('image/webp', '.webp'),
+    'npy': ('application/x-npy', '.npy')
+}
+# Codecs every backend takes; the others once the backend lists their MIME type in Accept-Post
+BASELINE_CODECS = ('png', 'png-fast')
+DEFAULT_CODEC = 'png-fast'
+
+def encode_upload(image, codec):
+    """Encode a PIL image for the backend with one of UPLOAD_CODECS"""
+    buffer = BytesIO()
+    if codec == 'png':
+        image.save(buffer, format='PNG')
+    elif codec == 'png-fast':
+        image.save(buffer, format='PNG', compress_level=1)
+    elif codec == 'webp':
+        image.save(buffer, format='WEBP', lossless=True, quality=50, method=4)
+    elif codec == 'npy':
+        import numpy as np
+
+        np.save(buffer, np.asarray(image), allow_pickle=False)
+    else:
+        raise ValueError(f"Unknown upload codec: {codec}")
+    return buffer.getvalue()
+
+@lru_cache
+def default_accept_encoding(client='requests'):
+    """Accept-Encoding for backend responses: zstd when the client can decode it, and gzip
+
+    urllib3, under the requests client, decodes zstd only through the
+    modules it checks for itself, which it reflects in its own
+    ACCEPT_ENCODING; httpx decodes it with the zstandard package.
+    """
+    if client == 'httpx':
+        zstd = find_spec('zstandard') is not None
+    else:
+        from urllib3.util.request import ACCEPT_ENCODING
+
+        zstd = 'zstd' in ACCEPT_ENCODING.split(',')
+    return "zstd, gzip" if zstd else "gzip"
+
+def parse_accept_post(header):
+    """Upload codecs whose MIME type is listed in an Accept-Post header"""
+    media_types = {part.split(';')[0].strip().lower() for part in (header or '').split(',')}
+    return [codec for codec, (mime_type, _) in UPLOAD_CODECS.items() if mime_type in media_types]
+
+class FormatNegotiator:
+    """Pick the upload codec that minimizes encode plus transfer time on the measured link
+
+    Per codec it keeps moving averages of encode time and size per pixel. The
+    link's upload throughput is averaged over requests: bytes sent over the
+    upload phase plus the part of the wait the backend did not spend
+    processing, when it reports that. Every ``calibrate_every`` uploads, and
+    whenever the backend advertises a new format, all accepted codecs are
+    encoded once to refresh their figures. A fixed ``codec`` skips all this,
+    but is still only sent once the backend accepts it.
+    """
+
+    def __init__(self, codec='auto', calibrate_every=50, smoothing=0.2):
+        if codec != 'auto' and codec not in UPLOAD_CODECS:
+            raise ValueError(f"Unknown upload codec: {codec}")
+        self.codec = codec
+        self.calibrate_every = calibrate_every
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._accepted = set(BASELINE_CODECS)
+        self._figures = {}  # codec -> {'seconds_per_pixel', 'bytes_per_pixel'}
+        self._throughput = None  # Upload bytes per second
+        self._uploads = 0
+        self._chosen = {}
+        self._fallback_logged = False
+
+    def _average(self, old, new):
+        return new if old is None else old + self.smoothing * (new - old)
+
+    def accepted(self):
+        """Codecs the backend takes, in UPLOAD_CODECS order"""
+        with self._lock:
+            return [codec for codec in UPLOAD_CODECS if codec in self._accepted]
+
+    def estimate(self, codec, pixels):
+        """Estimated encode plus upload seconds for ``pixels``, or None before both are measured"""
+        with self._lock:
+            figures = self._figures.get(codec)
+            if figures is None or not self._throughput:
+                return None
+            return pixels * (figures['seconds_per_pixel'] + figures['bytes_per_pixel'] / self._throughput)
+
+    def choose(self, pixels):
+        """Codec expected to get ``pixels`` to the backend soonest"""
+        if self.codec != 'auto':
+            if self.codec in self.accepted():
+                return self.codec
+            if not self._fallback_logged:
+                self._fallback_logged = True
+                logger.warning(
+                    "Upload format %s is not listed in the backend's Accept-Post, sending %s instead",
+                    self.codec, DEFAULT_CODEC
+                )
+            return DEFAULT_CODEC
+        estimates = {codec: self.estimate(codec, pixels) for codec in self.accepted()}
+        if None in estimates.values():
+            return DEFAULT_CODEC
+        return min(estimates, key=estimates.get)
+
+    def encode(self, image):
+        """Encode the model input with the chosen codec; returns (bytes, codec)"""
+        pixels = image.width * image.height
+        with self._lock:
+            self._uploads += 1
+            calibrate = self.codec == 'auto' and (
+                self._uploads % self.calibrate_every == 1
+                or any(codec not in self._figures for codec in self._accepted)
+            )
+
+        encoded = {}
+        for codec in self.accepted() if calibrate else [self.choose(pixels)]:
+            started_at = time.perf_counter()
+            encoded[codec] = encode_upload(image, codec)
+            self.observe_encode(codec, pixels, time.perf_counter() - started_at, len(encoded[codec]))
+
+        codec = self.choose(pixels) if calibrate else next(iter(encoded))
+        with self._lock:
+            self._chosen[codec] = self._chosen.get(codec, 0) + 1
+        return encoded[codec], codec
+
+    def observe_encode(self, codec, pixels, seconds, num_bytes):
+        with self._lock:
+            figures = self._figures.setdefault(codec, {'seconds_per_pixel': None, 'bytes_per_pixel': None})
+            figures['seconds_per_pixel'] = self._average(figures['seconds_per_pixel'], seconds / pixels)
+            figures['bytes_per_pixel'] = self._average(figures['bytes_per_pixel'], num_bytes / pixels)
+
+    def observe_response(self, accept_post, upload_bytes, timings):
+        """Learn the accepted formats and the link throughput from a finished request"""
+        link_seconds = timings.get('upload', 0.0)
+        if 'server' in timings:
+            link_seconds += max(timings.get('wait', 0.0) - timings['server'], 0.0)
+
+        with self._lock:
+            self._accepted.update(parse_accept_post(accept_post))
+            if link_seconds > 0:
+                self._throughput = self._average(self._throughput, upload_bytes / link_seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'codec': self.codec,
+                'accepted': [codec for codec in UPLOAD_CODECS if codec in self._accepted],
+                'throughput': self._throughput,
+                'chosen': dict(self._chosen)
+            }
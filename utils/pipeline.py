@@ -0,0 +1,220 @@
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.backend_client import response_wire_bytes
+from utils.compact import decode_response
+from utils.ingest import ImageReader, PeakRssMonitor
+from utils.jobs import JobCancelled
+from utils.preprocessing import preprocess_image, encode_preview, get_model_input_size
+from utils.previews import content_hash, PREVIEW_MAX_SIDE
+from utils.resilience import call_with_retries, DeadlineExceededError
+from utils.result_cache import make_cache_key
+
+class BackendError(Exception):
+    """The backend answered with a non-200 status"""
+
+    def __init__(self, status_code, text):
+        super().__init__(f"{status_code} - {text}")
+        self.status_code = status_code
+        self.text = text
+
+def classify_upload(client, cache, backend_version, upload, on_progress=None,
+                    admission=None, session_id=None, on_wait=None, request_id=None):
+    """Classify a preprocessed upload, answering from the result cache when possible
+
+    Backend calls are retried under the client's retry policy and circuit
+    breaker, and go through the admission controller when one is given.
+    Every attempt carries ``request_id`` so backend logs can be joined with ours.
+    With the client's request coalescer, concurrent calls for the same upload
+    share one backend call. Safe to call from worker threads: it only touches the shared client,
+    cache and controller, never Streamlit elements or session state.
+    """
+    cache_key = make_cache_key(upload['content_key'], backend_version)
+    backend_data = cache.get(cache_key)
+    if backend_data is not None:
+        return {'response': backend_data, 'cache_hit': True, 'timings': {}, 'attempts': 0, 'request_id': request_id}
+
+    def fetch():
+        """Call the backend for the upload and cache what it answers"""
+        timings = {}
+        attempts = {'count': 0}
+        deadline = client.retry_policy.deadline
+        budget_started_at = time.perf_counter()
+
+        def on_queue_wait(position, estimated_wait):
+            if time.perf_counter() - budget_started_at > deadline:
+                raise DeadlineExceededError(deadline)
+            if on_wait:
+                on_wait(position, estimated_wait)
+
+        def attempt(remaining):
+            """One predict call, admitted and timed out within the remaining budget"""
+            attempts['count'] += 1
+            queued_at = time.perf_counter()
+            slot = admission.admit(session_id, on_wait=on_queue_wait) if admission else nullcontext()
+            with slot:
+                queue_time = time.perf_counter() - queued_at
+                if admission:
+                    timings['queue'] = timings.get('queue', 0.0) + queue_time
+                if remaining - queue_time <= 0:
+                    raise DeadlineExceededError(deadline)
+                response, attempt_timings = client.predict(
+                    upload['filename'], upload['data'], upload['mime_type'],
+                    on_progress=on_progress, timeout=client.timeout_within(remaining - queue_time),
+                    request_id=request_id
+                )
+            timings.update(attempt_timings)
+            return response
+
+        def on_retry(attempt_number, delay):
+            if on_progress:
+                on_progress('retry', 0.0)
+
+        response = call_with_retries(attempt, client.retry_policy, client.breaker, on_retry)
+        if client.negotiator:
+            client.negotiator.observe_response(response.headers.get('Accept-Post'), len(upload['data']), timings)
+        if response.status_code != 200:
+            raise BackendError(response.status_code, response.text)
+
+        started_at = time.perf_counter()
+        backend_data = decode_response(response)
+        timings['json'] = time.perf_counter() - started_at
+
+        cache.put(cache_key, backend_data)
+        return {
+            'response': backend_data,
+            'cache_hit': False,
+            'timings': timings,
+            'attempts': attempts['count'],
+            'request_id': request_id,
+            'transfer': {
+                'upload_codec': upload['codec'],
+                'upload_bytes': len(upload['data']),
+                'response_format': 'compact' if 'heatmap_array' in backend_data else 'json',
+                'content_encoding': response.headers.get('Content-Encoding', 'identity'),
+                'response_bytes': response_wire_bytes(response),
+                'decoded_bytes': len(response.content)
+            }
+        }
+
+    if client.coalescer is None:
+        return fetch()
+
+    def on_shared_wait():
+        if on_progress:
+            on_progress('coalesced', 0.0)
+
+    # The same upload already on its way to the backend is waited for, not sent again
+    waited_at = time.perf_counter()
+    outcome, shared = client.coalescer.run(cache_key, fetch, on_wait=on_shared_wait)
+    if not shared:
+        return outcome
+    return {
+        'response': outcome['response'],
+        'cache_hit': False,
+        'coalesced': True,
+        'timings': {'coalesced': time.perf_counter() - waited_at},
+        'attempts': 0,
+        'request_id': request_id
+    }
+
+def classify_file(client, cache, backend_version, data, filename, optimize=True,
+                  on_progress=None, admission=None, session_id=None, on_wait=None,
+                  preview_cache=None, thumbnail_size=PREVIEW_MAX_SIDE, request_id=None):
+    """Open, preprocess and classify one uploaded file's bytes
+
+    With ``optimize`` the image is only decoded at the resolution the model
+    input and the preview need. A preview already in ``preview_cache`` is
+    reused rather than encoded again.
+    """
+    if on_progress:
+        on_progress('preprocess', 0.0)
+
+    started_at = time.perf_counter()
+    preview_key = content_hash(data)
+    preview = preview_cache.get(preview_key) if preview_cache else None
+
+    with PeakRssMonitor() as memory:
+        reader = ImageReader(data)
+        if optimize:
+            width, height = reader.size
+            target_width, target_height = get_model_input_size()
+            scale = max(target_width / width, target_height / height)
+            if preview is None:
+                scale = max(scale, thumbnail_size / max(width, height))
+            image = reader.read_reduced(scale)
+        else:
+            image = reader.decode()
+        upload = preprocess_image(image, filename, len(data), enabled=optimize, negotiator=client.negotiator)
+        if preview is None:
+            preview = encode_preview(image, thumbnail_size)
+            if preview_cache:
+                preview_cache.put(preview_key, preview)
+    preprocess_time = time.perf_counter() - started_at
+
+    outcome = classify_upload(
+        client, cache, backend_version, upload, on_progress=on_progress,
+        admission=admission, session_id=session_id, on_wait=on_wait, request_id=request_id
+    )
+    outcome['timings'] = {'preprocess': preprocess_time, **outcome['timings']}
+
+    outcome['preview'] = preview
+    outcome['content_hash'] = preview_key
+    outcome['filename'] = filename
+    outcome['ingest'] = {
+        'size': reader.size,
+        'strategy': reader.strategy,
+        'decoded_pixels': reader.decoded_pixels,
+        'peak_rss_growth': memory.growth
+    }
+    outcome['upload'] = {key: value for key, value in upload.items() if key not in ('data', 'content_key')}
+    return outcome
+
+def run_classification(job, client, cache, backend_version, data, filename, optimize=True,
+                       admission=None, preview_cache=None):
+    """Background job classifying a single image; the job ID is the request ID"""
+    return classify_file(
+        client, cache, backend_version, data, filename, optimize, on_progress=job.report,
+        admission=admission, session_id=job.session_id, on_wait=job.report_queue,
+        preview_cache=preview_cache, request_id=job.id
+    )
+
+def run_batch(job, client, cache, backend_version, files, optimize=True, concurrency=4,
+              admission=None, preview_cache=None):
+    """Background job classifying (filename, bytes) pairs through a bounded thread pool
+
+    Each finished file is appended to ``job.partial_results`` as
+    (filename, request_id, outcome, error) so the page can show results as
+    they arrive. Request IDs are the job ID suffixed with the file's index.
+    """
+    def on_progress(phase, fraction):
+        job.check_cancelled()
+
+    def on_wait(position, estimated_wait):
+        job.check_cancelled()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(
+                classify_file, client, cache, backend_version, data, filename, optimize,
+                on_progress, admission, job.session_id, on_wait, preview_cache,
+                request_id=f"{job.id}-{index}"
+            ): (filename, f"{job.id}-{index}")
+            for index, (filename, data) in enumerate(files)
+        }
+        try:
+            for done, future in enumerate(as_completed(futures), start=1):
+                try:
+                    outcome, error = future.result(), None
+                except JobCancelled:
+                    raise
+                except Exception as e:
+                    outcome, error = None, e
+                job.partial_results.append((*futures[future], outcome, error))
+                job.report('batch', done / len(futures))
+        except JobCancelled:
+            for future in futures:
+                future.cancel()
+            raise
+
+    return len(futures)
@@ -0,0 +1,107 @@
+import hashlib
+from io import BytesIO
+from pathlib import Path
+from utils.negotiation import DEFAULT_CODEC, UPLOAD_CODECS, encode_upload
+from utils.settings import get_setting
+
+# numpy and PIL are imported inside the functions that use them, so pages
+# needing only the light helpers here don't pay for them on a cold start
+
+# 16/32-bit and float modes that PIL would clip, not rescale, when converting to "L"
+WIDE_MODES = ('I', 'I;16', 'I;16B', 'I;16L', 'F')
+
+def get_model_input_size():
+    """Model input size (width, height) expected by the backend"""
+    return (
+        get_setting("MODEL_INPUT_WIDTH", 227),
+        get_setting("MODEL_INPUT_HEIGHT", 277)
+    )
+
+def to_grayscale(image):
+    """Convert any PIL image to 8-bit grayscale, rescaling wide bit depths"""
+    if image.mode == 'L':
+        return image
+
+    if image.mode in WIDE_MODES:
+        import numpy as np
+        from PIL import Image
+
+        pixels = np.asarray(image, dtype=np.float32)
+        low, high = float(pixels.min()), float(pixels.max())
+        scale = 255.0 / (high - low) if high > low else 0.0
+        return Image.fromarray(((pixels - low) * scale).astype(np.uint8), mode='L')
+
+    return image.convert('L')
+
+def encode_preview(image, max_side=512):
+    """Display thumbnail of an image as (bytes, format)"""
+    from PIL import Image
+
+    preview = to_grayscale(image) if image.mode in WIDE_MODES else image
+    if preview.mode not in ('L', 'RGB', 'RGBA', 'LA', 'P'):
+        preview = preview.convert('RGB')
+
+    scale = max_side / max(preview.size)
+    if scale < 1:
+        size = (max(round(preview.width * scale), 1), max(round(preview.height * scale), 1))
+        preview = preview.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+    buffer = BytesIO()
+    if preview.mode in ('L', 'RGB'):
+        preview.save(buffer, format='JPEG', quality=85)
+        return buffer.getvalue(), 'JPEG'
+    preview.save(buffer, format='PNG', compress_level=1)
+    return buffer.getvalue(), 'PNG'
+
+def format_bytes(num_bytes):
+    """Human readable byte count"""
+    for unit in ('B', 'KB', 'MB'):
+        if num_bytes < 1024:
+            return f"{num_bytes:.0f} {unit}" if unit == 'B' else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} GB"
+
+def preprocess_image(image, filename, source_bytes, enabled=True, negotiator=None):
+    """Prepare an upload for the backend
+
+    When enabled the image is downsampled to the model input size, converted to
+    8-bit grayscale and encoded with the codec ``negotiator`` picks for the
+    link, fast-compression PNG without one. When disabled the full-resolution
+    image is re-encoded as PNG, as before. ``content_key`` identifies the
+    pixels whatever the codec, so cached results survive a codec change.
+    """
+    from PIL import Image
+
+    if enabled:
+        target_width, target_height = get_model_input_size()
+        prepared = to_grayscale(image)
+        if prepared.width > target_width or prepared.height > target_height:
+            prepared = prepared.resize(
+                (target_width, target_height),
+                Image.Resampling.BILINEAR,
+                reducing_gap=2.0
+            )
+        if negotiator:
+            data, codec = negotiator.encode(prepared)
+        else:
+            data, codec = encode_upload(prepared, DEFAULT_CODEC), DEFAULT_CODEC
+        content_key = hashlib.sha256(f"{prepared.mode}{prepared.size}".encode() + prepared.tobytes()).digest()
+    else:
+        prepared = image
+        buffer = BytesIO()
+        prepared.save(buffer, format='PNG')
+        data, codec = buffer.getvalue(), 'png'
+        content_key = data
+
+    mime_type, extension = UPLOAD_CODECS[codec]
+    return {
+        'data': data,
+        'content_key': content_key,
+        'codec': codec,
+        'mime_type': mime_type,
+        'filename': Path(filename).stem + extension,
+        'size': prepared.size,
+        'optimized': enabled,
+        'bytes_before': source_bytes,
+        'bytes_after': len(data)
+    }
@@ -0,0 +1,90 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import streamlit as st
+from utils.ingest import ImageReader
+from utils.preprocessing import encode_preview
+from utils.settings import get_setting
+
+# Longest side of the previews sent to the browser
+PREVIEW_MAX_SIDE = 640
+
+def content_hash(data):
+    """Key of an upload's bytes in the preview cache"""
+    return hashlib.sha256(data).hexdigest()
+
+def make_preview(data, max_side=PREVIEW_MAX_SIDE):
+    """Display preview of encoded image bytes as (bytes, format), decoded at reduced resolution"""
+    reader = ImageReader(data)
+    image = reader.read_reduced(max_side / max(reader.size))
+    return encode_preview(image, max_side)
+
+class PreviewCache:
+    """Display-size previews of uploads keyed by content hash, shared by every session
+
+    Entries are evicted least recently used first once their total size
+    exceeds ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # content hash -> (bytes, format)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key):
+        """Cached (bytes, format) preview, or None"""
+        with self._lock:
+            preview = self._entries.get(key)
+            if preview is None:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return preview
+
+    def put(self, key, preview):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = preview
+            self._bytes += len(preview[0])
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._counters['evictions'] += 1
+
+    def get_or_create(self, key, create):
+        """Cached preview for ``key``, built with ``create()`` on a miss"""
+        preview = self.get(key)
+        if preview is None:
+            preview = create()
+            self.put(key, preview)
+        return preview
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                **self._counters,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hit_ratio': self._counters['hits'] / lookups if lookups else 0.0
+            }
+
+@st.cache_resource
+def get_preview_cache():
+    """Preview cache shared by every session of this server process"""
+    return PreviewCache(max_bytes=get_setting("PREVIEW_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+def get_upload_preview(uploaded_file):
+    """Cached preview of a Streamlit upload; its bytes are hashed once per upload"""
+    data = uploaded_file.getvalue()
+    hashed = st.session_state.get('upload_preview_key')
+    if hashed is None or hashed[0] != uploaded_file.file_id:
+        hashed = (uploaded_file.file_id, content_hash(data))
+        st.session_state.upload_preview_key = hashed
+
+    return get_preview_cache().get_or_create(hashed[1], lambda: make_preview(data))
@@ -0,0 +1,144 @@
+import random
+import threading
+import time
+
+BREAKER_STATES = ('closed', 'open', 'half_open')
+
+class CircuitOpenError(Exception):
+    """The circuit breaker is open, the backend call was not attempted"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Backend circuit is open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+class DeadlineExceededError(Exception):
+    """The classification ran out of its overall time budget"""
+
+    def __init__(self, deadline):
+        super().__init__(f"Classification deadline of {deadline:g}s exceeded")
+        self.deadline = deadline
+
+class CircuitBreaker:
+    """Fail fast after repeated backend failures
+
+    closed: calls pass, consecutive failures are counted.
+    open: calls fail immediately with CircuitOpenError for ``reset_timeout`` seconds.
+    half_open: a single probe call is let through; its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = 'closed'
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._trips = 0
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go to the backend now"""
+        with self._lock:
+            if self._state == 'closed':
+                return
+
+            elapsed = time.monotonic() - self._opened_at
+            if self._state == 'open' and elapsed >= self.reset_timeout:
+                self._state = 'half_open'
+
+            if self._state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+
+            raise CircuitOpenError(max(self.reset_timeout - elapsed, 0.0))
+
+    def record_success(self):
+        with self._lock:
+            self._state = 'closed'
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == 'half_open' or self._failures >= self.failure_threshold:
+                if self._state != 'open':
+                    self._trips += 1
+                self._state = 'open'
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def abandon(self):
+        """Forget a probe that ended without reaching the backend"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def snapshot(self):
+        """Current state for the UI and metrics"""
+        with self._lock:
+            retry_after = 0.0
+            if self._state == 'open':
+                retry_after = max(self.reset_timeout - (time.monotonic() - self._opened_at), 0.0)
+            return {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'retry_after': retry_after,
+                'trips': self._trips
+            }
+
+class RetryPolicy:
+    """Exponential backoff with full jitter inside an overall deadline"""
+
+    def __init__(self, max_attempts=3, base_delay=0.25, max_delay=4.0, deadline=90.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def backoff(self, attempt):
+        """Delay before retry number ``attempt`` (1-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+def call_with_retries(call, policy, breaker, on_retry=None):
+    """Run ``call(remaining_seconds)`` under the retry policy and circuit breaker
+
+    Connection errors, timeouts and 5xx responses count as failures and are
+    retried while attempts and deadline budget remain. The last 5xx response
+    is returned to the caller; the last exception is re-raised.
+    """
+    import requests
+
+    deadline_at = time.monotonic() + policy.deadline
+
+    for attempt in range(1, policy.max_attempts + 1):
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceededError(policy.deadline)
+        breaker.before_call()
+
+        try:
+            response = call(remaining)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            breaker.record_failure()
+            failure = e
+            response = None
+        except BaseException:
+            breaker.abandon()
+            raise
+        else:
+            if response.status_code < 500:
+                breaker.record_success()
+                return response
+            breaker.record_failure()
+            failure = None
+
+        delay = policy.backoff(attempt)
+        out_of_budget = time.monotonic() + delay >= deadline_at
+        if attempt == policy.max_attempts or out_of_budget:
+            if failure is not None:
+                raise failure
+            return response
+
+        if on_retry:
+            on_retry(attempt + 1, delay)
+        time.sleep(delay)
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+import streamlit as st
+from utils.settings import get_setting
+
+def make_cache_key(image_bytes, backend_version):
+    """Content address of an encoded image for a given backend/model version"""
+    digest = hashlib.sha256()
+    digest.update(backend_version.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(image_bytes)
+    return digest.hexdigest()
+
+def response_size(response):
+    """Size of a backend response as JSON, which its base64 images dominate"""
+    return len(json.dumps(response))
+
+class ResultCache:
+    """Thread-safe LRU cache of backend responses with a TTL and optional disk persistence
+
+    Entries are kept in an ordered dict from key to (stored_at, response, size)
+    and evicted least recently used first once their total size exceeds
+    ``max_bytes``. When a disk directory is configured every entry is also
+    written as ``<key>.json``; on startup only the index is loaded, sized by
+    the files, and responses are read back lazily.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl_seconds=86400, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._load_index()
+
+    def _path(self, key):
+        return self.disk_dir / f"{key}.json"
+
+    def _load_index(self):
+        """Register entries persisted by a previous process, oldest first"""
+        files = [(path.stat(), path) for path in self.disk_dir.glob('*.json')]
+        for stat, path in sorted(files, key=lambda item: item[0].st_mtime):
+            self._entries[path.stem] = (stat.st_mtime, None, stat.st_size)
+            self._bytes += stat.st_size
+        self._enforce_budget()
+
+    def _enforce_budget(self):
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self._counters['evictions'] += 1
+            self._remove_file(key)
+
+    def _drop(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _remove_file(self, key):
+        if self.disk_dir:
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _read_file(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+    def _write_file(self, key, response):
+        path = self._path(key)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            json.dump(response, handle)
+        os.replace(tmp_path, path)
+
+    def get(self, key):
+        """Cached backend response for a key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+
+            stored_at, response, size = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                self._drop(key)
+                self._remove_file(key)
+                self._counters['expirations'] += 1
+                self._counters['misses'] += 1
+                return None
+
+            if response is None and self.disk_dir:
+                response = self._read_file(key)
+                if response is None:
+                    self._drop(key)
+                    self._counters['misses'] += 1
+                    return None
+                self._entries[key] = (stored_at, response, size)
+
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return response
+
+    def put(self, key, response):
+        """Store a backend response, evicting the least recently used entries"""
+        size = response_size(response)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.time(), response, size)
+            self._bytes += size
+            self._enforce_budget()
+
+            if self.disk_dir:
+                try:
+                    self._write_file(key, response)
+                except OSError:
+                    # Persistence is best effort, the in-memory entry is still valid
+                    pass
+
+    def stats(self):
+        """Hit/miss/eviction counters and current size"""
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                **self._counters,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hit_ratio': self._counters['hits'] / lookups if lookups else 0.0
+            }
+
+@st.cache_resource
+def get_result_cache():
+    """Result cache shared by every session of this server process"""
+    return ResultCache(
+        max_bytes=get_setting("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024),
+        ttl_seconds=get_setting("RESULT_CACHE_TTL_SECONDS", 86400),
+        disk_dir=get_setting("RESULT_CACHE_DIR", None)
+    )
+
+@st.cache_resource
+def get_scene_result_cache():
+    """Result cache of scene tiles, kept apart so one scene cannot evict every single-image result"""
+    disk_dir = get_setting("RESULT_CACHE_DIR", None)
+    return ResultCache(
+        max_bytes=get_setting("SCENE_RESULT_CACHE_MAX_BYTES", 16 * 1024 * 1024),
+        ttl_seconds=get_setting("RESULT_CACHE_TTL_SECONDS", 86400),
+        disk_dir=os.path.join(disk_dir, 'scene') if disk_dir else None
+    )
+
+def get_backend_version(backend_url):
+    """Version tag mixed into cache keys so a model update invalidates old results"""
+    return f"{backend_url}|{get_setting('MODEL_VERSION', 'default')}"
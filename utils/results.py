@@ -0,0 +1,109 @@
+import base64
+import binascii
+import random
+
+# Class mapping from backend
+CLASS_MAPPING = {
+    0: {
+        'classification': 'fresh_crater',
+        'display_name': 'Fresh Crater',
+        'color': 'purple',
+        'icon': '🌟',
+        'title': 'Fresh Crater Detected',
+        'description': 'This crater shows signs of recent impact with visible ejecta material. The sharp edges and bright rays indicate it formed relatively recently in geological terms.',
+        'age_range': (100, 900)  # million years
+    },
+    1: {
+        'classification': 'old_crater',
+        'display_name': 'Old Crater',
+        'color': 'blue',
+        'icon': '⏳',
+        'title': 'Old Crater Detected',
+        'description': 'This crater shows signs of degradation with softened edges and filled interior. The lack of visible ejecta suggests it formed over a billion years ago.',
+        'age_range': (1.0, 3.5)  # billion years
+    },
+    2: {
+        'classification': 'none',
+        'display_name': 'No Crater Detected',
+        'color': 'gray',
+        'icon': '🌑',
+        'title': 'No Crater Detected',
+        'description': 'The analyzed region appears to be lunar surface terrain without a significant crater formation.',
+        'age_range': None
+    }
+}
+
+# Display names by classification, for stored results that keep only the class
+CLASS_LABELS = {info['classification']: info['display_name'] for info in CLASS_MAPPING.values()}
+
+def parse_backend_response(response_data, store):
+    """Parse backend response and map to frontend format
+
+    The base64 images, and the heatmap array of compact responses, are
+    decoded once into the session blob store and left out of the kept raw
+    response.
+    """
+    class_index = response_data['class_index']
+    confidence = response_data['confidence'] * 100  # Convert to percentage
+    heatmap_ref = store_base64_image(store, response_data.get('heatmap_image'))
+    overlay_ref = store_base64_image(store, response_data.get('overlay_image'))
+    heatmap_array = store_heatmap_array(store, response_data.get('heatmap_array'))
+    raw_response = {
+        key: value for key, value in response_data.items()
+        if key not in ('heatmap_image', 'overlay_image', 'heatmap_array')
+    }
+
+    class_info = CLASS_MAPPING[class_index]
+
+    # Calculate estimated age based on class (frontend logic)
+    estimated_age = None
+    if class_info['age_range']:
+        if class_index == 0:  # Fresh crater (million years)
+            estimated_age = f"{random.randint(*class_info['age_range'])} million years"
+        elif class_index == 1:  # Old crater (billion years)
+            estimated_age = f"{random.uniform(*class_info['age_range']):.1f} billion years"
+
+    return {
+        'classification': class_info['classification'],
+        'display_name': class_info['display_name'],
+        'confidence': round(confidence, 1),
+        'estimated_age': estimated_age,
+        'color': class_info['color'],
+        'icon': class_info['icon'],
+        'title': class_info['title'],
+        'description': class_info['description'],
+        'heatmap_ref': heatmap_ref,
+        'overlay_ref': overlay_ref,
+        'heatmap_array': heatmap_array,
+        'raw_response': raw_response
+    }
+
+def store_base64_image(store, encoded):
+    """Decode a base64 image into the blob store and return its key"""
+    if not encoded:
+        return None
+    try:
+        return store.put(base64.b64decode(encoded))
+    except (binascii.Error, ValueError):
+        return None
+
+def store_heatmap_array(store, heatmap):
+    """Decode a compact response's heatmap array into the blob store
+
+    Returns its dtype and shape with the blob key, or None.
+    """
+    if not heatmap:
+        return None
+    try:
+        return {'ref': store.put(base64.b64decode(heatmap['data'])), 'dtype': heatmap['dtype'], 'shape': heatmap['shape']}
+    except (binascii.Error, ValueError, KeyError):
+        return None
+
+def result_refs(result):
+    """Blob store keys of the images a frontend result refers to"""
+    if not result:
+        return set()
+    refs = {result.get(key) for key in ('preview_ref', 'heatmap_ref', 'overlay_ref', 'overlay_display_ref')}
+    if result.get('heatmap_array'):
+        refs.add(result['heatmap_array']['ref'])
+    return refs - {None}
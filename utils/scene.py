@@ -0,0 +1,192 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from io import BytesIO
+from itertools import islice
+from pathlib import Path
+from utils.ingest import ImageReader, PeakRssMonitor
+from utils.jobs import JobCancelled
+from utils.pipeline import classify_upload
+from utils.preprocessing import get_model_input_size, preprocess_image, to_grayscale, WIDE_MODES
+
+# Overlay color (RGB) of each class index; the last row is for tiles without a result
+SCENE_CLASS_COLORS = (
+    (192, 132, 252),  # Fresh crater
+    (96, 165, 250),   # Old crater
+    (156, 163, 175),  # No crater
+    (0, 0, 0)         # Failed tile
+)
+
+# Overlay opacity of each class at full confidence; terrain and failed tiles stay clear
+SCENE_CLASS_ALPHA = (0.55, 0.55, 0.0, 0.0)
+
+def tile_origins(length, tile, stride):
+    """Start offsets of tiles along one axis, the last one flush with the far edge"""
+    if length <= tile:
+        return [0]
+    origins = list(range(0, length - tile + 1, stride))
+    if origins[-1] != length - tile:
+        origins.append(length - tile)
+    return origins
+
+def tile_grid(scene_size, tile_size, overlap=0.0):
+    """Tile layout of a scene: tiles of the model input size, overlapping by ``overlap`` (0-1)"""
+    scene_width, scene_height = scene_size
+    tile_width, tile_height = tile_size
+    stride = (max(round(tile_width * (1 - overlap)), 1), max(round(tile_height * (1 - overlap)), 1))
+    return {
+        'scene_size': scene_size,
+        'tile_size': tile_size,
+        'stride': stride,
+        'xs': tile_origins(scene_width, tile_width, stride[0]),
+        'ys': tile_origins(scene_height, tile_height, stride[1])
+    }
+
+def iter_tiles(reader, grid):
+    """Yield (row, col, tile) in row-major order, reading one band of tile rows at a time"""
+    tile_width, tile_height = grid['tile_size']
+    scene_width = grid['scene_size'][0]
+    for row, y in enumerate(grid['ys']):
+        band = reader.read_region((0, y, max(scene_width, tile_width), y + tile_height))
+        for col, x in enumerate(grid['xs']):
+            yield row, col, band.crop((x, 0, x + tile_width, tile_height))
+
+def scene_preview(reader, max_side=1024):
+    """Downsampled 8-bit copy of the scene for display, decoded at reduced resolution"""
+    from PIL import Image
+
+    image = reader.read_reduced(max_side / max(reader.size))
+    preview = to_grayscale(image) if image.mode in WIDE_MODES or image.mode not in ('L', 'RGB') else image
+
+    scale = max_side / max(preview.size)
+    if scale < 1:
+        size = (max(round(preview.width * scale), 1), max(round(preview.height * scale), 1))
+        preview = preview.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return preview
+
+def _nearest_tile(origins, tile, coords):
+    """Index of the tile whose center is nearest to each coordinate"""
+    import numpy as np
+
+    centers = np.asarray(origins, dtype=np.float32) + tile / 2
+    return np.searchsorted((centers[:-1] + centers[1:]) / 2, coords)
+
+def compose_scene_overlay(preview, grid, class_map, confidence_map):
+    """Blend per-tile class colors onto the scene preview, weighted by tile confidence
+
+    Returns JPEG bytes. Every preview pixel takes the tile whose center is
+    nearest, so overlapping tiles split their shared area.
+    """
+    import numpy as np
+    from PIL import Image
+
+    base = np.asarray(preview.convert('RGB'), dtype=np.float32)
+    height, width = base.shape[:2]
+    scene_width, scene_height = grid['scene_size']
+    tile_width, tile_height = grid['tile_size']
+
+    rows = _nearest_tile(grid['ys'], tile_height, (np.arange(height) + 0.5) * scene_height / height)
+    cols = _nearest_tile(grid['xs'], tile_width, (np.arange(width) + 0.5) * scene_width / width)
+
+    # Failed tiles are -1, which indexes the last row of the lookup tables
+    classes = class_map[rows[:, None], cols[None, :]]
+    colors = np.asarray(SCENE_CLASS_COLORS, dtype=np.float32)
+    alpha = np.asarray(SCENE_CLASS_ALPHA, dtype=np.float32)[classes] * confidence_map[rows[:, None], cols[None, :]]
+    blended = base + (colors[classes] - base) * alpha[..., None]
+
+    buffer = BytesIO()
+    Image.fromarray(blended.astype(np.uint8)).save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+def run_scene(job, client, cache, backend_version, data, filename, overlap=0.0, concurrency=4,
+              admission=None, preview_size=1024):
+    """Background job classifying a large scene as a grid of model-size tiles
+
+    The scene is read one band of tile rows at a time, tiles are cropped
+    lazily and at most ``concurrency`` of them are in flight at any time.
+    Returns the per-tile class and confidence maps with a preview of the
+    scene with the map drawn over it. Failed tiles are left at class -1;
+    the job only fails when every tile does.
+    """
+    import numpy as np
+
+    def on_progress(phase, fraction):
+        job.check_cancelled()
+
+    def on_wait(position, estimated_wait):
+        job.check_cancelled()
+
+    started_at = time.perf_counter()
+    with PeakRssMonitor() as memory:
+        reader = ImageReader(data)
+        grid = tile_grid(reader.size, get_model_input_size(), overlap)
+        shape = (len(grid['ys']), len(grid['xs']))
+        total = shape[0] * shape[1]
+        stem = Path(filename).stem
+
+        class_map = np.full(shape, -1, dtype=np.int8)
+        confidence_map = np.zeros(shape, dtype=np.float32)
+        counters = {'failed': 0, 'cache_hits': 0}
+        last_error = None
+
+        def classify_tile(row, col, tile):
+            upload = preprocess_image(tile, f"{stem}_r{row}_c{col}.png", 0, negotiator=client.negotiator)
+            return classify_upload(
+                client, cache, backend_version, upload, on_progress=on_progress,
+                admission=admission, session_id=job.session_id, on_wait=on_wait,
+                request_id=f"{job.id}-r{row}c{col}"
+            )
+
+        tiles = iter_tiles(reader, grid)
+        pending = {}
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            try:
+                done = 0
+                while True:
+                    for row, col, tile in islice(tiles, concurrency - len(pending)):
+                        pending[executor.submit(classify_tile, row, col, tile)] = (row, col)
+                    if not pending:
+                        break
+
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        row, col = pending.pop(future)
+                        try:
+                            outcome = future.result()
+                        except JobCancelled:
+                            raise
+                        except Exception as e:
+                            counters['failed'] += 1
+                            last_error = e
+                        else:
+                            class_map[row, col] = outcome['response']['class_index']
+                            confidence_map[row, col] = outcome['response']['confidence']
+                            counters['cache_hits'] += outcome['cache_hit']
+                        done += 1
+                    job.report('scene', done / total)
+            except JobCancelled:
+                for future in pending:
+                    future.cancel()
+                raise
+
+        if counters['failed'] == total:
+            raise last_error
+
+        preview = scene_preview(reader, preview_size)
+        overlay = compose_scene_overlay(preview, grid, class_map, confidence_map)
+
+    return {
+        'filename': filename,
+        'grid': grid,
+        'class_map': class_map,
+        'confidence_map': confidence_map,
+        'tiles': total,
+        **counters,
+        'overlay': overlay,
+        'elapsed': time.perf_counter() - started_at,
+        'ingest': {
+            'windowed': reader.windowed,
+            'strategy': reader.strategy,
+            'decoded_pixels': reader.decoded_pixels,
+            'peak_rss_growth': memory.growth
+        }
+    }
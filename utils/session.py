@@ -0,0 +1,6 @@
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+def get_session_id():
+    """Id of the browser session running the current script, or None outside a script run"""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else None
@@ -0,0 +1,145 @@
+import hashlib
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+import streamlit as st
+from utils.session import get_session_id
+from utils.settings import get_setting
+
+class BlobStore:
+    """Per-session, content-addressed store for image bytes with a memory budget
+
+    Identical blobs are stored once. Blobs of at least ``spill_min_bytes`` go
+    to disk when a spill directory is configured. When the in-memory total goes
+    over ``budget_bytes`` the least recently used blobs are spilled, or dropped
+    if spilling is off. ``get`` returns None for a dropped blob.
+    """
+
+    def __init__(self, budget_bytes=32 * 1024 * 1024, spill_dir=None, spill_min_bytes=256 * 1024):
+        self.budget_bytes = budget_bytes
+        self.spill_min_bytes = spill_min_bytes
+        self._blobs = OrderedDict()  # key -> bytes in memory, or Path of a spilled blob
+        self._lock = threading.Lock()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._counters = {'evicted': 0, 'spilled': 0}
+
+        self._spill_dir = None
+        if spill_dir:
+            Path(spill_dir).mkdir(parents=True, exist_ok=True)
+            self._spill_dir = Path(tempfile.mkdtemp(prefix='session-', dir=spill_dir))
+            # Spilled files go away with the session that owns them
+            weakref.finalize(self, shutil.rmtree, self._spill_dir, True)
+
+    def put(self, data):
+        """Store bytes and return their key"""
+        key = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if key in self._blobs:
+                self._blobs.move_to_end(key)
+                return key
+
+            if self._spill_dir and len(data) >= self.spill_min_bytes:
+                self._blobs[key] = self._spill(key, data)
+            else:
+                self._blobs[key] = data
+                self._memory_bytes += len(data)
+                self._enforce_budget()
+        return key
+
+    def get(self, key):
+        """Bytes stored under a key, or None if it was evicted"""
+        with self._lock:
+            blob = self._blobs.get(key)
+            if blob is None:
+                return None
+            self._blobs.move_to_end(key)
+        if isinstance(blob, Path):
+            try:
+                return blob.read_bytes()
+            except OSError:
+                return None
+        return blob
+
+    def _spill(self, key, data):
+        path = self._spill_dir / key
+        path.write_bytes(data)
+        self._disk_bytes += len(data)
+        self._counters['spilled'] += 1
+        return path
+
+    def _enforce_budget(self):
+        """Spill or drop least recently used in-memory blobs until within budget"""
+        for key in list(self._blobs):
+            if self._memory_bytes <= self.budget_bytes:
+                return
+            blob = self._blobs[key]
+            if isinstance(blob, Path):
+                continue
+
+            self._memory_bytes -= len(blob)
+            if self._spill_dir:
+                self._blobs[key] = self._spill(key, blob)
+            else:
+                del self._blobs[key]
+                self._counters['evicted'] += 1
+
+    def discard(self, keys):
+        """Drop the blobs stored under ``keys``; unknown keys are ignored"""
+        with self._lock:
+            for key in keys:
+                blob = self._blobs.pop(key, None)
+                if isinstance(blob, Path):
+                    try:
+                        self._disk_bytes -= blob.stat().st_size
+                        blob.unlink()
+                    except OSError:
+                        pass
+                elif blob is not None:
+                    self._memory_bytes -= len(blob)
+
+    def clear(self):
+        """Drop every blob"""
+        with self._lock:
+            for blob in self._blobs.values():
+                if isinstance(blob, Path):
+                    blob.unlink(missing_ok=True)
+            self._blobs.clear()
+            self._memory_bytes = 0
+            self._disk_bytes = 0
+
+    def usage(self):
+        """Bytes held in memory and on disk by this session"""
+        with self._lock:
+            return {
+                **self._counters,
+                'blobs': len(self._blobs),
+                'memory_bytes': self._memory_bytes,
+                'disk_bytes': self._disk_bytes,
+                'budget_bytes': self.budget_bytes
+            }
+
+@st.cache_resource
+def get_session_registry():
+    """Weak registry of every live session's blob store, for process-wide reporting"""
+    return weakref.WeakValueDictionary()
+
+def get_session_store():
+    """Blob store of the current session, created on first use"""
+    if 'blob_store' not in st.session_state:
+        st.session_state.blob_store = BlobStore(
+            budget_bytes=get_setting("SESSION_MEMORY_BUDGET_BYTES", 32 * 1024 * 1024),
+            spill_dir=get_setting("SESSION_SPILL_DIR", None),
+            spill_min_bytes=get_setting("SESSION_SPILL_MIN_BYTES", 256 * 1024)
+        )
+        session_id = get_session_id()
+        if session_id:
+            get_session_registry()[session_id] = st.session_state.blob_store
+    return st.session_state.blob_store
+
+def session_memory_report():
+    """Blob usage of every live session, keyed by session id"""
+    return {session_id: store.usage() for session_id, store in list(get_session_registry().items())}
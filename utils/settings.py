@@ -0,0 +1,21 @@
+import os
+import streamlit as st
+
+def get_setting(name, default=None):
+    """Read a setting from Streamlit secrets, falling back to environment variables"""
+    try:
+        if name in st.secrets:
+            return st.secrets[name]
+    except FileNotFoundError:
+        pass
+
+    value = os.environ.get(name)
+    if value is None:
+        return default
+
+    # Environment values are strings, cast them to the type of the default
+    if isinstance(default, bool):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    if isinstance(default, (int, float)):
+        return type(default)(value)
+    return value
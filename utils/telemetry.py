@@ -0,0 +1,405 @@
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+import streamlit as st
+from utils.admission import QueueFullError, get_admission_controller
+from utils.jobs import get_job_runner
+from utils.previews import get_preview_cache
+from utils.resilience import BREAKER_STATES, CircuitOpenError, DeadlineExceededError
+from utils.result_cache import get_result_cache
+from utils.session_store import session_memory_report
+from utils.settings import get_setting
+
+# Header carrying the request ID to the backend, so traces can be joined
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Spans timed inside another span, left out of the end-to-end total
+NESTED_SPANS = ('server',)
+
+# Spans that together make up one backend round trip
+BACKEND_SPANS = ('connect', 'upload', 'wait', 'download')
+
+STATUSES = ('ok', 'timeout', 'rejected', 'error')
+
+# Seconds of per-second classification counts kept for request rates
+RATE_WINDOW_SECONDS = 300
+
+METRIC_HELP = {
+    'classifications_total': ('counter', "Finished classifications by kind and status"),
+    'classification_seconds': ('histogram', "End-to-end classification time"),
+    'classification_stage_seconds': ('histogram', "Time spent in each classification stage"),
+    'backend_attempts_total': ('counter', "Backend calls made, retries included"),
+    'backend_seconds': ('histogram', "Backend round trip time (connect, upload, wait, download) of the last attempt"),
+    'backend_upload_bytes_total': ('counter', "Upload bytes sent to the backend by codec"),
+    'backend_response_bytes_total': ('counter', "Response bytes received from the backend by format and content encoding")
+}
+
+def new_request_id():
+    """Fresh request ID for one classification"""
+    return uuid.uuid4().hex
+
+def classification_status(error):
+    """Status label of a finished classification: ok, timeout, rejected or error"""
+    if error is None:
+        return 'ok'
+
+    import requests
+
+    if isinstance(error, (requests.exceptions.Timeout, DeadlineExceededError)):
+        return 'timeout'
+    if isinstance(error, (QueueFullError, CircuitOpenError)):
+        return 'rejected'
+    return 'error'
+
+class Histogram:
+    """Fixed-bucket histogram: memory stays the same however many values are observed"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def copy(self):
+        histogram = Histogram(self.buckets)
+        histogram.counts = list(self.counts)
+        histogram.sum = self.sum
+        histogram.count = self.count
+        return histogram
+
+    def quantile(self, q):
+        """Estimate of the ``q`` quantile, interpolated linearly inside its bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+class RateWindow:
+    """Per-second event counts by status over the last ``seconds`` seconds, in a fixed ring"""
+
+    def __init__(self, seconds=RATE_WINDOW_SECONDS, statuses=STATUSES):
+        self.seconds = seconds
+        self.statuses = statuses
+        self._lock = threading.Lock()
+        self._stamps = [None] * seconds
+        self._slots = [[0] * len(statuses) for _ in range(seconds)]
+
+    def add(self, status, now=None):
+        now = int(now if now is not None else time.time())
+        index = now % self.seconds
+        with self._lock:
+            if self._stamps[index] != now:
+                self._stamps[index] = now
+                self._slots[index] = [0] * len(self.statuses)
+            self._slots[index][self.statuses.index(status)] += 1
+
+    def series(self, now=None):
+        """[(second, {status: count})] for each of the last ``seconds`` seconds, oldest first"""
+        now = int(now if now is not None else time.time())
+        with self._lock:
+            series = []
+            for second in range(now - self.seconds + 1, now + 1):
+                index = second % self.seconds
+                counts = self._slots[index] if self._stamps[index] == second else [0] * len(self.statuses)
+                series.append((second, dict(zip(self.statuses, counts))))
+        return series
+
+    def totals(self, window, now=None):
+        """{status: count} over the last ``window`` seconds"""
+        totals = dict.fromkeys(self.statuses, 0)
+        for _, counts in self.series(now)[-window:]:
+            for status, count in counts.items():
+                totals[status] += count
+        return totals
+
+class Metrics:
+    """Counters and histograms keyed by name and labels, rendered in Prometheus text format
+
+    Collectors registered with ``register`` are called at render time for
+    values that live elsewhere, like queue depth.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = {}
+
+    def inc(self, name, labels=None, value=1):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def histograms(self, name):
+        """Copies of the ``name`` histograms, keyed by their label dicts as sorted tuples"""
+        with self._lock:
+            return {
+                labels: histogram.copy()
+                for (metric, labels), histogram in self._histograms.items() if metric == name
+            }
+
+    def counters(self, name):
+        """Values of the ``name`` counters, keyed by their label dicts as sorted tuples"""
+        with self._lock:
+            return {labels: value for (metric, labels), value in self._counters.items() if metric == name}
+
+    def register(self, name, collect, help_text, kind='gauge'):
+        """Export ``collect()`` as a metric; it returns a number or a {((label, value), ...): number} dict"""
+        with self._lock:
+            self._collectors[name] = (collect, help_text, kind)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {
+                key: (list(histogram.counts), histogram.sum, histogram.count, histogram.buckets)
+                for key, histogram in self._histograms.items()
+            }
+            collectors = dict(self._collectors)
+
+        lines = []
+        described = set()
+
+        def describe(name, kind, help_text):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            describe(name, *METRIC_HELP.get(name, ('counter', name)))
+            lines.append(f"{name}{_labels(labels)} {value:g}")
+
+        for (name, labels), (counts, total, count, buckets) in sorted(histograms.items()):
+            describe(name, *METRIC_HELP.get(name, ('histogram', name)))
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:g}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        for name, (collect, help_text, kind) in sorted(collectors.items()):
+            try:
+                value = collect()
+            except Exception:
+                continue
+            describe(name, kind, help_text)
+            if isinstance(value, dict):
+                for labels, labelled_value in sorted(value.items()):
+                    lines.append(f"{name}{_labels(labels)} {labelled_value:g}")
+            else:
+                lines.append(f"{name} {value:g}")
+
+        return '\n'.join(lines) + '\n'
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (
+        f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for key, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+class Telemetry:
+    """Structured JSON logs and Prometheus metrics for classifications
+
+    ``record`` writes one JSON log line per finished classification and
+    updates the metrics. The metrics can be served over HTTP and/or written
+    to a file for a local scraper or node_exporter's textfile collector.
+    """
+
+    def __init__(self, log_target='stderr', metrics_port=0, metrics_file=None, metrics_file_interval=15.0):
+        self.metrics = Metrics()
+        self.rates = RateWindow()
+        self.logger = logging.getLogger('lunarcrater.telemetry')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.handlers.clear()
+        if log_target == 'stderr':
+            self.logger.addHandler(logging.StreamHandler(sys.stderr))
+        elif log_target == 'stdout':
+            self.logger.addHandler(logging.StreamHandler(sys.stdout))
+        elif log_target and log_target != 'off':
+            self.logger.addHandler(logging.FileHandler(log_target))
+        if not self.logger.handlers:
+            self.logger.addHandler(logging.NullHandler())
+
+        self.metrics_port = None
+        if metrics_port:
+            self._serve_metrics(metrics_port)
+        if metrics_file:
+            threading.Thread(
+                target=self._write_metrics_file, args=(Path(metrics_file), metrics_file_interval),
+                daemon=True, name='metrics-file'
+            ).start()
+
+    def record(self, kind, request_id, timings=None, error=None, total=None, **fields):
+        """Log and count one finished classification
+
+        ``timings`` maps span names to seconds; unless ``total`` is given their
+        sum, nested spans excluded, is the end-to-end time. ``error`` is the
+        exception the classification failed with, if any.
+        """
+        timings = timings or {}
+        if total is None and timings:
+            total = sum(seconds for span, seconds in timings.items() if span not in NESTED_SPANS)
+        status = classification_status(error)
+
+        labels = {'kind': kind, 'status': status}
+        self.metrics.inc('classifications_total', labels)
+        self.rates.add(status)
+        if total is not None:
+            self.metrics.observe('classification_seconds', total, {'kind': kind})
+        for stage, seconds in timings.items():
+            self.metrics.observe('classification_stage_seconds', seconds, {'stage': stage})
+        if all(span in timings for span in BACKEND_SPANS):
+            self.metrics.observe('backend_seconds', sum(timings[span] for span in BACKEND_SPANS))
+        if fields.get('attempts'):
+            self.metrics.inc('backend_attempts_total', value=fields['attempts'])
+        transfer = fields.get('transfer')
+        if transfer:
+            self.metrics.inc('backend_upload_bytes_total', {'codec': transfer['upload_codec']}, transfer['upload_bytes'])
+            self.metrics.inc(
+                'backend_response_bytes_total',
+                {'format': transfer['response_format'], 'encoding': transfer['content_encoding']},
+                transfer['response_bytes']
+            )
+
+        event = {
+            'ts': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            'event': 'classification',
+            'kind': kind,
+            'request_id': request_id,
+            'status': status,
+            'error': f"{type(error).__name__}: {error}" if error is not None else None,
+            'total_ms': round(total * 1000, 2) if total is not None else None,
+            'spans_ms': {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()},
+            **fields
+        }
+        self.logger.info(json.dumps(event, default=str))
+
+    def _serve_metrics(self, port):
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+        metrics = self.metrics
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+        except OSError as e:
+            self.logger.warning(json.dumps({'event': 'metrics_server_failed', 'port': port, 'error': str(e)}))
+            return
+        server.daemon_threads = True
+        self.metrics_port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True, name='metrics-server').start()
+
+    def _write_metrics_file(self, path, interval):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            temporary = path.with_suffix(path.suffix + '.tmp')
+            try:
+                temporary.write_text(self.metrics.render())
+                os.replace(temporary, path)
+            except OSError:
+                pass
+            time.sleep(interval)
+
+def register_process_gauges(metrics):
+    """Export the shared queue, cache and session state alongside the classification metrics"""
+    admission = get_admission_controller()
+    job_runner = get_job_runner()
+    result_cache = get_result_cache()
+    preview_cache = get_preview_cache()
+
+    metrics.register('backend_in_flight', lambda: admission.stats()['in_flight'], "Backend requests in flight")
+    metrics.register('backend_queue_depth', lambda: admission.stats()['queued'], "Backend requests waiting for a slot")
+    metrics.register(
+        'jobs', lambda: {(('state', state),): job_runner.stats()[state] for state in ('running', 'queued')},
+        "Background classification jobs by state"
+    )
+    metrics.register('result_cache_hit_ratio', lambda: result_cache.stats()['hit_ratio'], "Result cache hit ratio")
+    metrics.register('result_cache_bytes', lambda: result_cache.stats()['bytes'], "Responses held by the result cache")
+    metrics.register('preview_cache_hit_ratio', lambda: preview_cache.stats()['hit_ratio'], "Preview cache hit ratio")
+    metrics.register('active_sessions', lambda: len(session_memory_report()), "Sessions holding classify state")
+    metrics.register(
+        'session_memory_bytes',
+        lambda: sum(usage['memory_bytes'] for usage in session_memory_report().values()),
+        "Image bytes held in memory by all sessions"
+    )
+
+    backend_url = get_setting("BACKEND_URL")
+    if backend_url:
+        # Imported here: the backend client sends the request ID header defined in this module
+        from utils.backend_client import get_backend_client
+
+        breaker = get_backend_client(backend_url).breaker
+        metrics.register(
+            'breaker_state',
+            lambda: {(('state', state),): int(breaker.snapshot()['state'] == state) for state in BREAKER_STATES},
+            "Backend circuit breaker state, 1 for the current one"
+        )
+        metrics.register(
+            'breaker_trips_total', lambda: breaker.snapshot()['trips'], "Times the backend circuit breaker opened",
+            kind='counter'
+        )
+
+@st.cache_resource
+def get_telemetry():
+    """Telemetry shared by every session of this server process"""
+    telemetry = Telemetry(
+        log_target=get_setting("TELEMETRY_LOG", "stderr"),
+        metrics_port=get_setting("METRICS_PORT", 0),
+        metrics_file=get_setting("METRICS_FILE", None),
+        metrics_file_interval=get_setting("METRICS_FILE_INTERVAL_SECONDS", 15.0)
+    )
+    register_process_gauges(telemetry.metrics)
+    return telemetry